@@ -1,23 +1,15 @@
 import utils
+import cache
+import dbscan1d
+import gdeltplanner
 import datetime
-import time
 
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import plotrender
 
-import seaborn as sns
+from dataclasses import dataclass
 
-from sklearn.cluster import DBSCAN
-from tqdm import tqdm
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
-from datetime import timedelta
-
-import os
-import requests
-
-from gdeltdoc import GdeltDoc, Filters
+## -- sklearn is imported inside the functions that use it, so fetch-only runs never load it --
 
 
 
@@ -35,96 +27,23 @@ def unix_to_datetime_string(series):
     return datetimevalues
 
 
-def plotrawdata(prices, volumes, market_caps):
-    """
-    
-    Plot the Raw data for prices, volumes and market caps.
-
-    Args:
-        prices (list): List of prices data.
-        volumes (list): List of volumes data.
-        market_caps (list): List of market caps data.
-    
+def seriesvalues(data):
     """
-    
-    ## -- Prices data --
-    pricevalue = [price[1] for price in prices]
-    plt.figure()
-    y = list(pricevalue)
-    
-    plt.plot(y, color='red', label='Price data for 90 days')
-    plt.title("Raw Price Data")
-    plt.xlabel("Days")
-    plt.ylabel("Price")
-    plt.legend()
-    plt.savefig("plots/raw_price_data.png")
-
-    ## -- Volume data --
-    volumevalue = [volume[1] for volume in volumes]
-    plt.figure()
-    y = list(volumevalue)
-    
-    plt.plot(y, color='red', label='Volume data for 90 days')
-    plt.title("Raw Volume Data")
-    plt.xlabel("Days")
-    plt.ylabel("Volume")
-    plt.legend()
-    plt.savefig("plots/raw_volume_data.png")
-
-    ## -- Market cap data --
-    marketcapvalue = [mcap[1] for mcap in market_caps]
-    plt.figure()
-    y = list(marketcapvalue)
-    
-    plt.plot(y, color='red', label='Market cap data for 90 days')
-    plt.title("Raw Market Cap Data")
-    plt.xlabel("Days")
-    plt.ylabel("Market Cap")
-    plt.legend()
-    plt.savefig("plots/raw_market_cap_data.png")
 
-
-def plotdata(data, labels, segment, type=""):
-    """
-    
-    Plot the clustered data using seaborn scatterplot (dbscan or isolation forest).
+    Get the values of a [timestamp, value] series as a 1-D float array.
 
     Args:
-        data (np.ndarray): The data to be plotted, should be a 2D array
-        labels (np.ndarray): An array of cluster labels, where -1 indicates noise
-        segment (str): The segment of the data being plotted (e.g., "price", "volume", "market cap")
-        type (str): The type of clustering used (e.g., "dbscan", "isolation_forest"). Default is an empty string.
-        Will be overwritten in the function call.
-    
-    """
+        data (np.ndarray or list): The (n, 2) series, e.g. a view returned by utils.getdata().
 
+    Returns:
+        np.ndarray: The values (a view when data is already an array).
 
-    sns.set_style(style="whitegrid")
-    sns.set_context("notebook")
-    
-    ## -- Plot the clustered data --
-    plt.figure(figsize=(10, 6))
-
-    data_df = pd.DataFrame({"Indexes": range(len(data)), 
-                            "Values": data[:, 0],
-                            "Clusters": labels
-                            })
-
-    ## -- Get range(len(data)) for x axis (90 days) --
-    ## -- data[:, 0] for y axis (Standardised price, volume, and market caps) --
+    """
 
-    sns.scatterplot(data=data_df, x="Indexes", y="Values", 
-                    hue="Clusters", palette="viridis", s=120,
-                    edgecolor="black", alpha=0.7)
-    
-    plt.title(f"{type} for {segment}")
-    plt.grid(True, linestyle='--', alpha=0.5)
-    plt.xlabel("Days (90 days)")
-    plt.ylabel(f"Scaled Values for {segment}")
-    plt.savefig(f"plots/{type}_{segment}.png")
+    return np.asarray(data if isinstance(data, np.ndarray) else list(data), dtype=np.float64)[:, 1]
 
 
-def compute_isolation_forest(data, segment="", contamination="auto"):
+def compute_isolation_forest(data, segment="", contamination="auto", usecache=True):
     """
 
     Compute Isolation Forest for the given data to identify anomalies.
@@ -134,52 +53,72 @@ def compute_isolation_forest(data, segment="", contamination="auto"):
         data (list): List of data points to be processed.
         segment (str): The segment of the data being processed (e.g., "price", "volume", "market cap").
         contamination (str or float): The amount of contamination in the data, default is "auto
+        usecache (bool): Whether to reuse a cached result for the same series and parameters. Default is True.
 
     """
 
-    model = IsolationForest(contamination=contamination, random_state=42)
-    data = np.array([v[1] for v in data]).reshape(-1, 1)
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
 
-    datalist = np.array(data)
+    data = seriesvalues(data).reshape(-1, 1)
 
-    scaler = StandardScaler()
-    datalist = scaler.fit_transform(datalist)
+    ## -- Reuse the result of an earlier run on identical data and parameters --
+    key = cache.detectorcache.key(data, "isolation_forest", {"contamination": contamination, "random_state": 42})
+    cached = cache.detectorcache.get(key) if usecache else None
+
+    if cached is not None:
+        anomalous_indicies = cached["indices"]
+    else:
+        model = IsolationForest(contamination=contamination, random_state=42)
+
+        datalist = np.array(data)
+
+        scaler = StandardScaler()
+        datalist = scaler.fit_transform(datalist)
 
-    model.fit(datalist)
-    anomalies = model.predict(datalist)
+        model.fit(datalist)
+        anomalies = model.predict(datalist)
 
-    anomalous_indicies = np.where(anomalies == -1)[0]
+        anomalous_indicies = np.where(anomalies == -1)[0]
+        cache.detectorcache.put(key, indices=anomalous_indicies) if usecache else None
 
     print("Anomalies detected at indicies: ", anomalous_indicies, " using isolation forest\n") if len(anomalous_indicies) > 0 else print("No isolation forest anomalies detected!\n")
-    
-    plotdata(datalist, anomalies, segment=segment, type="isolation_forest") if len(anomalous_indicies) > 0 else None
     return anomalous_indicies
 
 
 
-def compute_dbscan(data, min_samples, eps=0.1, segment=""):
+def compute_dbscan(data, min_samples, eps=0.1, segment="", usecache=True):
     """
     
     Compute DBSCAN clustering for the given data to identify anomalies.
+    The scaled series is clustered by dbscan1d (sort and binary search, see dbscan1d.py for how it relates to sklearn).
 
     Args:
         data (list): List of data points to be processed.
         min_samples (int): The minimum number of samples in a neighborhood for a point to be considered as a core point.
         eps (float): The maximum distance between two samples for one to be considered as a neighbor
         segment (str): The segment of the data being processed (e.g., "price", "volume", "market cap"). Default is an empty string. Will be overwritten in the function call.
+        usecache (bool): Whether to reuse cached labels for the same series and parameters. Default is True.
     
     """
 
-    values = [v[1] for v in data]
-    valuelist = np.array(values)
+    from sklearn.preprocessing import StandardScaler
+
+    valuelist = seriesvalues(data)
+    key = cache.detectorcache.key(valuelist, "dbscan", {"eps": eps, "min_samples": min_samples})
 
     scaler = StandardScaler()
     valuelist = scaler.fit_transform(valuelist.reshape(-1, 1))
 
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    labels = dbscan.fit_predict(valuelist)
+    ## -- Scaling is cheap and its output is returned, so only the clustering is cached --
+    cached = cache.detectorcache.get(key) if usecache else None
+
+    if cached is not None:
+        labels = cached["labels"]
+    else:
+        labels = dbscan1d.dbscan(valuelist[:, 0], eps=eps, min_samples=min_samples)
+        cache.detectorcache.put(key, labels=labels) if usecache else None
 
-    plotdata(valuelist, labels, segment=segment, type="dbscan")
     return labels, scaler, valuelist
 
 
@@ -203,34 +142,140 @@ def detect_anomalies_from_noise(data, min_samples, segment):
 
 
 
-def anomaly_pattern_detection(datapath, coin, showplots=True, priceanomalies=[], volumeanomalies=[], marketcapanomalies=[]):
+## -- Multivariate features in column order, with the segment each one belongs to --
+FEATURES = (("price", "price"), ("volume", "volume"), ("mcaps", "mcaps"),
+            ("price_return", "price"), ("log_volume", "volume"), ("mcap_return", "mcaps"))
+
+JOINT_SEGMENTS = ("price", "volume", "mcaps")
+
+
+@dataclass(frozen=True)
+class jointanomalies:
+    """
+    Result of compute_multivariate(), one entry per day.
+
+    Attributes:
+        indices (np.ndarray): The indices of the anomalous days.
+        scores (np.ndarray): The anomaly score of every day, higher is more anomalous.
+        labels (np.ndarray): -1 for anomalous days and 1 otherwise.
+        drivers (np.ndarray): The segment ("price", "volume" or "mcaps") contributing most to each day's features.
+        contributions (np.ndarray): The (days, 3) share of each segment in JOINT_SEGMENTS order, rows sum to 1.
+    """
+    indices: np.ndarray
+    scores: np.ndarray
+    labels: np.ndarray
+    drivers: np.ndarray
+    contributions: np.ndarray
+
+
+def feature_matrix(columns):
+    """
+
+    Stack price, volume and market cap with their derived features (log returns of price and market cap, log volume).
+
+    Args:
+        columns (np.ndarray): The (4, n) columnar array of timestamp, price, volume and market cap, e.g. utils.getdata().columns.
+
+    Returns:
+        np.ndarray: The (n, 6) feature matrix in FEATURES order. The first day's returns are 0, and missing values take the median of their feature.
+
+    """
+
+    price, volume, market_cap = (np.asarray(columns[row], dtype=np.float64) for row in (1, 2, 3))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = np.column_stack([price, volume, market_cap,
+                                    np.r_[0.0, np.diff(np.log(price))],
+                                    np.log1p(volume),
+                                    np.r_[0.0, np.diff(np.log(market_cap))]])
+
+    features[~np.isfinite(features)] = np.nan
+    medians = np.nan_to_num(np.nanmedian(np.where(np.isnan(features).all(axis=0), 0.0, features), axis=0))
+    return np.where(np.isnan(features), medians, features)
+
+
+def compute_multivariate(columns, contamination="auto", usecache=True):
+    """
+
+    Detect anomalous days from price, volume and market cap together with one isolation forest.
+    The features are scaled together, so a volume spike while the price holds is scored as one event.
+
+    Args:
+        columns (np.ndarray): The (4, n) columnar array of timestamp, price, volume and market cap.
+        contamination (str or float): The amount of contamination in the data. Default is "auto".
+        usecache (bool): Whether to reuse a cached result for the same series and parameters. Default is True.
+
+    Returns:
+        jointanomalies: The anomalous days, per-day scores and the segment driving each day.
+
+    """
+
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    features = feature_matrix(columns)
+    scaled = StandardScaler().fit_transform(features)
+
+    key = cache.detectorcache.key(features, "multivariate_isolation_forest", {"contamination": contamination, "random_state": 42})
+    cached = cache.detectorcache.get(key) if usecache else None
+
+    if cached is not None:
+        scores, labels = cached["scores"], cached["labels"]
+    else:
+        model = IsolationForest(contamination=contamination, random_state=42).fit(scaled)
+        scores, labels = -model.score_samples(scaled), model.predict(scaled)
+        cache.detectorcache.put(key, scores=scores, labels=labels) if usecache else None
+
+    ## -- A segment's contribution is the share of its features in the day's squared distance from the mean --
+    squared = scaled ** 2
+    contributions = np.column_stack([squared[:, [i for i, (_, owner) in enumerate(FEATURES) if owner == segment]].sum(axis=1)
+                                     for segment in JOINT_SEGMENTS])
+    totals = contributions.sum(axis=1, keepdims=True)
+    contributions = np.divide(contributions, totals, out=np.full_like(contributions, 1 / len(JOINT_SEGMENTS)), where=totals > 0)
+
+    indices = np.where(labels == -1)[0]
+    drivers = np.asarray(JOINT_SEGMENTS)[contributions.argmax(axis=1)]
+
+    print("Joint anomalies detected at indicies: ", indices, " using a multivariate isolation forest\n") if len(indices) > 0 else print("No joint anomalies detected!\n")
+    return jointanomalies(indices=indices, scores=scores, labels=labels, drivers=drivers, contributions=contributions)
+
+
+def anomaly_pattern_detection(datapath, coin, showplots=True, priceanomalies=None, volumeanomalies=None, marketcapanomalies=None,
+                              resolution="daily", start=None, end=None, multivariate=False):
     """
     Call the anomaly detection functions to detect anomalies in the data and get the query parameters for each anomaly time.
-    The anomalies are detected using DBSCAN clustering and the data is plotted using seaborn.
+    The anomalies are detected using DBSCAN clustering and the data is plotted using seaborn once detection is done.
     getqueryparameters() is called to get the query parameters for each anomaly time (coin and date)
 
     Args:
-        datapath (str): The path to the JSON file containing the data.
+        datapath (str): The path to the stored data file, or None to read the coin from the time-series store (tsstore.py).
         coin (str): The coin for which the anomalies are to be detected (e.g., "bitcoin", "ethereum").
-        showplots (bool): Whether to show the plots or not. Default is True.
-        priceanomalies (list): List to store the anomalies for price data.
-        volumeanomalies (list): List to store the anomalies for volume data.
-        marketcapanomalies (list): List to store the anomalies for market cap data.
+        showplots (bool): Whether to render the plots (in plotrender's worker pool, skipping unchanged plots). Default is True.
+        priceanomalies (list): List to store the anomalies for price data. Default is None, which uses a new list.
+        volumeanomalies (list): List to store the anomalies for volume data. Default is None, which uses a new list.
+        marketcapanomalies (list): List to store the anomalies for market cap data. Default is None, which uses a new list.
+        resolution (str): The time-series store resolution read when datapath is None. Default is "daily".
+        start (int, str or datetime): The first time read from the time-series store. Default is None.
+        end (int, str or datetime): The time the read from the time-series store stops before. Default is None.
+        multivariate (bool): Whether to fit one isolation forest over all three segments and their derived features instead
+            of DBSCAN and an isolation forest per segment. Each anomalous day is listed under the segment driving it. Default is False.
     """
 
-    # Unpack data and compute metrics
-    data_metrics = utils.getdata(datapath)
-    prices, volumes, market_caps = data_metrics[:3]
-    price_metrics = data_metrics[3:8]
-    volume_metrics = data_metrics[8:13]
-    marketcap_metrics = data_metrics[13:18]
+    ## -- New lists per call, so anomalies do not accumulate across runs --
+    priceanomalies = [] if priceanomalies is None else priceanomalies
+    volumeanomalies = [] if volumeanomalies is None else volumeanomalies
+    marketcapanomalies = [] if marketcapanomalies is None else marketcapanomalies
+
+    # Load data and compute metrics
+    coindata = utils.getdata(datapath, coin=coin, resolution=resolution, start=start, end=end)
+    prices, volumes, market_caps = coindata.prices, coindata.volumes, coindata.market_caps
     
     # Print metrics summary
-    utils.printmetrics(*price_metrics, *volume_metrics, *marketcap_metrics)
+    utils.printmetrics(*coindata.metrics.flat())
     
-    # Plot raw data if requested
-    if showplots:
-        plotrawdata(prices, volumes, market_caps)
+    # Collect plot jobs, rendered after detection if requested
+    plotjobs = [plotrender.rawjob(seriesvalues(series), segment, coin)
+                for segment, series in (("price", prices), ("volume", volumes), ("market cap", market_caps))]
 
     # Define data segments for processing
     data_segments = [
@@ -242,13 +287,29 @@ def anomaly_pattern_detection(datapath, coin, showplots=True, priceanomalies=[],
     print("\n" + "="*50)
     print("DETECTING ANOMALIES IN CRYPTOCURRENCY DATA")
     print("="*50)
-    
+
+    if multivariate:
+        # One fit over every segment, each anomalous day goes to the segment driving it
+        joint = compute_multivariate(coindata.columns)
+        anomaly_lists = {segment_name: anomaly_list for segment_name, _, anomaly_list in data_segments}
+        dates = unix_to_datetime_string(np.asarray(coindata.columns[0])[joint.indices])
+
+        for i, date in zip(joint.indices, dates):
+            print(f"✓ Joint anomaly on {date}: score {joint.scores[i]:.3f}, driven by {joint.drivers[i]} "
+                  f"({', '.join(f'{segment} {share:.0%}' for segment, share in zip(JOINT_SEGMENTS, joint.contributions[i]))})")
+            anomaly_lists[joint.drivers[i]].append(date)
+
+        plotjobs.extend(plotrender.clusterjob(seriesvalues(data), joint.labels, segment_name, "multivariate", coin)
+                        for segment_name, data, _ in data_segments)
+        data_segments = []
+
     # Process each data segment
     for segment_name, data, anomaly_list in data_segments:
         print(f"\n--- Processing {segment_name.upper()} data ---")
         
         # DBSCAN anomaly detection
-        anomalous_indices = detect_anomalies_from_noise(data, min_samples=3, segment=segment_name)[0]
+        anomalous_indices, labels = detect_anomalies_from_noise(data, min_samples=3, segment=segment_name)[:2]
+        plotjobs.append(plotrender.clusterjob(seriesvalues(data), labels, segment_name, "dbscan", coin))
         
         if len(anomalous_indices) > 0:
             print(f"✓ DBSCAN anomalies in {segment_name}: {anomalous_indices}")
@@ -265,9 +326,17 @@ def anomaly_pattern_detection(datapath, coin, showplots=True, priceanomalies=[],
         
         # Isolation Forest anomaly detection
         isolation_anomalies = compute_isolation_forest(data, segment=segment_name)
+
+        if len(isolation_anomalies) > 0:
+            isolation_labels = np.ones(len(data), dtype=int)
+            isolation_labels[isolation_anomalies] = -1
+            plotjobs.append(plotrender.clusterjob(seriesvalues(data), isolation_labels, segment_name, "isolation_forest", coin))
         
         print(f"{'='*40}")
 
+    # Render plots now that detection is done
+    plotrender.render(plotjobs) if showplots else None
+
     # Query GDELT for news events around anomaly times
     anomaly_queries = [
         ("price", priceanomalies),
@@ -280,103 +349,29 @@ def anomaly_pattern_detection(datapath, coin, showplots=True, priceanomalies=[],
     print(f"{'='*50}")
     
     for query_type, anomaly_dates in anomaly_queries:
-        if not anomaly_dates:
-            print(f"⚠️  No {query_type} anomalies to query")
-            continue
-            
-        print(f"\n🔍 Getting {query_type} anomaly events...")
-        success = getqueryparameters(anomaly_dates, coin)
-        
-        if not success:
-            print("❌ GDELT API queries failed. Stopping further queries.")
-            break
-            
-        print(f"✅ {query_type.capitalize()} queries completed")
-        time.sleep(1)
-
-    return priceanomalies, volumeanomalies, marketcapanomalies
-
-
-def remove404(articles):
-    """
-    Some articles from GDELT API may return 404 errors. This function checks for 404 errors and removes the articles from the list.
-    The function returns a list of valid articles.
-    """
-
-    valid_articles = []
-
-    print("\nChecking for 404 errors in articles...\n")
-    
-    # Handle empty articles gracefully
-    if articles.empty:
-        print("No articles returned from GDELT API. Skipping 404 check.")
-        return valid_articles  # Return empty list
-
-    for url in tqdm(articles["url"]):
-        try:
-            response = requests.head(url, allow_redirects=True, timeout=5)
-            if response.status_code == 200:
-                valid_articles.append(url)
-        except requests.RequestException as e:
-            print(f"Error checking URL {url}: {e}")
+        print(f"⚠️  No {query_type} anomalies to query") if not anomaly_dates else None
 
-    print(f"Removed {len(articles) - len(valid_articles)} articles with 404 errors.\n")
-    return valid_articles
+    ## -- Query all segments together so overlapping windows across price, volume and market cap are fetched once --
+    all_dates = sorted(set(priceanomalies) | set(volumeanomalies) | set(marketcapanomalies))
 
+    if all_dates:
+        print(f"\n🔍 Getting events for {len(all_dates)} anomaly dates...")
+        success = getqueryparameters(all_dates, coin)
+        print("✅ Anomaly queries completed") if success else print("❌ Some GDELT API queries failed, rerun to retry them (completed windows are cached).")
 
-
-def gdelt_query(filter, anomalytime, coin, storejson=None, gd = GdeltDoc()):
-    """
-    
-    Conduct a GDELT query using the GDELT API and the filters provided.
-    The function returns the articles and timeline data for the given anomaly time.
-    The articles are stored in a JSON file and the timeline data is stored in a CSV file.
-
-    Args:
-        filter (Filters): Filters to be applied to the GDELT query.
-        anomalytime (str): The time of the anomaly in the format "YYYY-MM-DD".
-        coin (str): The coin for which the query is being made (e.g., "bitcoin", "ethereum").
-        storejson (bool): Whether to store the articles in a JSON file or not. Default is None, which means it will not store the JSON file.
-        gd (GdeltDoc): An instance of the GdeltDoc class to interact with the GDELT API.
-    
-    """
-
-    ## -- Search for articles and get timeline, articles is returned as a DataFrame --
-
-    ## -- Please note that the guardrails are there due to GDELT API not being active as of June 2025.
-
-    try:    
-        articles = gd.article_search(filter)
-        articles = remove404(articles)
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching articles: {e}")
-        return False
-
-    timeline = gd.timeline_search(filters=filter, mode="timelinevol")
-
-    # Handle empty results gracefully
-    if len(articles) == 0:
-        print(f"No articles found for {anomalytime}. Skipping.")
-        return False
-        
-    if timeline.empty:
-        print(f"No timeline data found for {anomalytime}. Skipping.")
-        return False
-
-    # Store results if we have data
-    utils.dumpjson(articles, os.path.join(utils.getdirs(), f"data/{coin}_events/processed_events_for_{anomalytime}.json")) if storejson else None
-    return True
-
+    return priceanomalies, volumeanomalies, marketcapanomalies
 
 
 def getqueryparameters(anomalytimearr, coin):
     """
     
     Get the query parameters for each anomaly time.
-    The function takes the anomaly time array and the coin as input and returns the query parameters for each anomaly time.
+    The function takes the anomaly time array and the coin as input and returns whether every query succeeded.
     The time range is 7 days before and after the anomaly time.
 
-    Make repeated calls to gdelt_query() to get the articles and timeline data for each anomaly time.
+    Overlapping time ranges are merged by gdeltplanner so each merged range is queried once (and cached),
+    and the articles are split back to each anomaly time. Ranges are queried concurrently, and a failed range
+    does not stop the others.
 
     Args:
         anomalytimearr (list): List of anomaly times in the format "YYYY-MM-DD".
@@ -384,37 +379,14 @@ def getqueryparameters(anomalytimearr, coin):
     
     """
 
-    for anomaly in range(len(anomalytimearr)):
-
-        datestring = anomalytimearr[anomaly]
-        
-        ## -- Check for events in the past week centered on the amomaly date --
-        anomalytimestart = datetime.datetime.strptime(datestring, "%Y-%m-%d") - timedelta(days=7)
-        anomalytimestop = datetime.datetime.strptime(datestring, "%Y-%m-%d") + timedelta(days=7)
-
-        filter = Filters(
-            keyword=f"{coin}",
-            start_date=anomalytimestart,
-            end_date=anomalytimestop,
-            num_records=10,
-            language="English"
-            #domain=["fool.com", "reuters.com", "bbc.co.uk", "cnn.com", "forbes.com", "cnbc.com"],
-            #near=near(5, "bitcoin", "war", "trade", "economy", "inflation", "rates", "market", "cryptocurrency", "crypto"), 
-            #repeat=multi_repeat([
-            #    (3, "bitcoin"), 
-            #    (2, "economy"), 
-            #    (2, "inflation"), 
-            #    (2, "stock")
-            #], "OR")
-        
-        )
-        
-        success = gdelt_query(filter, coin=coin, storejson=True, anomalytime=anomalytimearr[anomaly])
-        if not success:
-            print("\nStopping GDELT queries due to API failure.\n")
-            return success
+    ## -- Check for events in the past week centered on each amomaly date --
+    results = gdeltplanner.query_anomalies(anomalytimearr, coin, radius=7, perdate=10, store=True)
+    if results["failed"]:
+        print(f"\nGDELT queries failed for {len(results['failed'])} anomaly times: {', '.join(sorted(results['failed']))}\n")
+        return False
 
     print("GDELT query iteration complete!\n")
+    return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+
+Embedded SQLite store for the GDELT articles found around each anomaly.
+
+Articles are stored once per normalised URL and linked to every (coin, anomaly date) they were found for, with
+indexes on coin, anomaly date and URL so date-range lookups do not scan the events directories.
+
+"""
+
+import json
+import os
+import sqlite3
+
+import utils
+
+from llm_utils import get_date_from_filename, normalise_url
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    normurl TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS events (
+    coin TEXT NOT NULL,
+    anomalydate TEXT NOT NULL,
+    articleid INTEGER NOT NULL REFERENCES articles(id),
+    PRIMARY KEY (coin, anomalydate, articleid)
+);
+CREATE INDEX IF NOT EXISTS events_by_date ON events (anomalydate);
+CREATE INDEX IF NOT EXISTS events_by_article ON events (articleid);
+CREATE INDEX IF NOT EXISTS articles_by_url ON articles (url);
+"""
+
+
+class articlestore:
+    def __init__(self, path=None):
+        """
+        Open (and create if needed) the article store.
+
+        Args:
+            path (str): The SQLite database file. Default is None, which uses data/articles.sqlite.
+        """
+        self.path = path or os.path.join(utils.getdirs(), "data", "articles.sqlite")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, coin, anomalydate, urls):
+        """
+        Store the articles found for an anomaly. URLs already stored (after normalisation) are reused.
+
+        Args:
+            coin (str): The coin (e.g., "bitcoin").
+            anomalydate (str): The anomaly date in the format "YYYY-MM-DD".
+            urls (list): The article URLs.
+        """
+        with self.connection:
+            for url in urls:
+                normurl = normalise_url(url)
+                self.connection.execute("INSERT OR IGNORE INTO articles (url, normurl) VALUES (?, ?)", (url, normurl))
+                self.connection.execute("INSERT OR IGNORE INTO events (coin, anomalydate, articleid) "
+                                        "SELECT ?, ?, id FROM articles WHERE normurl = ?", (coin, anomalydate, normurl))
+
+    def articles(self, coin, start=None, end=None):
+        """
+        Get the articles of each anomaly date of a coin, optionally within a date range.
+
+        Args:
+            coin (str): The coin (e.g., "bitcoin").
+            start (str): The first anomaly date to include ("YYYY-MM-DD"). Default is None, no lower bound.
+            end (str): The last anomaly date to include ("YYYY-MM-DD"). Default is None, no upper bound.
+
+        Returns:
+            dict: Maps each anomaly date, in order, to its list of article URLs.
+        """
+        rows = self.connection.execute(
+            "SELECT events.anomalydate, articles.url FROM events JOIN articles ON articles.id = events.articleid "
+            "WHERE events.coin = ? AND events.anomalydate >= ? AND events.anomalydate <= ? "
+            "ORDER BY events.anomalydate, articles.id",
+            (coin, start or "0000-00-00", end or "9999-99-99"))
+
+        events = {}
+        for anomalydate, url in rows:
+            events.setdefault(anomalydate, []).append(url)
+        return events
+
+    def urls(self, coin, start=None, end=None):
+        """
+        Get the distinct article URLs of a coin's anomalies within a date range.
+
+        Args:
+            coin (str): The coin (e.g., "bitcoin").
+            start (str): The first anomaly date to include ("YYYY-MM-DD"). Default is None.
+            end (str): The last anomaly date to include ("YYYY-MM-DD"). Default is None.
+
+        Returns:
+            list: The URLs, each listed once.
+        """
+        rows = self.connection.execute(
+            "SELECT DISTINCT articles.url FROM events JOIN articles ON articles.id = events.articleid "
+            "WHERE events.coin = ? AND events.anomalydate >= ? AND events.anomalydate <= ? ORDER BY articles.id",
+            (coin, start or "0000-00-00", end or "9999-99-99"))
+        return [url for url, in rows]
+
+    def coins(self):
+        """
+        Get the coins with stored articles.
+        """
+        return [coin for coin, in self.connection.execute("SELECT DISTINCT coin FROM events ORDER BY coin")]
+
+    def import_events(self, coin, articles_dir=None):
+        """
+        Import the processed_events_for_<date>.json files of a coin.
+
+        Args:
+            coin (str): The coin (e.g., "bitcoin").
+            articles_dir (str): The events directory. Default is None, which uses data/<coin>_events.
+
+        Returns:
+            int: The number of anomaly dates imported.
+        """
+        articles_dir = articles_dir or os.path.join(utils.getdirs(), "data", f"{coin}_events")
+        if not os.path.isdir(articles_dir):
+            return 0
+
+        imported = 0
+        for file in sorted(os.listdir(articles_dir)):
+            anomalydate = get_date_from_filename(file)
+            if file.endswith(".json") and anomalydate:
+                with open(os.path.join(articles_dir, file), "r") as f:
+                    self.add(coin, anomalydate, json.load(f))
+                imported += 1
+
+        return imported
+
+
+if __name__ == "__main__":
+
+    ## -- Import every data/<coin>_events directory --
+    datadir = os.path.join(utils.getdirs(), "data")
+    with articlestore() as store:
+        for entry in sorted(os.listdir(datadir)):
+            if entry.endswith("_events"):
+                coin = entry[:-len("_events")]
+                print(f"Imported {store.import_events(coin)} anomaly dates for {coin}")
@@ -0,0 +1,405 @@
+"""
+
+Headless batch mode and scheduler for the refresh, detect, news and semantics stages.
+
+Settings come from a YAML config (see batch_config.yml) and/or command line arguments, so runs need no prompts:
+
+    python batch.py --coins bitcoin solana --stages refresh detect news
+    python batch.py --config batch_config.yml --interval 3600
+
+Each stage fingerprints its inputs per coin in .cache/batch_state.json and skips coins whose inputs have not changed
+since their last successful run. Runs never overlap: a lock file guards against a second process (e.g. cron firing
+during a long run), and scheduler ticks missed by a long run are skipped rather than queued.
+
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+import numpy as np
+import yaml
+
+import articlestore
+import data
+import gdeltplanner
+import pipeline
+import storage
+import tracing
+import tsstore
+import utils
+
+
+STAGES = ("refresh", "detect", "news", "semantics")
+
+DEFAULTS = {
+    "coins": ["bitcoin", "ethereum"],
+    "stages": ["refresh", "detect", "news"],
+    "refresh": "incremental",
+    "segments": list(pipeline.SEGMENTS),
+    "detectors": list(pipeline.DETECTORS),
+    "params": {},
+    "resolution": "daily",
+    "maxworkers": None,
+    "interval": 0,
+    "force": False,
+}
+
+
+def load_config(path=None, **overrides):
+    """
+    Load the batch settings from a YAML file over the defaults, then apply overrides that are not None.
+
+    Args:
+        path (str): The YAML config file. Default is None, which uses the defaults only.
+        **overrides: Settings taking precedence over the file (e.g., the command line arguments).
+
+    Returns:
+        dict: The settings.
+    """
+    config = dict(DEFAULTS)
+
+    if path:
+        with open(path, "r") as f:
+            config.update(yaml.safe_load(f) or {})
+
+    config.update({key: value for key, value in overrides.items() if value is not None})
+
+    unknown = set(config["stages"]) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}. Please choose from: {', '.join(STAGES)}.")
+
+    return config
+
+
+def fingerprint(*parts):
+    """
+    Hash stage inputs: arrays by their bytes, everything else by its JSON.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def series(coin, resolution="daily"):
+    """
+    Get a coin's (4, n) columns from the time-series store, or its stored data file. None if nothing is stored.
+    """
+    if tsstore.store.has(coin, resolution):
+        return tsstore.store.columns(coin, resolution)
+
+    path = storage.find(coin)
+    return storage.load(path) if os.path.exists(path) else None
+
+
+class batchstate:
+    def __init__(self, path=None):
+        """
+        The input fingerprint of every (stage, coin) as of its last successful run.
+
+        Args:
+            path (str): The JSON state file. Default is None, which uses .cache/batch_state.json.
+        """
+        self.path = path or os.path.join(utils.getdirs(), ".cache", "batch_state.json")
+
+        try:
+            with open(self.path, "r") as f:
+                self.fingerprints = json.load(f)
+        except (OSError, ValueError):
+            self.fingerprints = {}
+
+    def changed(self, stage, coin, key):
+        return self.fingerprints.get(stage, {}).get(coin) != key
+
+    def mark(self, stage, coin, key):
+        self.fingerprints.setdefault(stage, {})[coin] = key
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        utils.dumpjson(self.fingerprints, self.path)
+
+
+def anomaliespath():
+    return os.path.join(utils.getdirs(), "data", "anomalies.json")
+
+
+def load_anomalies():
+    """
+    Load the anomaly table written by the detect stage.
+    """
+    import pandas as pd
+
+    try:
+        with open(anomaliespath(), "r") as f:
+            return pd.DataFrame(json.load(f), columns=pipeline.TABLE_COLUMNS)
+    except (OSError, ValueError):
+        return pd.DataFrame(columns=pipeline.TABLE_COLUMNS)
+
+
+def merge_anomalies(table, coins):
+    """
+    Replace the rows of the given coins in the stored anomaly table, keeping the other coins.
+    """
+    import pandas as pd
+
+    existing = load_anomalies()
+    merged = pd.concat([existing[~existing["coin"].isin(coins)], table], ignore_index=True) if len(existing) else table
+    merged = merged.sort_values(["coin", "segment", "detector", "index"], ignore_index=True)
+    utils.dumpjson(merged.to_dict(orient="records"), anomaliespath())
+    return merged
+
+
+@contextlib.contextmanager
+def guarded(summary, stage):
+    """
+    Record an error raised by a stage in the cycle summary instead of ending the cycle, so the later stages still run.
+    """
+    try:
+        yield
+    except Exception as e:
+        summary["errors"][stage] = f"{type(e).__name__}: {e}"
+        tracing.tracer.count(f"batch.{stage}.errors")
+        print(f"The {stage} stage failed: {summary['errors'][stage]}")
+
+
+def run_cycle(config, state=None):
+    """
+    Run the configured stages once, skipping coins whose stage inputs are unchanged.
+
+    Args:
+        config (dict): The settings from load_config().
+        state (batchstate): The fingerprints of earlier runs. Default is None, which loads .cache/batch_state.json.
+
+    Returns:
+        dict: The coins each stage "ran" for, "skipped" as unchanged and "failed" (coin to error), and the "errors"
+        (stage to error) of stages that stopped part way.
+    """
+    state = state or batchstate()
+    coins, stages, force = list(dict.fromkeys(config["coins"])), config["stages"], config["force"]
+    summary = {key: {stage: [] if key != "failed" else {} for stage in stages} for key in ("ran", "skipped", "failed")}
+    summary["errors"] = {}
+
+    with tracing.tracer.span("batch.cycle", coins=coins, stages=stages):
+        if "refresh" in stages:
+            with guarded(summary, "refresh"):
+                with tracing.tracer.span("stage.fetch", coins=coins, refresh=config["refresh"]):
+                    fetched = data.fetch_coins(coins, maxworkers=config["maxworkers"] or 8, incremental=config["refresh"] == "incremental")
+                summary["ran"]["refresh"] = fetched["succeeded"]
+                summary["failed"]["refresh"] = fetched["failed"]
+
+        if "detect" in stages:
+            with guarded(summary, "detect"):
+                detectparams = [config["segments"], config["detectors"], config["params"], config["resolution"]]
+                inputs = {coin: fingerprint(columns, detectparams) for coin in coins
+                          if (columns := series(coin, config["resolution"])) is not None}
+                changed = [coin for coin in inputs if force or state.changed("detect", coin, inputs[coin])]
+                summary["skipped"]["detect"] = [coin for coin in inputs if coin not in changed]
+                summary["failed"]["detect"] = {coin: "No stored data" for coin in coins if coin not in inputs}
+
+                if changed:
+                    with tracing.tracer.span("stage.pipeline", coins=changed):
+                        table, report = pipeline.run_pipeline(changed, tuple(config["segments"]), tuple(config["detectors"]), config["maxworkers"],
+                                                              config["params"], save=False, resolution=config["resolution"])
+                    failedcoins = {coin for coin, _, _ in report["failed"]}
+                    merge_anomalies(table[~table["coin"].isin(failedcoins)], [coin for coin in changed if coin not in failedcoins])
+
+                    for coin in changed:
+                        if coin in failedcoins:
+                            summary["failed"]["detect"][coin] = "; ".join(error for key, error in report["failed"].items() if key[0] == coin)
+                        else:
+                            state.mark("detect", coin, inputs[coin])
+                            summary["ran"]["detect"].append(coin)
+
+        if "news" in stages:
+            with guarded(summary, "news"):
+                table = load_anomalies()
+
+                for coin in coins:
+                    dates = sorted(set(table.loc[table["coin"] == coin, "date"]))
+                    key = fingerprint(dates)
+
+                    if not dates or not (force or state.changed("news", coin, key)):
+                        summary["skipped"]["news"].append(coin)
+                        continue
+
+                    try:
+                        with tracing.tracer.span("stage.news", coin=coin, dates=len(dates)):
+                            results = gdeltplanner.query_anomalies(dates, coin, store=True)
+                    except Exception as e:
+                        summary["failed"]["news"][coin] = str(e)
+                        continue
+
+                    if results["failed"]:
+                        summary["failed"]["news"][coin] = f"{len(results['failed'])} anomaly dates failed, retried next run"
+                    else:
+                        state.mark("news", coin, key)
+                        summary["ran"]["news"].append(coin)
+
+        if "semantics" in stages:
+            with guarded(summary, "semantics"):
+                ## -- Imported here so runs without the semantics stage do not need the Gemini client configured --
+                import llm_semantics
+
+                for coin in coins:
+                    with articlestore.articlestore() as store:
+                        key = fingerprint(store.articles(coin))
+
+                    if not (force or state.changed("semantics", coin, key)):
+                        summary["skipped"]["semantics"].append(coin)
+                        continue
+
+                    try:
+                        with tracing.tracer.span("stage.semantics", coin=coin):
+                            semantics = llm_semantics.run_semantic_analysis(coin)
+                    except Exception as e:
+                        summary["failed"]["semantics"][coin] = str(e)
+                        continue
+
+                    utils.dumpjson(semantics, os.path.join(utils.getdirs(), "data", f"{coin}_semantics.json"))
+                    state.mark("semantics", coin, key)
+                    summary["ran"]["semantics"].append(coin)
+
+    state.save()
+
+    for stage in stages:
+        error = f" | error: {summary['errors'][stage]}" if stage in summary["errors"] else ""
+        print(f"{stage:<10} ran: {', '.join(summary['ran'][stage]) or '-'} | unchanged: {', '.join(summary['skipped'][stage]) or '-'}"
+              f" | failed: {', '.join(summary['failed'][stage]) or '-'}{error}")
+
+    return summary
+
+
+class runlock:
+    def __init__(self, path=None, staleafter=6 * 60 * 60):
+        """
+        Lock file stopping two batch runs from overlapping, across processes.
+
+        Args:
+            path (str): The lock file. Default is None, which uses .cache/batch.lock.
+            staleafter (int): Seconds after which a lock left by a crashed run is broken. Default is 6 hours.
+        """
+        self.path = path or os.path.join(utils.getdirs(), ".cache", "batch.lock")
+        self.staleafter = staleafter
+
+    def acquire(self):
+        """
+        Take the lock without waiting.
+
+        Returns:
+            bool: Whether the lock was taken.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) < self.staleafter:
+                        return False
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+        return False
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def schedule(config, interval=None, cycles=None, lock=None):
+    """
+    Run cycles every interval seconds until stopped (Ctrl+C or SIGTERM) or cycles have run.
+    A cycle starting while another run holds the lock is skipped, and ticks missed by a long cycle are not made up.
+    A failing stage or cycle is recorded in its summary and the schedule carries on.
+
+    Args:
+        config (dict): The settings from load_config().
+        interval (float): Seconds between cycle starts. Default is None, which uses config["interval"]; 0 runs once.
+        cycles (int): The number of ticks before returning. Default is None, run until stopped.
+        lock (runlock): The lock shared with other runs. Default is None, which uses .cache/batch.lock.
+
+    Returns:
+        list: The summary of every cycle that ran.
+    """
+    interval = config["interval"] if interval is None else interval
+    cycles = 1 if not interval else cycles
+    lock = lock or runlock(staleafter=max(6 * 60 * 60, 2 * interval))
+    stop = threading.Event()
+    summaries = []
+
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+    tick = 0
+    while not stop.is_set():
+        started = time.monotonic()
+
+        if lock.acquire():
+            try:
+                summaries.append(run_cycle(config))
+            except Exception as e:
+                ## -- Stage errors are recorded by run_cycle, anything else still must not end the schedule --
+                summaries.append({"errors": {"cycle": f"{type(e).__name__}: {e}"}})
+                print(f"Cycle failed: {summaries[-1]['errors']['cycle']}")
+            finally:
+                lock.release()
+                print(f"Trace written to {tracing.tracer.export()}")
+        else:
+            print(f"Another run holds {lock.path}, skipping this cycle.")
+
+        tick += 1
+        if cycles is not None and tick >= cycles:
+            break
+
+        ## -- Wait for the next tick on the interval grid, skipping any a long cycle overran --
+        stop.wait(interval - (time.monotonic() - started) % interval)
+
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the crypto anomaly pipeline without prompts, once or on an interval.")
+    parser.add_argument("--config", help="YAML settings file (see batch_config.yml).")
+    parser.add_argument("--coins", nargs="+", help="CoinGecko ids of the coins.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="Stages to run, in pipeline order.")
+    parser.add_argument("--detectors", nargs="+", choices=pipeline.DETECTORS)
+    parser.add_argument("--segments", nargs="+", choices=list(pipeline.SEGMENTS))
+    parser.add_argument("--refresh", choices=["incremental", "full"], help="Fetch only missing days, or the full history.")
+    parser.add_argument("--resolution", choices=tsstore.RESOLUTIONS, help="Time-series store resolution to analyse.")
+    parser.add_argument("--maxworkers", type=int)
+    parser.add_argument("--interval", type=float, help="Seconds between runs, 0 runs once.")
+    parser.add_argument("--cycles", type=int, help="Stop after this many scheduled runs.")
+    parser.add_argument("--force", action="store_true", default=None, help="Rerun stages even when their inputs are unchanged.")
+    args = vars(parser.parse_args(argv))
+
+    config_path, cycles = args.pop("config"), args.pop("cycles")
+    config = load_config(config_path, **args)
+
+    ## -- Keep stages in pipeline order whatever order they were given in --
+    config["stages"] = [stage for stage in STAGES if stage in config["stages"]]
+
+    summaries = schedule(config, cycles=cycles)
+    return 1 if summaries and (summaries[-1]["errors"] or any(summaries[-1].get("failed", {}).values())) else 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+
+Offline benchmark suite for the anomaly pipeline.
+
+Synthetic price, volume and market cap series with injected anomalies are generated for every (points, coins) case,
+then each stage of the pipeline (fetch, JSON loading, loading, metrics, scaling, DBSCAN, isolation forest, parameter
+sweeps, cross-coin contagion and plotting) is timed with its peak traced memory. Results are written as JSON and can be compared against a stored
+baseline:
+
+    python benchmark.py --profile quick --output bench_results.json
+    python benchmark.py --profile quick --baseline bench_baseline.json
+    python benchmark.py --startup   # import time of each entry point in a fresh interpreter
+
+Nothing touches the network: fetching goes through a stub session serving the synthetic series, and any other HTTP
+request made during a run raises.
+
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import requests
+
+from sklearn.preprocessing import StandardScaler
+
+import analysis
+import contagion
+import data
+import metrics
+import plotrender
+import ratelimit
+import storage
+import sweep
+
+
+STUB_HOST = "bench.invalid"
+STUB_URL = f"http://{STUB_HOST}/{{coin}}?days={{days}}&interval={{interval}}"
+
+## -- (points, coins) cases of each profile --
+PROFILES = {
+    "quick": [(91, 1), (91, 10), (10_000, 1)],
+    "full": [(91, 1), (91, 500), (10_000, 1), (10_000, 100), (100_000, 1), (1_000_000, 1), (10_000_000, 1)],
+}
+
+## -- Largest series each stage is run on, larger cases record the stage as skipped --
+LIMITS = {"fetch": 1_000_000, "json_load": 1_000_000, "dbscan_sklearn": 20_000, "isolation_forest": 2_000_000, "sweep": 2_000_000,
+          "contagion": 100_000, "plotting": 200_000}
+
+## -- Entry points timed by --startup, and the heavy dependencies recorded when an import pulls them in --
+STARTUP_MODULES = ("runner", "batch", "data", "pipeline", "analysis", "plotrender", "plothandler", "llm_semantics")
+HEAVY_MODULES = ("pandas", "scipy", "sklearn", "matplotlib", "seaborn", "gdeltdoc", "google.generativeai")
+
+## -- Entry points that must import without pulling in pandas, --startup exits with 1 when one does --
+PANDAS_FREE = ("runner", "batch", "pipeline", "analysis", "plothandler")
+
+## -- A stage is a regression when it is this many times slower than the baseline, ignoring stages faster than NOISE seconds --
+REGRESSION = 1.25
+NOISE = 0.005
+
+
+def synthetic_series(n, seed=0, anomalyrate=0.01, step=None, start=1_700_000_000_000):
+    """
+    Generate a synthetic coin: a geometric random walk price with log-normal volume and a market cap tracking the price,
+    with spikes injected into the price and volume.
+
+    Args:
+        n (int): The number of points.
+        seed (int): The random seed. Default is 0.
+        anomalyrate (float): The fraction of points with an injected anomaly (at least one). Default is 0.01.
+        step (int): The spacing of the timestamps in milliseconds. Default is None, daily up to 5 years of points and minutely beyond.
+        start (int): The first Unix timestamp in milliseconds.
+
+    Returns:
+        tuple: The (4, n) storage.py columnar array and the sorted indices of the injected anomalies.
+    """
+    rng = np.random.default_rng(seed)
+    step = step or (data.DAY_MS if n <= 5 * 366 else 60 * 1000)
+
+    anomalies = np.sort(rng.choice(n, size=max(1, int(n * anomalyrate)), replace=False))
+    spikes = rng.choice([-1.0, 1.0], len(anomalies)) * rng.uniform(0.1, 0.3, len(anomalies))
+
+    columns = np.empty((len(storage.COLUMNS), n))
+    columns[0] = start + np.arange(n) * step
+    columns[1] = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    columns[1, anomalies] *= 1 + spikes
+    columns[2] = rng.lognormal(23, 0.3, n)
+    columns[2, anomalies] *= rng.uniform(3, 6, len(anomalies))
+    columns[3] = columns[1] * 19.5e6 * (1 + rng.normal(0, 1e-4, n))
+
+    return columns, anomalies
+
+
+class stubresponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.payload)
+
+
+class stubsession:
+    def __init__(self, payloads):
+        """
+        Session serving pre-encoded market chart JSON for each coin, in place of CoinGecko.
+
+        Args:
+            payloads (dict): Maps each coin to its market chart JSON string.
+        """
+        self.payloads = payloads
+
+    def request(self, method, url, **kwargs):
+        return stubresponse(self.payloads[url.split("/")[-1].split("?")[0]])
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def offline():
+    """
+    Make every real HTTP request raise, and lift the rate limit of the stub host.
+    """
+    def refuse(self, method, url, *args, **kwargs):
+        raise requests.ConnectionError(f"Network access is disabled while benchmarking ({method} {url})")
+
+    ratelimit.limiter.configure(STUB_HOST, 1e9, 1e9)
+    with mock.patch.object(requests.Session, "request", refuse):
+        yield
+
+
+def prepare(points, coins, directory, seed=0):
+    """
+    Generate and store the synthetic coins of a case.
+
+    Returns:
+        dict: The case with its "coins", in-memory "columns", injected "anomalies", stored "paths" (.npy), "jsonpaths"
+        and stub "payloads".
+    """
+    case = {"points": points, "coins": [f"coin{i}" for i in range(coins)], "columns": {}, "anomalies": {}, "paths": {},
+            "jsonpaths": {}, "payloads": {}, "directory": directory}
+
+    for i, coin in enumerate(case["coins"]):
+        columns, case["anomalies"][coin] = synthetic_series(points, seed=seed + i)
+        case["columns"][coin] = columns
+        case["paths"][coin] = storage.datapath(coin, "npy", directory)
+        storage.BACKENDS["npy"].save(columns, case["paths"][coin])
+
+        if points <= LIMITS["json_load"]:
+            case["payloads"][coin] = json.dumps(storage.to_marketchart(columns))
+            case["jsonpaths"][coin] = storage.datapath(coin, "json", directory)
+            with open(case["jsonpaths"][coin], "w") as f:
+                f.write(case["payloads"][coin])
+
+    return case
+
+
+def stage_fetch(case):
+    data.fetch_coins(case["coins"], storejson=False, baseurl=STUB_URL, session=stubsession(case["payloads"]))
+
+
+def stage_json_load(case):
+    for path in case["jsonpaths"].values():
+        storage.load(path)
+
+
+def stage_load(case):
+    for path in case["paths"].values():
+        np.array(storage.load(path))
+
+
+def stage_metrics(case):
+    for columns in case["columns"].values():
+        metrics.computemetrics(columns[1:])
+
+
+def stage_scaling(case):
+    for columns in case["columns"].values():
+        StandardScaler().fit_transform(columns[1:].T)
+
+
+def stage_dbscan(case):
+    for columns in case["columns"].values():
+        for row in storage.SEGMENTS.values():
+            analysis.compute_dbscan(storage.pairview(columns, row), 3, usecache=False)
+
+
+def stage_dbscan_sklearn(case):
+    from sklearn.cluster import DBSCAN
+    from sklearn.preprocessing import StandardScaler
+
+    for columns in case["columns"].values():
+        for row in storage.SEGMENTS.values():
+            DBSCAN(eps=0.1, min_samples=3).fit_predict(StandardScaler().fit_transform(columns[row].reshape(-1, 1)))
+
+
+def stage_isolation_forest(case):
+    for columns in case["columns"].values():
+        for row in storage.SEGMENTS.values():
+            analysis.compute_isolation_forest(storage.pairview(columns, row), usecache=False)
+
+
+def stage_sweep(case):
+    for columns in case["columns"].values():
+        for row in storage.SEGMENTS.values():
+            sweep.sweep_dbscan(storage.pairview(columns, row))
+            sweep.sweep_isolation_forest(storage.pairview(columns, row), usecache=False)
+
+
+def stage_contagion(case):
+    coins, index, values = contagion.align(case["columns"])
+    returns = contagion.logreturns(values)
+    ends, correlations = contagion.rolling_correlation(returns, 30, step=max(1, len(index) // 100))
+    contagion.leadlag(returns)
+
+    anomalies = pd.DataFrame({"coin": np.repeat(coins, [len(case["anomalies"][coin]) for coin in coins]),
+                              "timestamp": np.concatenate([case["columns"][coin][0, case["anomalies"][coin]] for coin in coins])})
+    contagion.cooccurrences(contagion.anomaly_matrix(anomalies, coins, index), coins, index, ends=ends, correlations=correlations)
+
+
+def stage_plotting(case):
+    for coin, columns in case["columns"].items():
+        plotrender.plotrawdata(columns[1], "price", os.path.join(case["directory"], f"{coin}_price.png"))
+
+
+STAGES = {
+    "fetch": stage_fetch,
+    "json_load": stage_json_load,
+    "load": stage_load,
+    "metrics": stage_metrics,
+    "scaling": stage_scaling,
+    "dbscan": stage_dbscan,
+    "dbscan_sklearn": stage_dbscan_sklearn,
+    "isolation_forest": stage_isolation_forest,
+    "sweep": stage_sweep,
+    "contagion": stage_contagion,
+    "plotting": stage_plotting,
+}
+
+
+def measure(func, *args, repeat=3):
+    """
+    Time a call (best of repeat untraced runs) and record its peak memory in one more run under tracemalloc,
+    discarding anything it prints.
+
+    Returns:
+        tuple: The seconds taken and the peak memory in bytes allocated during the call.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return min(timings), peak
+
+
+def run(cases, stages=tuple(STAGES), seed=0, repeat=3):
+    """
+    Run every stage over every (points, coins) case.
+
+    Args:
+        cases (list): The (points, coins) cases, e.g. PROFILES["quick"].
+        stages (tuple): The stages to run. Default is every stage.
+        seed (int): The random seed of the synthetic series. Default is 0.
+        repeat (int): The number of timed runs of each stage, the fastest is kept. Default is 3.
+
+    Returns:
+        dict: The run "meta"data and the "results", one dict per (points, coins, stage).
+    """
+    results = []
+
+    with offline():
+        for points, coins in cases:
+            with tempfile.TemporaryDirectory() as directory:
+                case = prepare(points, coins, directory, seed)
+
+                for stage in stages:
+                    result = {"points": points, "coins": coins, "stage": stage}
+
+                    if points > LIMITS.get(stage, points):
+                        results.append({**result, "skipped": f"over the {LIMITS[stage]} point limit"})
+                        continue
+
+                    seconds, peak = measure(STAGES[stage], case, repeat=repeat)
+                    results.append({**result, "seconds": seconds, "peak_bytes": peak})
+                    print(f"{points:>10} points {coins:>4} coins  {stage:<17} {seconds:9.4f}s {peak / 2**20:10.1f} MiB")
+
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "seed": seed, "repeat": repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def startup(modules=STARTUP_MODULES, repeat=5):
+    """
+    Time importing each module in a fresh interpreter (best of repeat), recording the heavy dependencies it loaded.
+    Importing a module in PANDAS_FREE asserts that pandas was not loaded, a failed assertion is recorded as "failed".
+
+    Args:
+        modules (tuple): The modules to import. Default is the entry points in STARTUP_MODULES.
+        repeat (int): The number of fresh interpreters per module, the fastest is kept. Default is 5.
+
+    Returns:
+        list: One result per module, with the stage named "startup:<module>".
+    """
+    code = ("import json, sys, time\n"
+            "start = time.perf_counter()\n"
+            "import {module}\n"
+            "seconds = time.perf_counter() - start\n"
+            "assert not {lazy} or 'pandas' not in sys.modules, 'importing {module} loaded pandas'\n"
+            "print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))")
+    results = []
+
+    for module in modules:
+        runs = [subprocess.run([sys.executable, "-c", code.format(module=module, heavy=HEAVY_MODULES, lazy=module in PANDAS_FREE)], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))) for _ in range(repeat)]
+        failed = [run for run in runs if run.returncode != 0]
+
+        if failed:
+            error = failed[0].stderr.strip().splitlines()[-1]
+            outcome = "failed" if error.startswith("AssertionError") else "skipped"
+            results.append({"points": 0, "coins": 0, "stage": f"startup:{module}", outcome: error})
+            print(f"{module:<17} import failed: {error}")
+            continue
+
+        timings = [json.loads(run.stdout.strip().splitlines()[-1]) for run in runs]
+        best = min(timings, key=lambda timing: timing["seconds"])
+        results.append({"points": 0, "coins": 0, "stage": f"startup:{module}", **best})
+        print(f"{module:<17} {best['seconds']:9.4f}s  loads: {', '.join(best['heavy']) or '-'}")
+
+    return results
+
+
+def compare(report, baseline, threshold=REGRESSION):
+    """
+    Compare a run against a baseline run, stage by stage.
+
+    Args:
+        report (dict): The run returned by run().
+        baseline (dict): A run loaded from an earlier results file.
+        threshold (float): The slowdown ratio counted as a regression. Default is 1.25. Stages faster than NOISE seconds
+            in both runs are never counted.
+
+    Returns:
+        list: The regressed results, each with its baseline "ratio".
+    """
+    key = lambda result: (result["points"], result["coins"], result["stage"])
+    previous = {key(result): result for result in baseline["results"] if "seconds" in result}
+    regressions = []
+
+    for result in report["results"]:
+        if "seconds" not in result or key(result) not in previous:
+            continue
+
+        ratio = result["seconds"] / max(previous[key(result)]["seconds"], 1e-9)
+        regressed = ratio > threshold and max(result["seconds"], previous[key(result)]["seconds"]) >= NOISE
+        print(f"{result['points']:>10} points {result['coins']:>4} coins  {result['stage']:<17} {ratio:6.2f}x {'REGRESSION' if regressed else ''}")
+
+        if regressed:
+            regressions.append({**result, "ratio": ratio})
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the anomaly pipeline on synthetic series.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick", help="The (points, coins) cases to run.")
+    parser.add_argument("--points", type=int, nargs="+", help="Series lengths to run instead of the profile.")
+    parser.add_argument("--coins", type=int, nargs="+", default=[1], help="Coin counts crossed with --points.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage, the fastest is kept.")
+    parser.add_argument("--output", default="bench_results.json", help="The results file to write.")
+    parser.add_argument("--baseline", help="A results file to compare against. Exits with 1 on a regression.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION)
+    parser.add_argument("--startup", action="store_true", help="Only time the import of each entry point.")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        report = {"meta": {"python": platform.python_version(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+                  "results": startup(repeat=max(args.repeat, 1))}
+    else:
+        cases = [(points, coins) for points in args.points for coins in args.coins] if args.points else PROFILES[args.profile]
+        report = run(cases, tuple(args.stages), args.seed, args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if any("failed" in result for result in report["results"]):
+        return 1
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+
+Content-addressed on-disk cache for detector results.
+
+Results are keyed by a hash of the input series and the detector parameters, so rerunning a detector on unchanged
+data is a file read, and only series whose data changed are recomputed. The cache is bounded by total size and
+evicts the least recently used entries first.
+
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import utils
+
+
+## -- Bump to invalidate every entry when a detector's output changes --
+VERSION = 1
+
+
+class resultcache:
+    def __init__(self, directory=None, maxbytes=64 * 1024 * 1024):
+        """
+        On-disk LRU cache of detector results.
+
+        Args:
+            directory (str): The cache directory. Default is None, which uses .cache/detectors in the working directory.
+            maxbytes (int): The maximum total size of the cache in bytes. Default is 64 MiB.
+        """
+        self.directory = directory or os.path.join(utils.getdirs(), ".cache", "detectors")
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, values, detector, params):
+        """
+        Build the cache key of a detector run.
+
+        Args:
+            values (np.ndarray): The input series.
+            detector (str): The name of the detector (e.g., "dbscan").
+            params (dict): The detector parameters (e.g., eps, min_samples, contamination, random_state).
+
+        Returns:
+            str: The hex digest identifying the run.
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"version": VERSION, "detector": detector, "params": params, "shape": values.shape},
+                                 sort_keys=True, default=str).encode())
+        digest.update(values.tobytes())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Get a cached result and mark it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: The cached arrays by name, or None on a miss.
+        """
+        path = self.path(key)
+
+        try:
+            with np.load(path) as entry:
+                result = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return result
+
+    def put(self, key, **arrays):
+        """
+        Store a result, then evict the least recently used entries beyond the size limit.
+
+        Args:
+            key (str): The cache key.
+            **arrays: The result arrays by name.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmppath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(tmppath, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmppath, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits within maxbytes.
+        """
+        with self.lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".npz")]
+            except OSError:
+                return
+
+            stats = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries))
+            total = sum(size for _, size, _ in stats)
+
+            for _, size, path in stats:
+                if total <= self.maxbytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        """
+        Remove every cached entry.
+        """
+        maxbytes, self.maxbytes = self.maxbytes, -1
+        self.evict()
+        self.maxbytes = maxbytes
+
+
+## -- Shared by the detectors in analysis.py --
+detectorcache = resultcache()
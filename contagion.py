@@ -0,0 +1,398 @@
+"""
+
+Cross-coin rolling correlation, lead-lag and anomaly contagion for any number of coins.
+
+Every coin's series is aligned on one shared timestamp index (missing buckets are NaN), read straight from the
+memory-mapped store into a single (coins, time) matrix. From the log returns:
+
+- rolling correlation matrices come from cumulative sums (window means and variances) and strided window views
+  (cross products as one batched matrix product), with no loop over pairs;
+- lead-lag matrices correlate every coin with every other coin shifted by up to maxlag steps, one matrix product per lag;
+- anomaly dates that occur together (within a tolerance) across several coins are flagged, with the mean correlation
+  of the coins involved.
+
+    python contagion.py --coins bitcoin ethereum solana --window 30 --maxlag 5
+
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import analysis
+import batch
+import pipeline
+import storage
+import tsstore
+import utils
+
+
+COOCCURRENCE_COLUMNS = ["date", "timestamp", "count", "share", "coins", "correlation"]
+
+
+def load(coins, resolution="daily"):
+    """
+    Load the columns of every coin, from the time-series store when it has the coin and its data file otherwise.
+    Both are memory-mapped for .npy data, so nothing is copied until the series are aligned.
+
+    Args:
+        coins (list): The CoinGecko ids of the coins.
+        resolution (str): The time-series store resolution. Default is "daily".
+
+    Returns:
+        dict: Maps each coin with stored data to its columnar array.
+    """
+    columns = {}
+
+    for coin in coins:
+        if tsstore.store.has(coin, resolution):
+            columns[coin] = tsstore.store.columns(coin, resolution)
+        else:
+            try:
+                columns[coin] = storage.load(storage.find(coin))
+            except FileNotFoundError:
+                print(f"No data stored for {coin}, skipping it")
+
+    return columns
+
+
+def align(columns, resolution="daily", segment="price"):
+    """
+    Align one segment of every coin on a shared index of resolution buckets.
+
+    Args:
+        columns (dict): Maps each coin to its columnar array (see load()).
+        resolution (str): The bucket size, one of tsstore.RESOLUTIONS. Default is "daily".
+        segment (str): The segment aligned, "price", "volume" or "mcaps". Default is "price".
+
+    Returns:
+        tuple: The coins, the (t,) bucket timestamps in Unix milliseconds and the (coins, t) values, NaN where a coin
+        has no point in a bucket. The last point of a bucket wins, as in the time-series store.
+    """
+    step = tsstore.STEPS[resolution]
+    coins = list(columns)
+    buckets = {coin: np.floor_divide(np.asarray(columns[coin][0]), step) * step for coin in coins}
+    index = np.unique(np.concatenate([buckets[coin] for coin in coins])) if coins else np.empty(0)
+
+    values = np.full((len(coins), len(index)), np.nan)
+    row = pipeline.SEGMENTS[segment]
+
+    for i, coin in enumerate(coins):
+        ## -- Keep the last point of each bucket, the series are sorted by timestamp --
+        last = np.r_[buckets[coin][1:] != buckets[coin][:-1], True]
+        values[i, np.searchsorted(index, buckets[coin][last])] = np.asarray(columns[coin][row])[last]
+
+    return coins, index, values
+
+
+def logreturns(values):
+    """
+    Get the log returns of aligned values, in place of a copy where possible. The first bucket has no return (NaN).
+
+    Args:
+        values (np.ndarray): The (coins, t) aligned values.
+
+    Returns:
+        np.ndarray: The (coins, t) log returns, NaN where either bucket is missing or not positive.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.log(np.where(values > 0, values, np.nan))
+
+    returns = np.empty_like(logs)
+    returns[:, 0] = np.nan
+    np.subtract(logs[:, 1:], logs[:, :-1], out=returns[:, 1:])
+    return returns
+
+
+def windowstats(returns, window, ends):
+    """
+    Get the mean, standard deviation and number of valid points of every coin over the windows ending at ends,
+    from cumulative sums.
+
+    Args:
+        returns (np.ndarray): The (coins, t) returns, NaN where missing.
+        window (int): The window length.
+        ends (np.ndarray): The (inclusive) last position of every window.
+
+    Returns:
+        tuple: The (coins, windows) means, standard deviations and valid counts, with missing points counted as zero.
+    """
+    valid = np.isfinite(returns)
+    filled = np.where(valid, returns, 0.0)
+
+    sums = np.zeros((len(returns), returns.shape[1] + 1))
+    squares = np.zeros_like(sums)
+    counts = np.zeros(sums.shape, dtype=np.intp)
+    np.cumsum(filled, axis=1, out=sums[:, 1:])
+    np.cumsum(filled * filled, axis=1, out=squares[:, 1:])
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+
+    hi, lo = ends + 1, ends + 1 - window
+    means = (sums[:, hi] - sums[:, lo]) / window
+    variances = np.maximum((squares[:, hi] - squares[:, lo]) / window - means * means, 0.0)
+    return means, np.sqrt(variances), counts[:, hi] - counts[:, lo]
+
+
+def rolling_correlation(returns, window=30, step=1):
+    """
+    Get the correlation matrix of every coin pair over every rolling window.
+
+    Args:
+        returns (np.ndarray): The (coins, t) returns, NaN where missing.
+        window (int): The window length in buckets. Default is 30.
+        step (int): The number of buckets between consecutive windows. Default is 1.
+
+    Returns:
+        tuple: The (windows,) last position of every window and the (windows, coins, coins) correlations. A coin
+        with a missing or constant return in a window has NaN correlations for that window.
+    """
+    coins, length = returns.shape
+    ends = np.arange(window - 1, length, step)
+    if len(ends) == 0:
+        return ends, np.empty((0, coins, coins))
+
+    means, stds, counts = windowstats(returns, window, ends)
+    filled = np.where(np.isfinite(returns), returns, 0.0)
+
+    ## -- (coins, windows, window) strided view of every window, standardised with the cumulative sum statistics --
+    windows = np.lib.stride_tricks.sliding_window_view(filled, window, axis=1)[:, ends - window + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = (windows - means[..., None]) / stds[..., None]
+    scaled[~((counts == window) & (stds > 0))] = np.nan
+
+    scaled = scaled.transpose(1, 0, 2)
+    return ends, np.matmul(scaled, scaled.transpose(0, 2, 1)) / window
+
+
+def leadlag(returns, maxlag=5):
+    """
+    Get the lag at which every coin pair is most correlated over the whole aligned period.
+
+    Args:
+        returns (np.ndarray): The (coins, t) returns, NaN where missing.
+        maxlag (int): The largest lead or lag tried, in buckets. Default is 5.
+
+    Returns:
+        tuple: The (2 * maxlag + 1,) lags, the (lags, coins, coins) correlation of coin i at t with coin j at t + lag,
+        the (coins, coins) lag with the largest absolute correlation (positive when i leads j) and that correlation.
+    """
+    coins, length = returns.shape
+    maxlag = max(0, min(maxlag, length - 2))
+    lags = np.arange(-maxlag, maxlag + 1)
+    valid = np.isfinite(returns)
+
+    def standardised(segment, mask):
+        ## -- Standardise each coin over its own valid points, missing points become 0 (the mean) --
+        counts = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        filled = np.where(mask, segment, 0.0)
+        means = filled.sum(axis=1, keepdims=True) / counts
+        stds = np.sqrt(np.where(mask, (filled - means) ** 2, 0.0).sum(axis=1, keepdims=True) / counts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(mask, (filled - means) / stds, 0.0)
+
+    correlations = np.full((len(lags), coins, coins), np.nan)
+
+    for lag in range(maxlag + 1):
+        leading, lagging = standardised(returns[:, :length - lag], valid[:, :length - lag]), standardised(returns[:, lag:], valid[:, lag:])
+        overlap = valid[:, :length - lag].astype(np.float64) @ valid[:, lag:].T.astype(np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.where(overlap > 1, (leading @ lagging.T) / overlap, np.nan)
+
+        ## -- i leading j by lag is j lagging i by the same lag --
+        correlations[maxlag + lag] = matrix
+        correlations[maxlag - lag] = matrix.T
+
+    strength = np.where(np.isfinite(correlations), np.abs(correlations), -1.0)
+    best = np.argmax(strength, axis=0)
+    bestlag = lags[best]
+    bestcorrelation = np.take_along_axis(correlations, best[None], axis=0)[0]
+    bestlag[~np.isfinite(bestcorrelation)] = 0
+    np.fill_diagonal(bestlag, 0)
+
+    return lags, correlations, bestlag, bestcorrelation
+
+
+def anomaly_matrix(anomalies, coins, index, resolution="daily"):
+    """
+    Mark the anomalous buckets of every coin on the aligned index.
+
+    Args:
+        anomalies (pd.DataFrame): The anomaly table (see pipeline.TABLE_COLUMNS).
+        coins (list): The coins in aligned order.
+        index (np.ndarray): The aligned bucket timestamps.
+        resolution (str): The bucket size. Default is "daily".
+
+    Returns:
+        np.ndarray: The (coins, t) boolean matrix, True where any detector flagged any segment of a coin.
+    """
+    marked = np.zeros((len(coins), len(index)), dtype=bool)
+    if len(anomalies) == 0 or len(index) == 0:
+        return marked
+
+    rows = pd.Series(np.arange(len(coins)), index=coins).reindex(anomalies["coin"]).to_numpy()
+    buckets = np.floor_divide(anomalies["timestamp"].to_numpy(dtype=np.int64), tsstore.STEPS[resolution]) * tsstore.STEPS[resolution]
+    positions = np.minimum(np.searchsorted(index, buckets), len(index) - 1)
+
+    known = ~np.isnan(rows) & (index[positions] == buckets)
+    marked[rows[known].astype(np.intp), positions[known]] = True
+    return marked
+
+
+def cooccurrences(marked, coins, index, tolerance=1, mincoins=2, ends=None, correlations=None):
+    """
+    Flag the buckets where an anomaly of one coin coincides with anomalies of other coins.
+
+    Args:
+        marked (np.ndarray): The (coins, t) anomalous buckets (see anomaly_matrix()).
+        coins (list): The coins in aligned order.
+        index (np.ndarray): The aligned bucket timestamps.
+        tolerance (int): How many buckets apart two anomalies still count as together. Default is 1.
+        mincoins (int): The number of coins that must be anomalous together. Default is 2.
+        ends (np.ndarray): The last position of every rolling correlation window. Default is None.
+        correlations (np.ndarray): The rolling correlations of those windows, used to report the mean correlation of
+            the coins involved in the window ending at each flagged bucket. Default is None.
+
+    Returns:
+        pd.DataFrame: One row per flagged bucket (see COOCCURRENCE_COLUMNS).
+    """
+    ## -- A coin is involved at t when it has an anomaly within tolerance buckets of t, counted with a cumulative sum --
+    length = marked.shape[1]
+    counts = np.zeros((len(coins), length + 1), dtype=np.intp)
+    np.cumsum(marked, axis=1, out=counts[:, 1:])
+    positions = np.arange(length)
+    involved = (counts[:, np.minimum(positions + tolerance + 1, length)] - counts[:, np.maximum(positions - tolerance, 0)]) > 0
+
+    total = involved.sum(axis=0)
+    flagged = np.flatnonzero(marked.any(axis=0) & (total >= mincoins))
+
+    rows = []
+    for position in flagged:
+        members = np.flatnonzero(involved[:, position])
+        correlation = None
+
+        if correlations is not None and len(ends):
+            window = np.searchsorted(ends, position, side="right") - 1
+            if window >= 0:
+                block = correlations[window][np.ix_(members, members)]
+                pairs = block[np.triu_indices(len(members), 1)]
+                correlation = float(np.nanmean(pairs)) if np.isfinite(pairs).any() else None
+
+        rows.append([analysis.unix_to_datetime_string([index[position]])[0], int(index[position]), len(members),
+                     len(members) / len(coins), [coins[i] for i in members], correlation])
+
+    return pd.DataFrame(rows, columns=COOCCURRENCE_COLUMNS)
+
+
+def toppairs(matrix, coins, top=10, lags=None):
+    """
+    Get the most strongly correlated coin pairs of a (coins, coins) matrix, strongest first.
+    With the lead-lag lags, each pair is listed leading coin first with a lag of at least 0.
+    """
+    first, second = np.triu_indices(len(coins), 1)
+    values = matrix[first, second]
+    keep = np.flatnonzero(np.isfinite(values))
+    keep = keep[np.argsort(-np.abs(values[keep]), kind="stable")[:top]]
+
+    if lags is None:
+        return [{"coins": [coins[first[k]], coins[second[k]]], "correlation": float(values[k])} for k in keep]
+
+    pairs = []
+    for k in keep:
+        lag = int(lags[first[k], second[k]])
+        leader, follower = (first[k], second[k]) if lag >= 0 else (second[k], first[k])
+        pairs.append({"coins": [coins[leader], coins[follower]], "correlation": float(values[k]), "lag": abs(lag)})
+
+    return pairs
+
+
+def run_contagion(coins, resolution="daily", segment="price", window=30, step=1, maxlag=5, tolerance=1, mincoins=2, anomalies=None,
+                  save=True):
+    """
+    Align the coins, compute their rolling correlations and lead-lag, and flag co-occurring anomalies.
+
+    Args:
+        coins (list): The CoinGecko ids of the coins.
+        resolution (str): The resolution the coins are aligned at. Default is "daily".
+        segment (str): The segment correlated, "price", "volume" or "mcaps". Default is "price".
+        window (int): The rolling correlation window in buckets. Default is 30.
+        step (int): The number of buckets between rolling windows, the correlations take windows x coins^2 floats. Default is 1.
+        maxlag (int): The largest lead or lag tried, in buckets. Default is 5.
+        tolerance (int): How many buckets apart anomalies still count as together. Default is 1.
+        mincoins (int): The number of coins that must be anomalous together. Default is 2.
+        anomalies (pd.DataFrame): The anomaly table. Default is None, which uses data/anomalies.json and runs the
+            pipeline for coins that have no rows in it.
+        save (bool): Whether to store the co-occurrences and strongest pairs in data/contagion.json. Default is True.
+
+    Returns:
+        dict: The aligned "coins" and "index", the rolling correlation "ends" and "correlations", the "lags",
+        "leadlag", "bestlag" and "bestcorrelation" matrices, and the "cooccurrences" table.
+    """
+    coins, index, values = align(load(coins, resolution), resolution, segment)
+    returns = logreturns(values)
+
+    ends, correlations = rolling_correlation(returns, window, step)
+    lags, lagged, bestlag, bestcorrelation = leadlag(returns, maxlag)
+
+    if anomalies is None:
+        anomalies = batch.load_anomalies()
+        missing = sorted(set(coins) - set(anomalies["coin"]))
+        if missing:
+            table, _ = pipeline.run_pipeline(missing, resolution=resolution, save=False)
+            anomalies = pd.concat([anomalies, table], ignore_index=True) if len(anomalies) else table
+
+    marked = anomaly_matrix(anomalies[anomalies["coin"].isin(coins)], coins, index, resolution)
+    together = cooccurrences(marked, coins, index, tolerance, mincoins, ends, correlations)
+
+    result = {"coins": coins, "index": index, "ends": ends, "correlations": correlations, "lags": lags, "leadlag": lagged,
+              "bestlag": bestlag, "bestcorrelation": bestcorrelation, "cooccurrences": together}
+
+    if save:
+        latest = toppairs(correlations[-1], coins) if len(ends) else []
+        utils.dumpjson({"coins": coins, "segment": segment, "resolution": resolution, "window": window,
+                        "cooccurrences": together.astype(object).where(together.notna(), None).to_dict(orient="records"),
+                        "correlated": latest,
+                        "leadlag": toppairs(bestcorrelation, coins, lags=bestlag)},
+                       os.path.join(utils.getdirs(), "data/contagion.json"))
+
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling correlation, lead-lag and co-occurring anomalies across coins.")
+    parser.add_argument("--coins", nargs="+", default=tsstore.store.coins() or ["bitcoin", "ethereum"])
+    parser.add_argument("--resolution", choices=list(tsstore.RESOLUTIONS), default="daily")
+    parser.add_argument("--segment", choices=list(pipeline.SEGMENTS), default="price")
+    parser.add_argument("--window", type=int, default=30, help="The rolling correlation window in buckets.")
+    parser.add_argument("--step", type=int, default=1, help="The number of buckets between rolling windows.")
+    parser.add_argument("--maxlag", type=int, default=5, help="The largest lead or lag tried, in buckets.")
+    parser.add_argument("--tolerance", type=int, default=1, help="How many buckets apart anomalies still count as together.")
+    parser.add_argument("--mincoins", type=int, default=2, help="The number of coins that must be anomalous together.")
+    parser.add_argument("--no-save", action="store_true", help="Do not write data/contagion.json.")
+    args = parser.parse_args(argv)
+
+    result = run_contagion(args.coins, args.resolution, args.segment, args.window, args.step, args.maxlag, args.tolerance,
+                           args.mincoins, save=not args.no_save)
+    coins = result["coins"]
+
+    if len(result["ends"]):
+        print(f"\nMost correlated pairs over the last {args.window} buckets:")
+        for pair in toppairs(result["correlations"][-1], coins):
+            print(f"  {' / '.join(pair['coins'])}: {pair['correlation']:.3f}")
+
+    print("\nStrongest lead-lag pairs (the first coin leads by the lag):")
+    for pair in toppairs(result["bestcorrelation"], coins, lags=result["bestlag"]):
+        print(f"  {' -> '.join(pair['coins'])}: lag {pair['lag']}, correlation {pair['correlation']:.3f}")
+
+    together = result["cooccurrences"]
+    print(f"\n{len(together)} buckets with anomalies in at least {args.mincoins} coins:")
+    print(together.to_string(index=False) if len(together) else "  none")
+
+    return 0
+
+
+if __name__ == "__main__":
+
+    main()
@@ -1,89 +1,287 @@
-import pandas as pd
 import numpy as np
 import requests
 import json
-import utils
-import os
+import ratelimit
+import storage
+import tsstore
+import re
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+COINGECKO_URL = "https://api.coingecko.com/api/v3/coins/{coin}/market_chart?vs_currency=usd&days={days}&interval={interval}"
+
+
+def get_session(poolsize=10):
+    """
+
+    Build a requests session backed by a single keep-alive connection pool.
+
+    Args:
+        poolsize (int): The maximum number of pooled connections kept alive per host. Default is 10.
+
+    Returns:
+        requests.Session: The session to share between every coin request.
+
+    """
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=poolsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"accept": "application/json"})
+
+    return session
+
+
+def fetch_coin(session, coin, url, timeout=10):
+    """
+
+    Retrieve the market chart data for a single coin.
+
+    Args:
+        session (requests.Session): The shared session to send the request with.
+        coin (str): The CoinGecko id of the coin (e.g., "bitcoin", "solana").
+        url (str): The market chart URL for the coin.
+        timeout (int): The request timeout in seconds. Default is 10.
+
+    Returns:
+        dict: The market chart data for the coin.
+
+    """
+
+    response = ratelimit.limiter.request(session, "GET", url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+
+    ## -- Check for a valid nonempty response --
+    assert data, f"No data found for {coin}."
+    return data
+
+
+def fetch_coins(coins, maxworkers=8, storejson=True, baseurl=COINGECKO_URL, days=90, interval="daily", session=None, timeout=10,
+                incremental=False, keepdays=90, backend="npy"):
+    """
+
+    Retrieve the market chart data for any number of coins concurrently.
+    Requests run on a bounded thread pool over one shared keep-alive session, and a failure
+    for one coin is recorded in the summary without affecting the others.
+
+    Args:
+        coins (list): The CoinGecko ids of the coins to retrieve (e.g., ["bitcoin", "ethereum", "solana"]).
+        maxworkers (int): The maximum number of requests in flight at once. Default is 8.
+        storejson (bool): Whether to store each retrieved coin in data/<coin>_data.<backend> and the time-series store (tsstore.py). Default is True.
+        baseurl (str): The URL template, formatted with coin, days and interval. Default is the CoinGecko market chart URL.
+        days (int): The number of days of history to request. Default is 90.
+        interval (str): The data interval to request. Default is "daily".
+        session (requests.Session): The session to use. Default is None, which builds one sized to maxworkers.
+        timeout (int): The request timeout in seconds. Default is 10.
+        incremental (bool): Whether to request only the days missing from data/<coin>_data.<backend> and merge
+        them into the stored series. Coins without stored data are retrieved in full. Default is False.
+        keepdays (int): The number of days kept when merging incrementally, or None to keep the full history. Default is 90.
+        backend (str): The storage backend, one of "npy", "parquet" or "json" (see storage.py). Default is "npy".
+
+    Returns:
+        dict: A summary with the retrieved "data" per coin, the "succeeded" coins, the "failed" coins
+        mapped to their error message, the "days" requested per coin and the "elapsed" wall-clock time in seconds.
+
+    """
+
+    coins = list(dict.fromkeys(coins))
+    ownsession = session is None
+    session = get_session(poolsize=maxworkers) if ownsession else session
+
+    datapaths = {coin: storage.datapath(coin, backend) for coin in coins}
+    existing = {coin: load_stored(storage.find(coin)) for coin in coins} if incremental else {}
+
+    ## -- Only request the days after the last stored point when merging incrementally --
+    requestdays = {coin: missing_days(existing[coin], days) if existing.get(coin) else days for coin in coins}
+
+    summary = {"data": {}, "succeeded": [], "failed": {}, "days": requestdays, "elapsed": 0.0}
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(maxworkers, len(coins) or 1))) as executor:
+            futures = {
+                executor.submit(fetch_coin, session, coin, baseurl.format(coin=coin, days=requestdays[coin], interval=interval), timeout): coin
+                for coin in coins
+            }
+
+            for future in as_completed(futures):
+                coin = futures[future]
+
+                try:
+                    result = future.result()
+                    summary["data"][coin] = merge_series(existing[coin], result, keepdays) if existing.get(coin) else result
+                    summary["succeeded"].append(coin)
+                except Exception as e:
+                    summary["failed"][coin] = str(e)
+                    print(f"Error retrieving data for {coin}: {e}, check VPN or internet connection.")
+    finally:
+        session.close() if ownsession else None
+
+    summary["elapsed"] = time.perf_counter() - start
+
+    if storejson:
+        for coin in summary["succeeded"]:
+            columns = storage.from_marketchart(summary["data"][coin])
+            storage.save(columns, datapaths[coin])
+            tsstore.store.write(coin, columns)
+
+    print(f"Retrieved {len(summary['succeeded'])}/{len(coins)} coins in {summary['elapsed']:.2f}s.")
+    print(f"Failed coins: {', '.join(summary['failed'])}") if summary["failed"] else None
+
+    return summary
+
+
+def load_stored(filename):
+    """
+
+    Load previously stored market chart data from any storage backend.
+
+    Args:
+        filename (str): The path of the stored data file.
+
+    Returns:
+        dict: The stored data, or None if the file is missing or unreadable.
+
+    """
+
+    try:
+        data = storage.to_marketchart(storage.load(filename))
+    except (OSError, ValueError):
+        return None
+
+    return data if data and data.get("prices") else None
+
+
+def missing_days(existing, maxdays=90, now=None):
+    """
+
+    Get the number of days to request so that every day after the last stored daily point is covered.
+    The last point of a daily series is a live snapshot, so the count starts from the last point on a day boundary.
+
+    Args:
+        existing (dict): The stored market chart data.
+        maxdays (int): The largest number of days to request. Default is 90.
+        now (float): The current unix time in milliseconds. Default is None, which uses the current time.
+
+    Returns:
+        int: The number of days to request.
+
+    """
+
+    now = time.time() * 1000 if now is None else now
+    timestamps = [point[0] for point in existing["prices"]]
+    daily = [t for t in timestamps if t % DAY_MS == 0] or timestamps
+
+    return int(min(maxdays, max(1, np.ceil((now - max(daily)) / DAY_MS))))
+
+
+def merge_series(existing, new, keepdays=90):
+    """
+
+    Merge newly retrieved market chart data into the stored data.
+    Points are deduplicated by timestamp with the new value winning, stale live snapshots
+    (points off a day boundary that are not the latest point) are dropped and the
+    series are trimmed to the last keepdays days.
+
+    Args:
+        existing (dict): The stored market chart data.
+        new (dict): The newly retrieved market chart data.
+        keepdays (int): The number of days to keep, or None to keep the full history. Default is 90.
+
+    Returns:
+        dict: The merged market chart data.
+
+    """
+
+    merged = {}
+
+    for key in ("prices", "market_caps", "total_volumes"):
+        points = {point[0]: point for point in existing.get(key, [])}
+        points.update({point[0]: point for point in new.get(key, [])})
+
+        timestamps = sorted(points)
+        latest = timestamps[-1] if timestamps else None
+        series = [points[t] for t in timestamps if t % DAY_MS == 0 or t == latest]
+
+        if keepdays is not None and series:
+            cutoff = series[-1][0] - keepdays * DAY_MS
+            series = [point for point in series if point[0] >= cutoff]
+
+        merged[key] = series
+
+    return merged
+
+
+def storejson_file(data, filename):
+    """
+
+    Store the data in a dedicated JSON file.
+
+    Args:
+        data (dict): The data to be stored.
+        filename (str): The path where the JSON file will be saved.
+
+    """
+
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=2)
+
+    print(f"Data stored in {filename}")
 
 
 class cryptodata:
-    def __init__(self, coin, storejson=True):
+    def __init__(self, coin, storejson=True, maxworkers=8, incremental=False, backend="npy"):
 
         """
         Initialize the cryptodata class.
         
         
         Args:
-            coin (str): The name of the cryptocurrency to retrieve data for. Options are "bitcoin", "ethereum", or "both".
-            storejson (bool): Whether to store the retrieved data in JSON files. Default is True.
+            coin (str or list): The CoinGecko id of the cryptocurrency to retrieve data for, "both" for bitcoin and ethereum,
+            or a list of CoinGecko ids which are retrieved concurrently.
+            storejson (bool): Whether to store the retrieved data in data/<coin>_data.<backend>. Default is True.
+            maxworkers (int): The maximum number of coins retrieved at once. Default is 8.
+            incremental (bool): Whether to request only the days missing from the stored data and merge them in. Default is False.
+            backend (str): The storage backend, one of "npy", "parquet" or "json". JSON is kept for import/export. Default is "npy".
 
 
         """
 
         ## -- Store coin variable and url dictionary internally --
         self.coin = coin
-        self.urls = self.get_data_urldict()
+        self.coins = ["bitcoin", "ethereum"] if coin == "both" else [coin] if isinstance(coin, str) else list(coin)
 
         ## -- Get the filename to store the data based on user's local machine directory and validate --)
         self.validate()
+        self.urls = self.get_data_urldict()
 
-        try:
-            
-            ## -- From https://docs.coingecko.com/v3.0.1/reference/coins-id-market-chart --
-            print(f"Retrieving data for {self.coin} ethereum and bitcoin...") if self.coin == "both" else print(f"Retrieving data for {self.coin}...")
-
-            if self.coin == "both":
-                
-                ## -- Get URL from the dictionary for both coins --
-                ethurl = self.urls["ethereum"]
-                btcurl = self.urls["bitcoin"]
-
-                ## -- Set headers for the requests for both coins --
-                ethereumresponse = requests.get(ethurl, headers={"accept": "application/json"}, timeout=10)
-                bitcoinresponse = requests.get(btcurl, headers={"accept": "application/json"}, timeout=10)
-
-                ## -- Get response --
-                self.ethereumdata = ethereumresponse.json()
-                self.bitcoindata = bitcoinresponse.json()
-
-                ## -- Check for a valid nonempty response --
-                assert self.ethereumdata, "No data found for ethereum."
-                assert self.bitcoindata, "No data found for bitcoin."
-                
-                print(f"Data retrieved successfully for {self.coin} bitcoin and ethereum.")
-
-                self.storejson(self.ethereumdata, os.path.join(utils.getdirs(), "data/ethereum_data.json")) if storejson else None
-                self.storejson(self.bitcoindata, os.path.join(utils.getdirs(), "data/bitcoin_data.json")) if storejson else None
-
-            elif self.coin == "bitcoin" or self.coin == "ethereum":
-
-                ## -- Get URL from the dictionary --
-                url = self.urls[self.coin]
-
-                ## -- Set headers for the request --
-                headers = {"accept": "application/json"}
-
-                ## -- Make the API request and get the response as JSON --
-                apiresponse = requests.get(url, headers=headers, timeout=10)
-                self.data = apiresponse.json()
+        ## -- From https://docs.coingecko.com/v3.0.1/reference/coins-id-market-chart --
+        print(f"Retrieving data for {', '.join(self.coins)}...")
 
-                ## -- Check for a valid nonempty response --
-                assert self.data, f"No data found for {self.coin}."
-                self.storejson(self.data, os.path.join(utils.getdirs(), f"data/{self.coin}_data.json")) if storejson else None
+        self.summary = fetch_coins(self.coins, maxworkers=maxworkers, storejson=storejson, incremental=incremental, backend=backend)
+        self.results = self.summary["data"]
 
-        except Exception as e:
-            print(f"Error retrieving data for {self.coin}: {e}, check VPN or internet connection.")
+        ## -- Keep the per-coin attributes used by earlier callers --
+        self.bitcoindata = self.results.get("bitcoin")
+        self.ethereumdata = self.results.get("ethereum")
+        self.data = self.results.get(self.coins[0]) if len(self.coins) == 1 else self.results
 
 
     def validate(self):
         """
         
-        Ensure the coin name is valid
+        Ensure the coin names are valid CoinGecko ids
         
         """
 
-        if self.coin not in ["bitcoin", "ethereum", "both"]:
-            raise ValueError("Invalid coin name. Please choose either 'bitcoin', 'ethereum' or 'both'.")
+        if not self.coins or not all(isinstance(coin, str) and re.fullmatch(r"[a-z0-9-]+", coin) for coin in self.coins):
+            raise ValueError("Invalid coin name. Please choose 'both' or CoinGecko ids such as 'bitcoin' or 'ethereum'.")
         
         print("Data validated successfully!")
 
@@ -96,10 +294,7 @@ class cryptodata:
         
         """
 
-        urls = {
-            "bitcoin": "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart?vs_currency=usd&days=90&interval=daily",
-            "ethereum": "https://api.coingecko.com/api/v3/coins/ethereum/market_chart?vs_currency=usd&days=90&interval=daily"
-        }
+        urls = {coin: COINGECKO_URL.format(coin=coin, days=90, interval="daily") for coin in self.coins}
 
         return urls
     
@@ -115,7 +310,4 @@ class cryptodata:
         
         """
 
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2)
-
-        print(f"Data stored in {filename}")
+        storejson_file(data, filename)
@@ -0,0 +1,116 @@
+"""
+
+Exact DBSCAN for one-dimensional data in O(n log n) time and O(n) memory.
+
+After sorting, the eps-neighbourhood of every point is a contiguous window found with binary searches, core points
+within eps of each other form contiguous runs, and a border point can only touch the nearest core on either side.
+Labels match sklearn.cluster.DBSCAN(algorithm="kd_tree") exactly: neighbours are the points with (a - b)^2 <= eps^2
+(the squared distance sklearn's tree compares), cluster ids are numbered in order of each cluster's first core point in
+the input, and a border point joins the lowest numbered cluster it touches. sklearn's default algorithm="auto" uses the
+tree from 12 points on; below that it uses brute force, whose expanded distance a^2 - 2ab + b^2 can put a pair exactly
+eps apart outside the radius, so the labels of such small inputs can differ where a distance ties with eps.
+
+"""
+
+import numpy as np
+
+
+def neighbourwindows(x, eps):
+    """
+    Get the eps-neighbourhood of every point of a sorted array as a [left, right) window of positions.
+
+    Args:
+        x (np.ndarray): The sorted values.
+        eps (float): The neighbourhood radius.
+
+    Returns:
+        tuple: The left (inclusive) and right (exclusive) window bounds.
+    """
+    radius = eps * eps
+    within = lambda i, j: (x[i] - x[j]) ** 2 <= radius
+
+    ## -- searchsorted on x -/+ eps is right up to rounding, so step the bounds a whole run of equal values at a time until exact --
+    positions = np.arange(len(x))
+    left = np.searchsorted(x, x - eps, side="left")
+    right = np.searchsorted(x, x + eps, side="right")
+
+    while True:
+        shrink = ~within(positions, left)
+        grow = (left > 0) & within(positions, np.maximum(left - 1, 0)) & ~shrink
+        if not (shrink.any() or grow.any()):
+            break
+        left[shrink] = np.searchsorted(x, x[left[shrink]], side="right")
+        left[grow] = np.searchsorted(x, x[left[grow] - 1], side="left")
+
+    while True:
+        last = np.maximum(right - 1, 0)
+        shrink = ~within(positions, last)
+        grow = (right < len(x)) & within(positions, np.minimum(right, len(x) - 1)) & ~shrink
+        if not (shrink.any() or grow.any()):
+            break
+        right[shrink] = np.searchsorted(x, x[last[shrink]], side="left")
+        right[grow] = np.searchsorted(x, x[right[grow]], side="right")
+
+    return left, right
+
+
+def dbscan(values, eps=0.5, min_samples=5):
+    """
+    Cluster one-dimensional values with DBSCAN.
+
+    Args:
+        values (np.ndarray): The values, shaped (n,) or (n, 1).
+        eps (float): The maximum distance between two neighbours. Default is 0.5, as in sklearn.
+        min_samples (int): The number of neighbours, including the point itself, that makes a point a core point. Default is 5.
+
+    Returns:
+        np.ndarray: The cluster label of every point, -1 for noise, identical to sklearn.cluster.DBSCAN(eps, min_samples, algorithm="kd_tree").fit_predict().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 2 and values.shape[1] == 1:
+        values = values[:, 0]
+    if values.ndim != 1:
+        raise ValueError(f"dbscan1d only clusters one-dimensional data, got shape {values.shape}.")
+    if not np.isfinite(values).all():
+        raise ValueError("Input contains NaN or infinity.")
+    if eps <= 0:
+        raise ValueError(f"eps must be positive, got {eps}.")
+
+    n = len(values)
+    labels = np.full(n, -1, dtype=np.intp)
+    if n == 0:
+        return labels
+
+    order = np.argsort(values, kind="stable")
+    x = values[order]
+    left, right = neighbourwindows(x, eps)
+
+    core = (right - left) >= min_samples
+    cores = np.flatnonzero(core)
+    if len(cores) == 0:
+        return labels
+
+    ## -- Consecutive cores within eps of each other are one cluster, later cores are only further away --
+    breaks = np.r_[True, cores[1:] >= right[cores[:-1]]]
+    run = np.cumsum(breaks) - 1
+
+    ## -- Number the clusters by their first core point in input order, the order sklearn discovers them in --
+    firstindex = np.minimum.reduceat(order[cores], np.flatnonzero(breaks))
+    clusterid = np.empty(len(firstindex), dtype=np.intp)
+    clusterid[np.argsort(firstindex, kind="stable")] = np.arange(len(firstindex))
+
+    sortedlabels = np.full(n, -1, dtype=np.intp)
+    sortedlabels[cores] = clusterid[run]
+
+    ## -- A border point touches at most the nearest core on either side, and joins the lower numbered cluster --
+    corecount = np.cumsum(core)
+    previous = np.where(corecount > 0, cores[np.maximum(corecount - 1, 0)], -1)
+    following = np.where(corecount - core < len(cores), cores[np.minimum(corecount - core, len(cores) - 1)], n)
+
+    border = np.flatnonzero(~core)
+    fromleft = np.where(previous[border] >= left[border], sortedlabels[np.maximum(previous[border], 0)], -1)
+    fromright = np.where(following[border] < right[border], sortedlabels[np.minimum(following[border], n - 1)], -1)
+    sortedlabels[border] = np.where((fromleft >= 0) & (fromright >= 0), np.minimum(fromleft, fromright), np.maximum(fromleft, fromright))
+
+    labels[order] = sortedlabels
+    return labels
@@ -0,0 +1,273 @@
+"""
+
+Query planner for GDELT article searches around anomaly dates.
+
+Each anomaly is searched over a window of +/- 7 days. Overlapping windows are merged so each merged window is
+queried once, the articles are split back to the anomalies whose window contains them, and every query result is
+kept in a persistent cache keyed by (keyword, window). Windows that had not yet ended when searched are only reused for
+an hour, as GDELT keeps adding their articles. Uncached windows are searched concurrently, and a failed window is
+reported for retrying without stopping the rest.
+
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import articlestore
+import linkcheck
+import ratelimit
+import utils
+
+
+## -- GDELT returns at most 250 records per article search --
+MAX_RECORDS = 250
+
+## -- A window searched before its end plus a day of indexing lag can still gain articles, so its result is kept for an hour --
+SETTLE = timedelta(days=1)
+OPEN_TTL = 60 * 60
+
+
+class querycache:
+    def __init__(self, directory=None):
+        """
+        Persistent cache of GDELT query results keyed by (keyword, window).
+
+        Args:
+            directory (str): The cache directory. Default is None, which uses .cache/gdelt in the working directory.
+        """
+        self.directory = directory or os.path.join(utils.getdirs(), ".cache", "gdelt")
+
+    def path(self, keyword, start, end, numrecords):
+        key = hashlib.sha256(json.dumps([keyword, str(start), str(end), numrecords]).encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, keyword, start, end, numrecords):
+        """
+        Get a cached query result. The result of a window that was still open when it was searched expires after OPEN_TTL.
+
+        Returns:
+            tuple: The articles and timeline DataFrames, or None on a miss.
+        """
+        try:
+            with open(self.path(keyword, start, end, numrecords), "r") as f:
+                entry = json.load(f)
+                fetched = os.fstat(f.fileno()).st_mtime
+        except (OSError, ValueError):
+            return None
+
+        if datetime.datetime.fromtimestamp(fetched) < end + SETTLE and time.time() - fetched > OPEN_TTL:
+            return None
+
+        import pandas as pd
+
+        return pd.DataFrame(entry["articles"]), pd.DataFrame(entry["timeline"])
+
+    def put(self, keyword, start, end, numrecords, articles, timeline):
+        """
+        Store a query result.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        utils.dumpjson({"keyword": keyword, "start": str(start), "end": str(end),
+                        "articles": json.loads(articles.to_json(orient="records", date_format="iso")),
+                        "timeline": json.loads(timeline.to_json(orient="records", date_format="iso"))},
+                       self.path(keyword, start, end, numrecords))
+
+
+def plan_windows(anomalydates, radius=7):
+    """
+    Merge the +/- radius day windows of the anomaly dates wherever they overlap.
+
+    Args:
+        anomalydates (list): The anomaly dates in the format "YYYY-MM-DD". Duplicates are ignored.
+        radius (int): The number of days searched either side of an anomaly. Default is 7.
+
+    Returns:
+        list: The merged windows as dicts with "start" and "end" datetimes and the anomaly "dates" they cover.
+    """
+    windows = []
+
+    for date in sorted(set(anomalydates)):
+        day = datetime.datetime.strptime(date, "%Y-%m-%d")
+        start, end = day - timedelta(days=radius), day + timedelta(days=radius)
+
+        if windows and start <= windows[-1]["end"]:
+            windows[-1]["end"] = max(windows[-1]["end"], end)
+            windows[-1]["dates"].append(date)
+        else:
+            windows.append({"start": start, "end": end, "dates": [date]})
+
+    return windows
+
+
+def windowkey(window):
+    """
+    Get a readable key for a window, e.g. "2025-05-30..2025-06-15".
+    """
+    return f"{window['start']:%Y-%m-%d}..{window['end']:%Y-%m-%d}"
+
+
+def fetch_windows(windows, keyword, perdate=10, gd=None, cache=None, maxworkers=4):
+    """
+    Search GDELT articles and volume timelines for many windows concurrently.
+    The article and timeline searches of every uncached window run in parallel on a bounded thread pool
+    (still drawing from ratelimit's GDELT bucket), and a failed window is recorded without stopping the others.
+
+    Args:
+        windows (list): The windows from plan_windows().
+        keyword (str): The search keyword (the coin).
+        perdate (int): The number of articles requested per anomaly date in a window. Default is 10.
+        gd (GdeltDoc): The GDELT client, or any object with the same article_search/timeline_search methods. Default is None, which creates one.
+        cache (querycache): The query cache. Default is None, which uses .cache/gdelt.
+        maxworkers (int): The maximum number of searches in flight at once. Default is 4.
+
+    Returns:
+        dict: The "results" (window key to (articles, timeline) DataFrames) of the windows that succeeded, the "failed"
+        windows (window key to error message) and the "retry" list of failed windows, ready to pass back in.
+    """
+    cache = cache or querycache()
+    summary = {"results": {}, "failed": {}, "retry": []}
+    pending = []
+
+    for window in windows:
+        numrecords = min(MAX_RECORDS, perdate * len(window["dates"]))
+        cached = cache.get(keyword, window["start"], window["end"], numrecords)
+
+        if cached is not None:
+            summary["results"][windowkey(window)] = cached
+        else:
+            pending.append((window, numrecords))
+
+    if not pending:
+        return summary
+
+    ## -- gdeltdoc is only imported once a window actually has to be searched --
+    from gdeltdoc import GdeltDoc, Filters
+
+    gd = gd or GdeltDoc()
+    parts = {windowkey(window): {} for window, _ in pending}
+
+    with ThreadPoolExecutor(max_workers=max(1, maxworkers)) as executor:
+        futures = {}
+
+        for window, numrecords in pending:
+            filter = Filters(keyword=keyword, start_date=window["start"], end_date=window["end"], num_records=numrecords, language="English")
+            futures[executor.submit(ratelimit.limiter.call, ratelimit.GDELT_HOST, gd.article_search, filter)] = (windowkey(window), "articles")
+            futures[executor.submit(ratelimit.limiter.call, ratelimit.GDELT_HOST, gd.timeline_search, filters=filter, mode="timelinevol")] = (windowkey(window), "timeline")
+
+        for future in as_completed(futures):
+            key, kind = futures[future]
+
+            try:
+                parts[key][kind] = future.result()
+            except Exception as e:
+                parts[key]["error"] = f"{kind} search failed: {e}"
+
+    for window, numrecords in pending:
+        key = windowkey(window)
+
+        if "error" in parts[key]:
+            summary["failed"][key] = parts[key]["error"]
+            summary["retry"].append(window)
+            print(f"GDELT query for {key} failed: {parts[key]['error']}")
+            continue
+
+        cache.put(keyword, window["start"], window["end"], numrecords, parts[key]["articles"], parts[key]["timeline"])
+        summary["results"][key] = (parts[key]["articles"], parts[key]["timeline"])
+
+    return summary
+
+
+def split_articles(articles, dates, radius=7, perdate=10):
+    """
+    Assign the articles of a merged window back to each anomaly whose own window contains them.
+
+    Args:
+        articles (pd.DataFrame): The articles of the merged window, with GDELT's "seendate" column.
+        dates (list): The anomaly dates covered by the window.
+        radius (int): The number of days searched either side of an anomaly. Default is 7.
+        perdate (int): The maximum number of articles kept per anomaly. Default is 10.
+
+    Returns:
+        dict: Maps each anomaly date to its list of article URLs.
+    """
+    if articles.empty or "seendate" not in articles:
+        return {date: [] for date in dates}
+
+    import pandas as pd
+
+    seen = pd.to_datetime(articles["seendate"], format="%Y%m%dT%H%M%SZ", errors="coerce")
+    split = {}
+
+    for date in dates:
+        day = datetime.datetime.strptime(date, "%Y-%m-%d")
+        inwindow = (seen >= day - timedelta(days=radius)) & (seen <= day + timedelta(days=radius))
+        split[date] = list(articles.loc[inwindow, "url"].head(perdate))
+
+    return split
+
+
+def query_anomalies(anomalydates, coin, gd=None, radius=7, perdate=10, storejson=False, cache=None, maxworkers=4, store=True):
+    """
+    Query GDELT once per merged window, concurrently, and store the live articles of each anomaly date.
+    Windows that fail are reported for retrying while the others are still processed.
+
+    Args:
+        anomalydates (list): The anomaly dates in the format "YYYY-MM-DD", e.g. the price, volume and market cap anomalies together.
+        coin (str): The coin used as the search keyword (e.g., "bitcoin").
+        gd (GdeltDoc): The GDELT client. Default is None, which creates one.
+        radius (int): The number of days searched either side of an anomaly. Default is 7.
+        perdate (int): The maximum number of articles kept per anomaly. Default is 10.
+        storejson (bool): Whether to also export each anomaly's articles to data/<coin>_events/. Default is False.
+        cache (querycache): The query cache. Default is None, which uses .cache/gdelt.
+        maxworkers (int): The maximum number of GDELT searches in flight at once. Default is 4.
+        store (bool): Whether to store each anomaly's articles in the article store (data/articles.sqlite). Default is True.
+
+    Returns:
+        dict: The "articles" (anomaly date to its list of live article URLs, empty when nothing was found),
+        the "failed" anomaly dates mapped to their error, and the "retry" windows to pass to fetch_windows() again.
+    """
+    windows = plan_windows(anomalydates, radius)
+    print(f"Planned {len(windows)} GDELT queries for {len(set(anomalydates))} anomaly dates.")
+
+    fetched = fetch_windows(windows, coin, perdate=perdate, gd=gd, cache=cache, maxworkers=maxworkers)
+    results = {"articles": {}, "failed": {}, "retry": fetched["retry"]}
+
+    for window in windows:
+        key = windowkey(window)
+
+        if key in fetched["failed"]:
+            results["failed"].update({date: fetched["failed"][key] for date in window["dates"]})
+            continue
+
+        articles, timeline = fetched["results"][key]
+
+        if timeline.empty:
+            print(f"No timeline data found for {key}. Skipping.")
+            results["articles"].update({date: [] for date in window["dates"]})
+            continue
+
+        for date, urls in split_articles(articles, window["dates"], radius, perdate).items():
+            results["articles"][date] = linkcheck.get_checker().alive(urls) if urls else []
+
+            if not results["articles"][date]:
+                print(f"No articles found for {date}. Skipping.")
+                continue
+
+            if storejson:
+                eventsdir = os.path.join(utils.getdirs(), f"data/{coin}_events")
+                os.makedirs(eventsdir, exist_ok=True)
+                utils.dumpjson(results["articles"][date], os.path.join(eventsdir, f"processed_events_for_{date}.json"))
+
+    if store:
+        with articlestore.articlestore() as articles_db:
+            for date, urls in results["articles"].items():
+                articles_db.add(coin, date, urls)
+
+    print(f"{len(fetched['retry'])} GDELT windows need retrying: {', '.join(windowkey(w) for w in fetched['retry'])}") if fetched["retry"] else None
+    return results
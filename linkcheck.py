@@ -0,0 +1,193 @@
+"""
+
+Concurrent URL liveness checks for GDELT articles.
+
+URLs are checked on a thread pool over one shared session, with a cap on concurrent requests per host. Results are
+cached with a TTL, so URLs repeated across overlapping anomaly windows are only checked once. Failed requests are only
+reused for a few minutes, so a brief network error does not drop an article for a day.
+
+"""
+
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+import tracing
+import utils
+
+
+## -- Statuses some servers send to HEAD requests they do not support --
+HEAD_REJECTED = {403, 405, 501}
+
+
+class linkchecker:
+    def __init__(self, maxworkers=16, perhost=4, timeout=5, ttl=24 * 60 * 60, failurettl=5 * 60, cachepath=None):
+        """
+        Concurrent URL checker with a per-host connection limit and a TTL cache of results.
+
+        Args:
+            maxworkers (int): The maximum number of URLs checked at once. Default is 16.
+            perhost (int): The maximum number of concurrent requests to a single host. Default is 4.
+            timeout (int): The request timeout in seconds. Default is 5.
+            ttl (int): How long a checked status is reused, in seconds. Default is one day.
+            failurettl (int): How long a failed request (no status) is reused, in seconds. Default is five minutes.
+            cachepath (str): The JSON file the results are persisted to. Default is None, which uses .cache/linkcheck.json.
+        """
+        self.maxworkers = maxworkers
+        self.perhost = perhost
+        self.timeout = timeout
+        self.ttl = ttl
+        self.failurettl = failurettl
+        self.cachepath = cachepath or os.path.join(utils.getdirs(), ".cache", "linkcheck.json")
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=maxworkers, pool_maxsize=perhost)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.hostlimits = {}
+        self.lock = threading.Lock()
+        self.results = self.load()
+
+    def load(self):
+        """
+        Load the persisted results.
+
+        Returns:
+            dict: Maps each URL to its [status, checked at] pair.
+        """
+        try:
+            with open(self.cachepath, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def fresh(self, entry, now=None):
+        """
+        Check whether a [status, checked at] entry is still within its TTL, the short failurettl for failed requests.
+        """
+        return (now or time.time()) - entry[1] < (self.ttl if entry[0] is not None else self.failurettl)
+
+    def save(self):
+        """
+        Persist the results that are still within their TTL.
+        """
+        now = time.time()
+        with self.lock:
+            results = {url: entry for url, entry in self.results.items() if self.fresh(entry, now)}
+
+        os.makedirs(os.path.dirname(self.cachepath), exist_ok=True)
+        utils.dumpjson(results, self.cachepath)
+
+    def hostlimit(self, host):
+        """
+        Get the semaphore capping the concurrent requests to a host, creating it on first use.
+        """
+        with self.lock:
+            if host not in self.hostlimits:
+                self.hostlimits[host] = threading.Semaphore(self.perhost)
+            return self.hostlimits[host]
+
+    def request(self, url):
+        """
+        Get the status of a URL with HEAD, falling back to GET for servers that reject HEAD.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            int: The HTTP status, or None if the request failed.
+        """
+        host = urlparse(url).hostname
+
+        with self.hostlimit(host), tracing.tracer.span("linkcheck", host=host, method="HEAD") as span:
+            try:
+                response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+                response.close()
+
+                if response.status_code in HEAD_REJECTED:
+                    ## -- Stream so only the headers are read --
+                    span["attrs"]["method"] = "GET"
+                    with self.session.get(url, allow_redirects=True, timeout=self.timeout, stream=True) as response:
+                        pass
+
+                span["attrs"]["status"] = response.status_code
+                span["bytes"] = int(response.headers.get("Content-Length") or 0)
+                return response.status_code
+            except requests.RequestException as e:
+                span["outcome"] = "error"
+                span["error"] = str(e)
+                print(f"Error checking URL {url}: {e}")
+                return None
+
+    def status(self, url):
+        """
+        Get the status of a URL, from the cache when it was checked within its TTL.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            int: The HTTP status, or None if the request failed.
+        """
+        with self.lock:
+            entry = self.results.get(url)
+
+        if entry is not None and self.fresh(entry):
+            return entry[0]
+
+        status = self.request(url)
+        with self.lock:
+            self.results[url] = [status, time.time()]
+
+        return status
+
+    def check(self, urls):
+        """
+        Check many URLs concurrently. Duplicates are only checked once.
+
+        Args:
+            urls (list): The URLs to check.
+
+        Returns:
+            dict: Maps each distinct URL to its HTTP status (None if the request failed).
+        """
+        urls = list(dict.fromkeys(urls))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.maxworkers, len(urls)))) as executor:
+            statuses = dict(zip(urls, executor.map(self.status, urls)))
+
+        self.save()
+        return statuses
+
+    def alive(self, urls):
+        """
+        Keep the URLs that respond with 200, in their original order.
+
+        Args:
+            urls (list): The URLs to check.
+
+        Returns:
+            list: The live URLs.
+        """
+        statuses = self.check(urls)
+        return [url for url in urls if statuses[url] == 200]
+
+
+_checker = None
+
+
+def get_checker():
+    """
+    Get the checker shared by every caller, so its session and cache are reused across queries.
+    """
+    global _checker
+    if _checker is None:
+        _checker = linkchecker()
+    return _checker
@@ -5,12 +5,33 @@ Runs semantic analysis using GDELT articles and anomaly dates of cryptocurrencie
 """
 
 
+import hashlib
+import json
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
 from google.generativeai import GenerativeModel, configure
-from utils import get_key
+from utils import get_key, getdirs, dumpjson
+from ratelimit import limiter, GEMINI_HOST
+from tracing import tracer
+
+_configured = False
+
+
+def configure_gemini():
+    """
+    Configure the Gemini client with the key in api_config.yml, once, when the first model is created.
+    """
+    global _configured
+    if not _configured:
+        configure(api_key=get_key("gemini"))
+        _configured = True
+
 
-configure(api_key=get_key("gemini"))
 class GeminiModel(GenerativeModel):
     def __init__(self, role:str, examples: str, instruction: str, model_name: str = "gemini-2.5-flash"):
+        configure_gemini()
         super().__init__(model_name=model_name)
         self.model_name = model_name
         self.role = role
@@ -27,7 +48,7 @@ class GeminiModel(GenerativeModel):
             articles (str): The articles to include in the prompt.
 
         """
-        return PromptBuild(articles, self.role, self.examples, self.instruction).build_prompt()
+        return PromptBuild.build_prompt(articles, self.role, self.examples, self.instruction)
 
     def run_semantics(self, prompt: str, max_tokens: int = 1024) -> str:
         """
@@ -41,8 +62,10 @@ class GeminiModel(GenerativeModel):
         Returns:
             str: The generated content from the LLM.
         """
-        response = self.generate(prompt=prompt, max_tokens=max_tokens)
-        return response
+        with tracer.span("gemini", prompt_bytes=len(prompt.encode()), max_tokens=max_tokens) as span:
+            response = limiter.call(GEMINI_HOST, self.generate_content, prompt, generation_config={"max_output_tokens": max_tokens})
+            span["bytes"] = len(response.text.encode())
+        return response.text
     
 
 class PromptBuild:
@@ -57,4 +80,181 @@ class PromptBuild:
 
         {articles}
         """
-        return prompt
\ No newline at end of file
+        return prompt
+
+
+class SemanticEngine:
+    def __init__(self, model, maxworkers: int = 4, cachedir: str = None):
+        """
+        Runs semantic analysis for many anomaly dates at once.
+        Identical prompts are sent once, uncached prompts run concurrently and every response is cached on disk,
+        keyed by the model name and a hash of the prompt.
+
+        Args:
+            model: The model, a GeminiModel or any object with model_name, build_prompt(articles) and run_semantics(prompt, max_tokens).
+            maxworkers (int): The maximum number of LLM calls in flight at once.
+            cachedir (str): The response cache directory. Defaults to .cache/semantics in the working directory.
+        """
+        self.model = model
+        self.maxworkers = maxworkers
+        self.cachedir = cachedir or os.path.join(getdirs(), ".cache", "semantics")
+
+    def cachepath(self, prompt: str) -> str:
+        """
+        Get the cache file of a prompt's response for this model.
+
+        Args:
+            prompt (str): The prompt.
+        """
+        key = hashlib.sha256(f"{self.model.model_name}\0{prompt}".encode()).hexdigest()
+        return os.path.join(self.cachedir, f"{key}.json")
+
+    def cached(self, prompt: str):
+        """
+        Get the cached response to a prompt, or None if it was never run.
+
+        Args:
+            prompt (str): The prompt.
+        """
+        try:
+            with open(self.cachepath(prompt), "r") as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def generate(self, prompt: str, max_tokens: int) -> str:
+        """
+        Run a prompt through the model and cache the response.
+
+        Args:
+            prompt (str): The prompt.
+            max_tokens (int): The maximum number of tokens to generate.
+        """
+        response = self.model.run_semantics(prompt, max_tokens=max_tokens)
+        os.makedirs(self.cachedir, exist_ok=True)
+        dumpjson({"model": self.model.model_name, "response": response}, self.cachepath(prompt))
+        return response
+
+    def run_prompts(self, prompts: list, max_tokens: int = 1024) -> list:
+        """
+        Run prompts, deduplicated, concurrently and through the response cache.
+
+        Args:
+            prompts (list): The prompts to run.
+            max_tokens (int): The maximum number of tokens to generate per prompt.
+
+        Returns:
+            list: The response to each prompt, in order.
+        """
+        unique = list(dict.fromkeys(prompts))
+        responses = {prompt: self.cached(prompt) for prompt in unique}
+        pending = [prompt for prompt, response in responses.items() if response is None]
+
+        print(f"{len(prompts)} prompts, {len(unique)} unique, {len(unique) - len(pending)} cached, {len(pending)} to run.")
+        tracer.count("gemini.prompts", len(prompts))
+        tracer.count("gemini.cache_hits", len(unique) - len(pending))
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.maxworkers, len(pending)))) as executor:
+                responses.update(zip(pending, executor.map(lambda prompt: self.generate(prompt, max_tokens), pending)))
+
+        return [responses[prompt] for prompt in prompts]
+
+    def analyse(self, articles: list, max_tokens: int = 1024) -> list:
+        """
+        Build a prompt for each anomaly's articles and run them all.
+
+        Args:
+            articles (list): The articles of each anomaly date, e.g. the joined URLs of each date in articlestore.articles(coin).
+            max_tokens (int): The maximum number of tokens to generate per prompt.
+
+        Returns:
+            list: The analysis of each anomaly date, in order.
+        """
+        return self.run_prompts([self.model.build_prompt(entry) for entry in articles], max_tokens=max_tokens)
+
+    def analyse_packed(self, events: dict, budget: int = 8000, max_tokens: int = 1024) -> dict:
+        """
+        Map-reduce semantic analysis under a per-prompt token budget.
+        Each anomaly's articles are deduplicated and packed into the fewest prompts that fit the budget (map), and the
+        partial analyses of anomalies that needed several prompts are merged with REDUCE_INSTRUCTION (reduce).
+
+        Args:
+            events (dict): Maps each anomaly date to its article URLs, e.g. from articlestore.articles(coin).
+            budget (int): The estimated token budget of a single prompt, instructions included.
+            max_tokens (int): The maximum number of tokens to generate per prompt.
+
+        Returns:
+            dict: Maps each anomaly date to its analysis.
+
+        Raises:
+            ValueError: If the budget cannot fit two partial analyses of max_tokens in one reduce prompt.
+        """
+        from llm_utils import dedupe_articles, estimate_tokens, pack_articles
+        from prompts import REDUCE_INSTRUCTION
+
+        role = getattr(self.model, "role", "")
+        reducebudget = budget - estimate_tokens(PromptBuild.build_prompt("", role, "", REDUCE_INSTRUCTION) + "<date>0000-00-00</date>")
+
+        ## -- Every reduce round must merge at least two partials per date, or the rounds would never end --
+        if reducebudget < 2 * (max_tokens + 1):
+            raise ValueError(f"A budget of {budget} tokens cannot merge two partial analyses of up to {max_tokens} tokens, "
+                             f"raise the budget or lower max_tokens.")
+
+        ## -- Map: every chunk of every anomaly goes out in one concurrent batch --
+        articlebudget = budget - estimate_tokens(self.model.build_prompt(""))
+        chunks = {date: pack_articles([f"- {url}" for url in dedupe_articles(urls)], articlebudget) for date, urls in events.items()}
+        mapprompts = [(date, self.model.build_prompt("\n".join(chunk) + f"<date>{date}</date>")) for date, datechunks in chunks.items() for chunk in datechunks]
+        partials = {date: [] for date in events}
+
+        for (date, _), response in zip(mapprompts, self.run_prompts([prompt for _, prompt in mapprompts], max_tokens=max_tokens)):
+            partials[date].append(response)
+
+        ## -- Reduce: merge partial analyses, in rounds if they do not fit one prompt --
+        while any(len(responses) > 1 for responses in partials.values()):
+            pending = {date: responses for date, responses in partials.items() if len(responses) > 1}
+            groups = [(date, group) for date, responses in pending.items() for group in pack_articles(responses, reducebudget, truncate=False)]
+            merges = [(date, group) for date, group in groups if len(group) > 1]
+
+            stalled = set(pending) - {date for date, _ in merges}
+            if stalled:
+                raise ValueError(f"No two partial analyses of {min(stalled)} fit a budget of {budget} tokens.")
+
+            ## -- Partials without a partner are carried to the next round as they are --
+            merged = {date: [group[0] for groupdate, group in groups if groupdate == date and len(group) == 1] for date in pending}
+            reduceprompts = [PromptBuild.build_prompt("\n\n".join(group) + f"<date>{date}</date>", role, "", REDUCE_INSTRUCTION) for date, group in merges]
+
+            for (date, _), response in zip(merges, self.run_prompts(reduceprompts, max_tokens=max_tokens)):
+                merged[date].append(response)
+
+            partials.update(merged)
+
+        return {date: responses[0] if responses else "" for date, responses in partials.items()}
+
+
+def run_semantic_analysis(coin: str, model=None, maxworkers: int = 4, budget: int = 8000) -> dict:
+    """
+    Analyse every stored anomaly date of a coin.
+
+    Args:
+        coin (str): The coin whose events in the article store are analysed.
+        model: The model to use. Defaults to a GeminiModel with ROLE_A and INSTRUCTION_A.
+        maxworkers (int): The maximum number of LLM calls in flight at once.
+        budget (int): The estimated token budget of a single prompt.
+
+    Returns:
+        dict: Maps each anomaly date to its analysis.
+    """
+    from prompts import ROLE_A, INSTRUCTION_A
+    from articlestore import articlestore
+
+    with articlestore() as store:
+        ## -- Import events stored as JSON files before the article store existed --
+        events = store.articles(coin) or (store.import_events(coin) and store.articles(coin))
+
+    if not events:
+        print(f"No events stored for {coin}, run the anomaly detection first.")
+        return {}
+
+    model = model or GeminiModel(role=ROLE_A, examples="", instruction=INSTRUCTION_A)
+    return SemanticEngine(model, maxworkers=maxworkers).analyse_packed(events, budget=budget)
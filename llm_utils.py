@@ -4,30 +4,17 @@ Script to build prompts for LLMs using predefined templates.
 
 """
 
-import os
 import re
 
-def get_articles(articles_dir):
-    """
-    Get a list of articles from the specified directory.
-
-    Args:
-        articles_dir (str): The directory containing the article files.
+from urllib.parse import urlsplit
 
-    Returns:
-        list: A list of article contents with their corresponding dates.
-    """
-    files = []
-    for file in os.listdir(articles_dir):
-        if file.endswith(".json"):
-            with open(os.path.join(articles_dir, file), 'r') as f:
-                files.append(f.read() + "<date>" + get_date_from_filename(file) + "</date>")
-    return files
+## -- Query parameters that only track where a link was shared --
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "ocid", "cmpid", "taid", "mod=")
 
 def get_date_from_filename(filename):
     """
 
-    Extract the date from the filename.
+    Extract the date from the filename of a processed_events_for_<date>.json file, as read by articlestore.import_events().
 
     Args:
         filename (str): The name of the file to extract the date from.
@@ -41,6 +28,106 @@ def get_date_from_filename(filename):
         return match.group(1)
     return None
 
-if __name__ == "__main__":
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text, at roughly four characters per token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return -(-len(text) // 4)
+
+def normalise_url(url):
+    """
+    Normalise a URL so that the same article reached through different links compares equal.
+    Drops the scheme, "www.", AMP paths, tracking query parameters, fragments and trailing slashes.
+
+    Args:
+        url (str): The article URL.
+
+    Returns:
+        str: The normalised URL.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.").removeprefix("amp.")
+    path = re.sub(r"(/amp)?/*$", "", re.sub(r"^/amp/", "/", parts.path))
+    query = "&".join(sorted(param for param in parts.query.split("&") if param and not param.lower().startswith(TRACKING_PARAMS)))
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+def title_words(url):
+    """
+    Get the words of the article title from the slug at the end of its URL.
+
+    Args:
+        url (str): The article URL.
+
+    Returns:
+        set: The lowercase title words.
+    """
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    slug = re.sub(r"\.\w+$", "", segments[-1]) if segments else ""
+    return {word for word in re.split(r"[-_+\s]+", slug.lower()) if word and not word.isdigit()}
+
+def dedupe_articles(urls, similarity=0.8):
+    """
+    Remove duplicate and near-duplicate articles.
+    URLs are first compared after normalisation, then titles whose word sets overlap by at least the
+    similarity threshold (Jaccard index) are treated as the same story and only the first is kept.
+
+    Args:
+        urls (list): The article URLs.
+        similarity (float): The Jaccard index at or above which two titles are near-duplicates.
+
+    Returns:
+        list: The remaining URLs, in their original order.
+    """
+    kept, seen, titles = [], set(), []
+    for url in urls:
+        normalised = normalise_url(url)
+        words = title_words(url)
+
+        if normalised in seen:
+            continue
+        if len(words) >= 3 and any(len(words & other) / len(words | other) >= similarity for other in titles):
+            continue
+
+        kept.append(url)
+        seen.add(normalised)
+        titles.append(words) if len(words) >= 3 else None
+    return kept
+
+def pack_articles(articles, budget, truncate=True):
+    """
+    Pack articles into the fewest chunks whose estimated token count fits the budget (first-fit decreasing).
+    An article larger than the budget on its own is truncated to fit, or kept whole in a chunk of its own.
+
+    Args:
+        articles (list): The article texts (e.g., one URL or summary per article).
+        budget (int): The token budget per chunk.
+        truncate (bool): Whether to truncate articles larger than the budget. Default is True.
+
+    Returns:
+        list: The chunks, each a list of article texts in their original order.
+    """
+    if budget < 1:
+        raise ValueError(f"The token budget must be positive, got {budget}.")
+
+    sizes = [min(estimate_tokens(article) + 1, budget) if truncate else estimate_tokens(article) + 1 for article in articles]
+    chunks, remaining = [], []
+
+    for index in sorted(range(len(articles)), key=lambda i: -sizes[i]):
+        for chunk, space in enumerate(remaining):
+            if sizes[index] <= space:
+                chunks[chunk].append(index)
+                remaining[chunk] -= sizes[index]
+                break
+        else:
+            chunks.append([index])
+            remaining.append(budget - sizes[index])
 
-    print(get_articles(os.path.join(os.getcwd(), "data", "bitcoin_events")))
\ No newline at end of file
+    if not truncate:
+        return [[articles[i] for i in sorted(chunk)] for chunk in chunks]
+    return [[articles[i][:(budget - 1) * 4] for i in sorted(chunk)] for chunk in chunks]
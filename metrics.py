@@ -0,0 +1,128 @@
+"""
+
+Vectorized summary metrics for coin series.
+
+Every statistic is computed for every series at once as a reduction over the rows of a 2-D (series, points) array.
+
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+SERIES = ("price", "volume", "market_cap")
+STATISTICS = ("max", "min", "std", "var", "mean")
+
+
+@dataclass(frozen=True)
+class seriesmetrics:
+    """
+    Metrics for a set of series, one entry (or row, for rolling metrics) per series.
+
+    Attributes:
+        names (tuple): The name of each series, in row order.
+        max, min, std, var, mean (np.ndarray): The statistics, shaped (series,) or (series, windows) when rolling.
+        count (np.ndarray): The number of non-NaN points each statistic was computed from.
+    """
+    names: tuple
+    max: np.ndarray
+    min: np.ndarray
+    std: np.ndarray
+    var: np.ndarray
+    mean: np.ndarray
+    count: np.ndarray
+
+    def get(self, name):
+        """
+        Get the statistics of one series.
+
+        Args:
+            name (str): The name of the series (e.g., "price").
+
+        Returns:
+            dict: Maps each statistic name to its value for the series.
+        """
+        row = self.names.index(name)
+        return {statistic: getattr(self, statistic)[row] for statistic in STATISTICS}
+
+    def flat(self):
+        """
+        Get the statistics in series-major order (max, min, std, var, mean of each series), as utils.printmetrics expects.
+
+        Returns:
+            tuple: The flattened statistics.
+        """
+        return tuple(value for name in self.names for value in self.get(name).values())
+
+
+def computemetrics(values, names=SERIES):
+    """
+    Compute max, min, standard deviation, variance and mean for every series in one set of axis reductions.
+    NaN values (missing points) are ignored.
+
+    Args:
+        values (np.ndarray): The (series, points) array, e.g. the value rows of a storage columnar array.
+        names (tuple): The name of each series. Default is ("price", "volume", "market_cap").
+
+    Returns:
+        seriesmetrics: The metrics for each series.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+
+    ## -- Centre on the mean before squaring so large prices do not lose precision --
+    filled = np.where(valid, values, 0.0)
+    mean = filled.sum(axis=1) / count
+    centred = np.where(valid, values - mean[:, None], 0.0)
+    var = np.einsum("ij,ij->i", centred, centred) / count
+
+    return seriesmetrics(names=tuple(names),
+                         max=np.where(valid, values, -np.inf).max(axis=1),
+                         min=np.where(valid, values, np.inf).min(axis=1),
+                         std=np.sqrt(var), var=var, mean=mean, count=count)
+
+
+def rollingmetrics(values, window, names=SERIES):
+    """
+    Compute the same metrics over every trailing window of the series.
+    Means and variances come from cumulative sums and minima/maxima from O(n) running filters, so the cost
+    does not depend on the window length. NaN values are ignored within each window.
+
+    Args:
+        values (np.ndarray): The (series, points) array.
+        window (int): The number of points in each window.
+        names (tuple): The name of each series. Default is ("price", "volume", "market_cap").
+
+    Returns:
+        seriesmetrics: The metrics, each shaped (series, points - window + 1) where column i covers points i to i + window - 1.
+    """
+    ## -- scipy is only needed for rolling metrics, so it is not imported with the module --
+    from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+    values = np.asarray(values, dtype=np.float64)
+    if not 1 <= window <= values.shape[1]:
+        raise ValueError(f"Window must be between 1 and the number of points ({values.shape[1]}), got {window}.")
+
+    valid = ~np.isnan(values)
+    offset = np.nanmean(values, axis=1, keepdims=True)
+    centred = np.where(valid, values - offset, 0.0)
+
+    def windowsum(array):
+        cumulative = np.zeros((array.shape[0], array.shape[1] + 1))
+        np.cumsum(array, axis=1, out=cumulative[:, 1:])
+        return cumulative[:, window:] - cumulative[:, :-window]
+
+    count = windowsum(valid.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = windowsum(centred) / count
+        var = np.maximum(windowsum(centred * centred) / count - mean * mean, 0.0)
+
+    ## -- Running filters are centred, so window i (points i to i + window - 1) sits at output i + window // 2 --
+    full = slice(window // 2, window // 2 + values.shape[1] - window + 1)
+    rollingmax = maximum_filter1d(np.where(valid, values, -np.inf), window, axis=1)[:, full]
+    rollingmin = minimum_filter1d(np.where(valid, values, np.inf), window, axis=1)[:, full]
+    rollingmax, rollingmin = np.where(count > 0, rollingmax, np.nan), np.where(count > 0, rollingmin, np.nan)
+
+    return seriesmetrics(names=tuple(names), max=rollingmax, min=rollingmin, std=np.sqrt(var), var=var, mean=mean + offset, count=count)
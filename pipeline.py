@@ -0,0 +1,148 @@
+"""
+
+Batch anomaly detection over a universe of coins on a process pool.
+
+Every (coin, segment, detector) combination is an independent task. Tasks are spread over one worker process per core
+and their anomalies are gathered into a single table, along with wall-clock and per-task timings.
+
+"""
+
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import analysis
+import storage
+import tracing
+import tsstore
+import utils
+
+
+## -- Row of each segment in the storage columnar array --
+SEGMENTS = {"price": storage.SEGMENTS["prices"], "volume": storage.SEGMENTS["total_volumes"], "mcaps": storage.SEGMENTS["market_caps"]}
+
+DETECTORS = ("dbscan", "isolation_forest")
+
+TABLE_COLUMNS = ["coin", "segment", "detector", "index", "timestamp", "date"]
+
+
+def detect(values, detector, min_samples=3, eps=0.1, contamination="auto"):
+    """
+    Run one detector over a 1-D series.
+
+    Args:
+        values (np.ndarray): The (n, 2) [timestamp, value] series.
+        detector (str): The detector to run, "dbscan" or "isolation_forest".
+        min_samples (int): The DBSCAN min_samples. Default is 3.
+        eps (float): The DBSCAN eps. Default is 0.1.
+        contamination (str or float): The isolation forest contamination. Default is "auto".
+
+    Returns:
+        np.ndarray: The indices of the anomalous points.
+    """
+    if detector == "dbscan":
+        labels = analysis.compute_dbscan(values, min_samples, eps=eps)[0]
+        return np.where(labels == -1)[0]
+
+    if detector == "isolation_forest":
+        return analysis.compute_isolation_forest(values, contamination=contamination)
+
+    raise ValueError(f"Unknown detector '{detector}'. Please choose one of: {', '.join(DETECTORS)}.")
+
+
+def run_task(task):
+    """
+    Worker entry point: load one coin's series and run one detector over one segment.
+
+    Args:
+        task (tuple): The (coin, datapath, segment, detector, params, resolution) of the task. A None datapath reads the
+            coin at that resolution from the time-series store.
+
+    Returns:
+        dict: The task description, its anomaly "rows", "seconds" spent and the worker "pid".
+    """
+    coin, datapath, segment, detector, params, resolution = task
+    start = time.perf_counter()
+
+    ## -- .npy data is memory-mapped, so every worker shares the page cache instead of copying the series --
+    columns = storage.load(datapath) if datapath else tsstore.store.columns(coin, resolution)
+    series = storage.pairview(columns, SEGMENTS[segment])
+    indices = detect(series, detector, **params)
+
+    timestamps = np.asarray(columns[0])[indices]
+    dates = analysis.unix_to_datetime_string(timestamps)
+    rows = [[coin, segment, detector, int(i), int(t), d] for i, t, d in zip(indices, timestamps, dates)]
+
+    return {"coin": coin, "segment": segment, "detector": detector, "rows": rows,
+            "seconds": time.perf_counter() - start, "pid": os.getpid()}
+
+
+def run_pipeline(coins, segments=tuple(SEGMENTS), detectors=DETECTORS, maxworkers=None, params=None, save=True, resolution="daily"):
+    """
+    Run every detector over every segment of every coin on a process pool.
+
+    Args:
+        coins (list): The CoinGecko ids of the coins, each with stored data in data/.
+        segments (tuple): The segments to analyse. Default is ("price", "volume", "mcaps").
+        detectors (tuple): The detectors to run. Default is ("dbscan", "isolation_forest").
+        maxworkers (int): The number of worker processes. Default is None, which uses one per core.
+        params (dict): Detector parameters passed to detect() (min_samples, eps, contamination). Default is None.
+        save (bool): Whether to store the anomaly table in data/anomalies.json. Default is True.
+        resolution (str): The time-series store resolution analysed. Coins not in the store are read from their data file. Default is "daily".
+
+    Returns:
+        tuple: The consolidated anomaly table (pd.DataFrame) and a report dict with the "wallclock" seconds,
+        the summed task "cpu" seconds, the "workers" used, the per-task "timings" (pd.DataFrame) and the "failed" tasks.
+    """
+    params = params or {}
+    datapaths = {coin: None if tsstore.store.has(coin, resolution) else storage.find(coin) for coin in coins}
+    tasks = [(coin, datapaths[coin], segment, detector, params, resolution) for coin in coins for segment in segments for detector in detectors]
+    maxworkers = maxworkers or os.cpu_count() or 1
+
+    rows, timings, failed = [], [], {}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=min(maxworkers, len(tasks) or 1)) as executor:
+        futures = {executor.submit(run_task, task): task for task in tasks}
+
+        for future in as_completed(futures):
+            coin, _, segment, detector, _, _ = futures[future]
+
+            try:
+                result = future.result()
+            except Exception as e:
+                failed[(coin, segment, detector)] = str(e)
+                tracing.tracer.add("pipeline.task", 0.0, outcome="error", coin=coin, segment=segment, detector=detector, error=str(e))
+                print(f"Error detecting {detector} anomalies in {coin} {segment}: {e}")
+                continue
+
+            ## -- Tasks run in worker processes, so their timings are recorded here --
+            tracing.tracer.add("pipeline.task", result["seconds"], coin=coin, segment=segment, detector=detector,
+                               pid=result["pid"], anomalies=len(result["rows"]))
+            rows.extend(result["rows"])
+            timings.append({key: result[key] for key in ("coin", "segment", "detector", "seconds", "pid")})
+
+    wallclock = time.perf_counter() - start
+
+    import pandas as pd
+
+    table = pd.DataFrame(rows, columns=TABLE_COLUMNS).sort_values(["coin", "segment", "detector", "index"], ignore_index=True)
+    timings = pd.DataFrame(timings, columns=["coin", "segment", "detector", "seconds", "pid"])
+    report = {"wallclock": wallclock, "cpu": float(timings["seconds"].sum()), "workers": timings["pid"].nunique(),
+              "timings": timings, "failed": failed}
+
+    print(f"Ran {len(timings)}/{len(tasks)} tasks on {report['workers']} workers in {wallclock:.2f}s "
+          f"({report['cpu']:.2f}s of task time, {len(table)} anomalies)")
+
+    utils.dumpjson(table.to_dict(orient="records"), os.path.join(utils.getdirs(), "data/anomalies.json")) if save else None
+    return table, report
+
+
+if __name__ == "__main__":
+
+    table, report = run_pipeline(["bitcoin", "ethereum"])
+    print(table.groupby(["coin", "segment", "detector"]).size())
+    print(report["timings"].sort_values("seconds", ascending=False).head(10))
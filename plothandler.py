@@ -1,36 +1,308 @@
-import os
+"""
+
+Local web server for the plots and the anomaly table.
+
+Every request is handled on its own thread, so several dashboards reloading at once do not queue behind each other.
+The index is generated on each request from the plots that exist under plots/ (plots/<coin>/ per coin), grouped by
+coin and segment. Responses carry an ETag and Last-Modified so browsers revalidate with a 304 instead of downloading
+unchanged plots again, and HTML, CSS and JSON are gzipped for clients that accept it. /api/anomalies serves
+data/anomalies.json, optionally filtered by ?coin=, ?segment= and ?detector=.
+
+"""
+
+import email.utils
+import gzip
+import hashlib
+import html
 import http.server
-import socketserver
-import webbrowser
+import json
+import os
 import threading
 import time
+import webbrowser
+
+from urllib.parse import parse_qs, urlsplit
+
+import plotrender
+import utils
 
 
 PORT = 8000
-DIRECTORY = os.path.join(os.getcwd(), "plots")
+DIRECTORY = plotrender.plotdir()
+
+## -- Content types worth compressing, PNGs are already compressed --
+COMPRESSIBLE = ("text/html", "text/css", "application/json", "text/plain")
+
+## -- Segment each plot file name belongs to, in display order --
+SEGMENT_ORDER = ("price", "volume", "market cap")
+SEGMENT_NAMES = {"price": "price", "volume": "volume", "mcaps": "market cap", "market cap": "market cap"}
+RAW_PLOTS = {entry[2]: segment for segment, entry in plotrender.RAW_SEGMENTS.items()}
+
+
+def describe(filename):
+    """
+    Get the segment and plot type of a plot file name, e.g. "dbscan_mcaps.png" is ("market cap", "dbscan").
+
+    Returns:
+        tuple: The segment and type, the segment is "other" for names that do not follow the plotrender.py scheme.
+    """
+    if filename in RAW_PLOTS:
+        return RAW_PLOTS[filename], "raw"
+
+    type, _, segment = os.path.splitext(filename)[0].rpartition("_")
+    if type and segment in SEGMENT_NAMES:
+        return SEGMENT_NAMES[segment], type
+
+    return "other", os.path.splitext(filename)[0]
+
+
+def listplots(directory=None):
+    """
+    Find the plots under the plot directory, grouped by coin and segment.
+
+    Args:
+        directory (str): The plot directory. Default is None, which uses DIRECTORY.
+
+    Returns:
+        dict: Maps each coin ("" for plots directly in the directory) to its segments, each a sorted list of
+        (type, path relative to the directory) pairs.
+    """
+    directory = directory or DIRECTORY
+    plots = {}
+
+    for root, folders, files in os.walk(directory):
+        folders[:] = sorted(folder for folder in folders if not folder.startswith("."))
+        coin = os.path.relpath(root, directory).replace(os.sep, "/")
+        coin = "" if coin == "." else coin
+
+        for filename in sorted(files):
+            if filename.lower().endswith(".png"):
+                segment, type = describe(filename)
+                plots.setdefault(coin, {}).setdefault(segment, []).append((type, f"{coin}/{filename}" if coin else filename))
+
+    return plots
+
+
+def renderindex(plots):
+    """
+    Render the index page of the plots from listplots().
+    """
+    order = lambda segment: (SEGMENT_ORDER.index(segment) if segment in SEGMENT_ORDER else len(SEGMENT_ORDER), segment)
+    sections = []
+
+    for coin in sorted(plots, key=lambda coin: (coin == "", coin)):
+        rows = []
+        for segment in sorted(plots[coin], key=order):
+            figures = "\n".join(f'            <figure><img src="{html.escape(path)}" alt="{html.escape(type)} {html.escape(segment)}" loading="lazy">'
+                                f"<figcaption>{html.escape(type.replace('_', ' '))}</figcaption></figure>"
+                                for type, path in sorted(plots[coin][segment]))
+            rows.append(f'        <h3>{html.escape(segment.title())}</h3>\n        <div class="grid-container">\n{figures}\n        </div>')
+
+        title = html.escape(coin.title()) if coin else "Earlier runs"
+        sections.append(f'    <section>\n        <h2>{title}</h2>\n' + "\n".join(rows) + "\n    </section>")
+
+    body = "\n".join(sections) if sections else '    <p class="empty">No plots yet. Run the anomaly detection to render them.</p>'
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>All Plots</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <h1>Cryptotracking Plots</h1>
+    <p class="links"><a href="/api/anomalies">Anomaly table (JSON)</a></p>
+{body}
+</body>
+</html>
+"""
+
 
 class CustomHandler(http.server.SimpleHTTPRequestHandler):
+    ## -- Gzipped bodies by (path, mtime, size), shared by every handler thread --
+    compressed = {}
+    lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
 
-def start_server():
-    with socketserver.TCPServer(("", PORT), CustomHandler) as httpd:
-        print(f"Serving at port {PORT}")
+    def do_GET(self):
+        self.route(head=False)
+
+    def do_HEAD(self):
+        self.route(head=True)
+
+    def route(self, head):
+        url = urlsplit(self.path)
+
+        if url.path in ("/", "/index.html"):
+            body = renderindex(listplots(self.directory)).encode()
+            return self.respond(body, "text/html; charset=utf-8", head)
+
+        if url.path.rstrip("/") in ("/api/anomalies", "/anomalies.json"):
+            return self.anomalies(parse_qs(url.query), head)
+
+        path = self.translate_path(url.path)
+        if os.path.basename(path).startswith(".") or not os.path.isfile(path):
+            return self.send_error(404, "File not found")
+
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                key = (path, stat.st_mtime_ns, stat.st_size)
+                etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+                if self.notmodified(etag, stat.st_mtime):
+                    return self.respond(None, self.guess_type(path), head, etag, stat.st_mtime)
+                body = f.read()
+        except OSError:
+            return self.send_error(404, "File not found")
+
+        self.respond(body, self.guess_type(path), head, etag, stat.st_mtime, key)
+
+    def anomalies(self, query, head):
+        """
+        Serve the anomaly table, keeping the rows matching every coin, segment and detector filter given.
+        """
+        path = os.path.join(utils.getdirs(), "data", "anomalies.json")
+
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            body, stat = b"[]", None
+
+        filters = {field: set(query[field]) for field in ("coin", "segment", "detector") if field in query}
+        if filters:
+            try:
+                rows = json.loads(body)
+            except ValueError:
+                return self.send_error(500, "The anomaly table is not valid JSON")
+            body = json.dumps([row for row in rows if all(str(row.get(field)) in values for field, values in filters.items())]).encode()
+
+        self.respond(body, "application/json", head, lastmodified=stat.st_mtime if stat else None)
+
+    def notmodified(self, etag, lastmodified=None):
+        """
+        Check the request's validators: If-None-Match takes precedence over If-Modified-Since.
+        """
+        match = self.headers.get("If-None-Match")
+        if match is not None:
+            return match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in match.split(","))
+
+        since = self.headers.get("If-Modified-Since")
+        if since and lastmodified is not None:
+            try:
+                return int(lastmodified) <= email.utils.parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+    def respond(self, body, contenttype, head=False, etag=None, lastmodified=None, key=None):
+        """
+        Send a body with cache validators, a 304 when the client's copy is current and gzip when the client accepts it.
+
+        Args:
+            body (bytes): The response body, or None when the caller already knows the client's copy is current.
+            contenttype (str): The Content-Type.
+            head (bool): Whether to send the headers only. Default is False.
+            etag (str): The quoted ETag. Default is None, which hashes the body.
+            lastmodified (float): The modification time of the source, sent as Last-Modified. Default is None.
+            key (tuple): The (path, mtime, size) the gzipped body is cached under. Default is None, which compresses every time.
+        """
+        etag = etag or f'"{hashlib.sha1(body).hexdigest()}"'
+
+        if body is None or self.notmodified(etag, lastmodified):
+            self.send_response(304)
+            self.validators(etag, lastmodified)
+            self.end_headers()
+            return
+
+        encoding = None
+        if contenttype.startswith(COMPRESSIBLE) and "gzip" in self.headers.get("Accept-Encoding", ""):
+            encoding, body = "gzip", self.gzipped(body, key)
+
+        self.send_response(200)
+        self.send_header("Content-Type", contenttype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Encoding", encoding) if encoding else None
+        self.validators(etag, lastmodified)
+        self.end_headers()
+
+        if not head:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                ## -- The browser dropped the request, e.g. a dashboard reloaded before its images arrived --
+                pass
+
+    def validators(self, etag, lastmodified):
+        ## -- Plots change whenever detection reruns, so clients always revalidate (a cheap 304 when unchanged) --
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(lastmodified)) if lastmodified is not None else None
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def gzipped(self, body, key):
+        if key is None:
+            return gzip.compress(body, compresslevel=6, mtime=0)
+
+        with self.lock:
+            cached = self.compressed.get(key)
+        if cached is None:
+            cached = gzip.compress(body, compresslevel=6, mtime=0)
+            with self.lock:
+                ## -- Drop older versions of the same file --
+                for stale in [entry for entry in self.compressed if entry[0] == key[0]]:
+                    del self.compressed[stale]
+                self.compressed[key] = cached
+        return cached
+
+
+class plotserver(http.server.ThreadingHTTPServer):
+    ## -- Handler threads do not keep the process alive on shutdown --
+    daemon_threads = True
+
+
+def make_server(port=PORT):
+    """
+    Create the threaded plot server, bound to every interface.
+
+    Args:
+        port (int): The port. Default is PORT (8000), 0 picks a free one.
+
+    Returns:
+        plotserver: The server, not yet serving.
+    """
+    return plotserver(("", port), CustomHandler)
+
+
+def start_server(port=PORT):
+    with make_server(port) as httpd:
+        print(f"Serving at port {httpd.server_address[1]}")
         httpd.serve_forever()
 
-def run_server_with_browser():
-    server_thread = threading.Thread(target=start_server, daemon=True)
-    server_thread.start()
 
-    time.sleep(1.5)  # wait for server to start
+def run_server_with_browser(port=PORT):
+    httpd = make_server(port)
+    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server_thread.start()
 
-    webbrowser.open(f"http://localhost:{PORT}/index.html")
+    port = httpd.server_address[1]
+    print(f"Serving at port {port}")
+    webbrowser.open(f"http://localhost:{port}/")
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         print("Server stopped by user")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
 
 if __name__ == "__main__":
-    run_server_with_browser()
\ No newline at end of file
+    run_server_with_browser()
@@ -0,0 +1,236 @@
+"""
+
+Plot rendering stage, kept separate from anomaly detection.
+
+Detection builds lightweight plot jobs; render() draws them on a headless backend in a pool of worker processes,
+closes every figure and skips jobs whose input hash matches the plot already on disk.
+
+"""
+
+import hashlib
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import utils
+
+
+RAW_SEGMENTS = {
+    "price": ("Raw Price Data", "Price", "raw_price_data.png"),
+    "volume": ("Raw Volume Data", "Volume", "raw_volume_data.png"),
+    "market cap": ("Raw Market Cap Data", "Market Cap", "raw_market_cap_data.png"),
+}
+
+MANIFEST = ".render_manifest.json"
+
+
+def pyplot():
+    """
+    Import pyplot on the headless Agg backend. Deferred until a plot is drawn, as matplotlib and seaborn are slow to import.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plotdir(coin=""):
+    """
+    Get the directory plots are rendered into, plots/<coin> for a coin's plots.
+    """
+    return os.path.join(utils.getdirs(), "plots", coin)
+
+
+def rawjob(values, segment, coin=""):
+    """
+    Build a job plotting the raw values of a segment.
+
+    Args:
+        values (np.ndarray): The 1-D values of the segment.
+        segment (str): The segment, one of "price", "volume" or "market cap".
+        coin (str): The coin plotted, whose plots go in plots/<coin>. Default is an empty string, directly in plots.
+
+    Returns:
+        dict: The plot job.
+    """
+    return {"kind": "raw", "segment": segment, "values": np.asarray(values, dtype=np.float64),
+            "path": os.path.join(plotdir(coin), RAW_SEGMENTS[segment][2])}
+
+
+def clusterjob(values, labels, segment, type, coin=""):
+    """
+    Build a job plotting the standardised values of a segment coloured by detector label.
+
+    Args:
+        values (np.ndarray): The 1-D values of the segment.
+        labels (np.ndarray): The label of each value, where -1 indicates an anomaly (noise).
+        segment (str): The segment (e.g., "price", "volume", "mcaps").
+        type (str): The detector (e.g., "dbscan", "isolation_forest").
+        coin (str): The coin plotted, whose plots go in plots/<coin>. Default is an empty string, directly in plots.
+
+    Returns:
+        dict: The plot job.
+    """
+    return {"kind": "clusters", "segment": segment, "type": type, "values": np.asarray(values, dtype=np.float64),
+            "labels": np.asarray(labels), "path": os.path.join(plotdir(coin), f"{type}_{segment}.png")}
+
+
+def jobhash(job):
+    """
+    Hash everything a plot job draws, so unchanged plots can be skipped.
+
+    Args:
+        job (dict): The plot job.
+
+    Returns:
+        str: The hex digest of the job's inputs.
+    """
+    digest = hashlib.sha256()
+    for key in sorted(job):
+        value = job[key]
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(value).tobytes() if isinstance(value, np.ndarray) else str(value).encode())
+    return digest.hexdigest()
+
+
+def plotrawdata(values, segment, path):
+    """
+
+    Plot the raw data for one segment.
+
+    Args:
+        values (np.ndarray): The values of the segment.
+        segment (str): The segment, one of "price", "volume" or "market cap".
+        path (str): The path of the PNG file.
+
+    """
+
+    title, ylabel, _ = RAW_SEGMENTS[segment]
+    plt = pyplot()
+    fig = plt.figure()
+
+    try:
+        plt.plot(list(values), color='red', label=f'{ylabel} data')
+        plt.title(title)
+        plt.xlabel("Days")
+        plt.ylabel(ylabel)
+        plt.legend()
+        plt.savefig(path)
+    finally:
+        plt.close(fig)
+
+
+def plotdata(data, labels, segment, type="", path=None):
+    """
+
+    Plot the clustered data using seaborn scatterplot (dbscan or isolation forest).
+
+    Args:
+        data (np.ndarray): The data to be plotted, should be a 2D array
+        labels (np.ndarray): An array of cluster labels, where -1 indicates noise
+        segment (str): The segment of the data being plotted (e.g., "price", "volume", "market cap")
+        type (str): The type of clustering used (e.g., "dbscan", "isolation_forest"). Default is an empty string.
+        path (str): The path of the PNG file. Default is None, which uses plots/<type>_<segment>.png.
+
+    """
+
+
+    import pandas as pd
+    import seaborn as sns
+    plt = pyplot()
+
+    sns.set_style(style="whitegrid")
+    sns.set_context("notebook")
+
+    ## -- Plot the clustered data --
+    fig = plt.figure(figsize=(10, 6))
+
+    try:
+        data_df = pd.DataFrame({"Indexes": range(len(data)),
+                                "Values": data[:, 0],
+                                "Clusters": labels
+                                })
+
+        ## -- Get range(len(data)) for x axis (days) --
+        ## -- data[:, 0] for y axis (Standardised price, volume, and market caps) --
+
+        sns.scatterplot(data=data_df, x="Indexes", y="Values",
+                        hue="Clusters", palette="viridis", s=120,
+                        edgecolor="black", alpha=0.7)
+
+        plt.title(f"{type} for {segment}")
+        plt.grid(True, linestyle='--', alpha=0.5)
+        plt.xlabel(f"Days ({len(data)} days)")
+        plt.ylabel(f"Scaled Values for {segment}")
+        plt.savefig(path or os.path.join(plotdir(), f"{type}_{segment}.png"))
+    finally:
+        plt.close(fig)
+
+
+def renderjob(job):
+    """
+    Draw one plot job. Runs inside the worker processes.
+
+    Args:
+        job (dict): The plot job.
+
+    Returns:
+        str: The path of the rendered plot.
+    """
+    if job["kind"] == "raw":
+        plotrawdata(job["values"], job["segment"], job["path"])
+    else:
+        ## -- Standardise as the detectors do before clustering --
+        values = job["values"]
+        std = values.std()
+        scaled = (values - values.mean()) / (std if std > 0 else 1.0)
+        plotdata(scaled.reshape(-1, 1), job["labels"], job["segment"], job["type"], job["path"])
+
+    return job["path"]
+
+
+def render(jobs, maxworkers=None, force=False):
+    """
+    Render plot jobs in a pool of headless worker processes, skipping plots whose inputs have not changed.
+
+    Args:
+        jobs (list): The plot jobs from rawjob() and clusterjob().
+        maxworkers (int): The number of worker processes. Default is None, which uses one per core.
+        force (bool): Whether to render every job even if its plot is up to date. Default is False.
+
+    Returns:
+        dict: The "rendered" and "skipped" plot paths.
+    """
+    manifestpath = os.path.join(plotdir(), MANIFEST)
+    try:
+        with open(manifestpath, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    ## -- The manifest is keyed by the plot's path within plots/ so it survives moving the project --
+    name = lambda path: os.path.relpath(path, plotdir()).replace(os.sep, "/")
+    hashes = {job["path"]: jobhash(job) for job in jobs}
+    pending = [job for job in jobs if force or manifest.get(name(job["path"])) != hashes[job["path"]] or not os.path.exists(job["path"])]
+    pendingpaths = {job["path"] for job in pending}
+    skipped = [job["path"] for job in jobs if job["path"] not in pendingpaths]
+
+    for directory in {os.path.dirname(job["path"]) for job in pending} | {plotdir()}:
+        os.makedirs(directory, exist_ok=True)
+    maxworkers = min(maxworkers or os.cpu_count() or 1, len(pending))
+
+    if maxworkers > 1:
+        with ProcessPoolExecutor(max_workers=maxworkers) as executor:
+            rendered = list(executor.map(renderjob, pending))
+    else:
+        rendered = [renderjob(job) for job in pending]
+
+    manifest.update({name(path): hashes[path] for path in rendered})
+    utils.dumpjson(manifest, manifestpath)
+
+    print(f"Rendered {len(rendered)} plots, {len(skipped)} unchanged plots skipped.")
+    return {"rendered": rendered, "skipped": skipped}
@@ -26,3 +26,8 @@ cross-reference these articles with external data sources and provide any inform
 Back up your findings with data and examples from the articles.
 """
 
+
+REDUCE_INSTRUCTION="""The articles for this anomaly were too many to read at once, so they were analysed in parts.
+Below are the partial analyses. Merge them into a single analysis of why the anomaly occurred,
+removing repetition and keeping the supporting data and examples.
+"""
@@ -0,0 +1,277 @@
+"""
+
+Shared rate limiting and retry layer for the CoinGecko, GDELT and Gemini clients.
+
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+from urllib.parse import urlparse
+
+import requests
+
+import tracing
+
+
+COINGECKO_HOST = "api.coingecko.com"
+GDELT_HOST = "api.gdeltproject.org"
+GEMINI_HOST = "generativelanguage.googleapis.com"
+
+## -- Requests per second and burst size for each host, based on the published free tier limits --
+HOST_LIMITS = {
+    COINGECKO_HOST: (0.5, 5),
+    GDELT_HOST: (0.2, 1),
+    GEMINI_HOST: (10 / 60, 2),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        Token bucket refilled continuously at a fixed rate.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (int): The maximum number of tokens held, i.e. the allowed burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blockeduntil = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for the given number of seconds, e.g. after a Retry-After header.
+
+        Args:
+            seconds (float): The number of seconds to pause the bucket for.
+        """
+        with self.lock:
+            self.blockeduntil = max(self.blockeduntil, time.monotonic() + seconds)
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available and take them.
+
+        Args:
+            tokens (int): The number of tokens to take. Default is 1.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if now < self.blockeduntil:
+                    wait = self.blockeduntil - now
+                elif self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                else:
+                    wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class RateLimiter:
+    def __init__(self, limits=None, default=(1.0, 1), maxretries=5, backoffbase=1.0, backoffmax=60.0):
+        """
+        Per-host token buckets with jittered exponential backoff and Retry-After handling.
+
+        Args:
+            limits (dict): Maps a host to a (rate, capacity) tuple. Default is HOST_LIMITS.
+            default (tuple): The (rate, capacity) used for hosts missing from limits. Default is one request per second.
+            maxretries (int): The number of retries after the first attempt. Default is 5.
+            backoffbase (float): The base delay in seconds of the exponential backoff. Default is 1.0.
+            backoffmax (float): The maximum delay in seconds between two attempts. Default is 60.0.
+        """
+        self.limits = dict(HOST_LIMITS if limits is None else limits)
+        self.default = default
+        self.maxretries = maxretries
+        self.backoffbase = backoffbase
+        self.backoffmax = backoffmax
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def configure(self, host, rate, capacity):
+        """
+        Set the rate limit for a host, replacing any existing bucket.
+
+        Args:
+            host (str): The host name (e.g., "api.coingecko.com").
+            rate (float): The number of requests allowed per second.
+            capacity (int): The allowed burst size.
+        """
+        with self.lock:
+            self.limits[host] = (rate, capacity)
+            self.buckets.pop(host, None)
+
+    def bucket(self, host):
+        """
+        Get the token bucket for a host, creating it on first use.
+
+        Args:
+            host (str): The host name.
+
+        Returns:
+            TokenBucket: The bucket shared by every caller of that host.
+        """
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(*self.limits.get(host, self.default))
+            return self.buckets[host]
+
+    def backoff(self, attempt, retryafter=None):
+        """
+        Get the delay before the next attempt.
+
+        Args:
+            attempt (int): The zero-based number of the attempt that failed.
+            retryafter (float): The delay requested by the server, if any.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        if retryafter is not None:
+            return min(retryafter, self.backoffmax)
+
+        ## -- Full jitter: uniform between zero and the capped exponential delay --
+        return random.uniform(0, min(self.backoffmax, self.backoffbase * 2 ** attempt))
+
+    def request(self, session, method, url, **kwargs):
+        """
+        Send an HTTP request through the host's token bucket, retrying on 429/5xx responses and connection errors.
+
+        Args:
+            session (requests.Session): The session used to send the request.
+            method (str): The HTTP method (e.g., "GET").
+            url (str): The URL to request.
+            **kwargs: Passed through to session.request.
+
+        Returns:
+            requests.Response: The final response, which may still carry an error status once retries are exhausted.
+        """
+        host = urlparse(url).hostname
+        bucket = self.bucket(host)
+
+        with tracing.tracer.span("http", host=host, method=method) as span:
+            for attempt in range(self.maxretries + 1):
+                span["attrs"]["attempts"] = attempt + 1
+                bucket.acquire()
+
+                try:
+                    response = session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.maxretries:
+                        raise
+                    tracing.tracer.count(f"{host}.retries")
+                    time.sleep(self.backoff(attempt))
+                    continue
+
+                span["attrs"]["status"] = response.status_code
+                if response.status_code not in RETRY_STATUSES or attempt == self.maxretries:
+                    span["bytes"] = tracing.sizeof(response)
+                    span["outcome"] = "ok" if response.ok else f"http {response.status_code}"
+                    return response
+
+                delay = self.backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                bucket.pause(delay) if response.status_code == 429 else None
+                tracing.tracer.count(f"{host}.retries")
+                print(f"{host} returned {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{self.maxretries})")
+                time.sleep(delay)
+
+    def call(self, host, func, *args, **kwargs):
+        """
+        Call a client function that talks to a host through the host's token bucket.
+        Used for clients which do not expose their HTTP session (gdeltdoc, google.generativeai).
+
+        Args:
+            host (str): The host the function talks to.
+            func (callable): The client function to call.
+            *args, **kwargs: Passed through to func.
+
+        Returns:
+            The return value of func.
+        """
+        bucket = self.bucket(host)
+
+        with tracing.tracer.span("call", host=host, func=getattr(func, "__name__", repr(func))) as span:
+            for attempt in range(self.maxretries + 1):
+                span["attrs"]["attempts"] = attempt + 1
+                bucket.acquire()
+
+                try:
+                    result = func(*args, **kwargs)
+                    span["bytes"] = tracing.sizeof(result)
+                    return result
+                except Exception as e:
+                    status, retryafter = error_status(e)
+                    span["attrs"]["status"] = status
+                    if status not in RETRY_STATUSES or attempt == self.maxretries:
+                        raise
+
+                    delay = self.backoff(attempt, retryafter)
+                    bucket.pause(delay) if status == 429 else None
+                    tracing.tracer.count(f"{host}.retries")
+                    print(f"{host} returned {status}, retrying in {delay:.1f}s ({attempt + 1}/{self.maxretries})")
+                    time.sleep(delay)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given either as a number of seconds or as an HTTP date.
+
+    Args:
+        value (str): The header value, or None.
+
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def error_status(error):
+    """
+    Get the HTTP status and Retry-After delay carried by a client exception.
+
+    Args:
+        error (Exception): The exception raised by the client.
+
+    Returns:
+        tuple: The status code (or None) and the Retry-After delay in seconds (or None).
+    """
+    response = getattr(error, "response", None)
+    if response is not None and hasattr(response, "status_code"):
+        return response.status_code, parse_retry_after(response.headers.get("Retry-After"))
+
+    ## -- google.api_core exceptions carry the HTTP status in .code --
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code, None
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return 503, None
+
+    return None, None
+
+
+## -- Shared by every client so that all callers of a host draw from the same bucket --
+limiter = RateLimiter()
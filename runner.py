@@ -1,67 +1,93 @@
 import analysis
+import batch
+import contextlib
 import data
-import utils
+import storage
+import tracing
+import tsstore
 import os
+import pipeline
 import plothandler
 import questionary
-from time import sleep
-from llm_semantics import GeminiModel
+import sys
 
 def main():
-    os.system("CLS")
+    os.system("cls" if os.name == "nt" else "clear")
 
     coin = questionary.select(
         "Which cryptocurrency would you like to track?",
         choices=["bitcoin", "ethereum", "both"]
     ).ask()
 
-    sleep(2)
-
-    compute_data = questionary.confirm(
-        "Would you like to compute new data? (This will overwrite existing data)",
-        default=False
+    compute_data = questionary.select(
+        "Would you like to compute new data?",
+        choices=["no", "incremental (only fetch missing days)", "full (overwrites existing data)"]
     ).ask()
 
-    sleep(2)
-
-    data.cryptodata(coin) if compute_data else None
+    if compute_data != "no":
+        with tracing.tracer.span("stage.fetch", coin=coin, incremental=compute_data.startswith("incremental")):
+            data.cryptodata(coin, incremental=compute_data.startswith("incremental"))
 
     if coin == "both":
+        ## -- Detect anomalies for both coins in parallel, then pick one to query news events for --
+        with tracing.tracer.span("stage.pipeline", coins=["bitcoin", "ethereum"]):
+            table, _ = pipeline.run_pipeline(["bitcoin", "ethereum"])
+        print(table.groupby(["coin", "segment", "detector"]).size().to_string())
+
         coin = questionary.select(
-            "Which cryptocurrency would you like to analyse?",
+            "Which cryptocurrency would you like to query news events for?",
             choices=["bitcoin", "ethereum"]
         ).ask()
     
-    bitcoindatapath = os.path.join(utils.getdirs(), "data/bitcoin_data.json")
-    ethereumdatapath = os.path.join(utils.getdirs(), "data/ethereum_data.json")
+    ## -- Read from the time-series store, falling back to the stored data file for coins not imported yet --
+    datapath = None if tsstore.store.has(coin) else storage.find(coin)
 
     ## -- Anomalies are already printed and or shown, no need to use the variables here, but just to contextualise the returns
-    datapath = bitcoindatapath if coin == "bitcoin" else ethereumdatapath if coin == "ethereum" else None
-    priceanomalies, volumeanomalies, marketcapanomalies = analysis.anomaly_pattern_detection(str(datapath), coin=coin)
-
-    sleep(2)
+    with tracing.tracer.span("stage.detect", coin=coin):
+        priceanomalies, volumeanomalies, marketcapanomalies = analysis.anomaly_pattern_detection(datapath, coin=coin)
 
     visualse = questionary.confirm(
         "Would you like to visualise the anomalies?",
         default=False
         ).ask()
     
-    sleep(2)
-    
-    plothandler.run_server_with_browser() if visualse else print("You can view the plots in the 'plots' directory.")
+    if visualse:
+        with tracing.tracer.span("stage.visualise"):
+            plothandler.run_server_with_browser()
+    else:
+        print("You can view the plots in the 'plots' directory.")
 
     get_semantics = questionary.confirm(
         "Would you like to get semantic reasoning behind the anomalies? (Induces LLM calls)",
         default=False
     ).ask()
 
-    GeminiModel.run_semantics() if get_semantics else print("Semantic analysis by LLMs not requested.")
+    if get_semantics:
+        ## -- Imported only when requested, as it loads google.generativeai (the client is configured with the first model) --
+        import llm_semantics
 
-    sleep(2)
+        with tracing.tracer.span("stage.semantics", coin=coin):
+            semantics = llm_semantics.run_semantic_analysis(coin)
+
+        for date, analysis_text in sorted(semantics.items()):
+            print(f"\n{'--' * 20}\nAnomaly on {date}:\n{analysis_text}")
+    else:
+        print("Semantic analysis by LLMs not requested.")
 
     print("--" * 20)
 
-    
-    
+    ## -- Where the time went, with the spans exported as JSON lines --
+    tracing.tracer.report()
+    print(f"Trace written to {tracing.tracer.export()}")
+
+
+if __name__ == "__main__":
+
+    ## -- With arguments (e.g. python runner.py --config batch_config.yml) run headless, see batch.py --
+    if len(sys.argv) > 1:
+        sys.exit(batch.main())
 
-main()
\ No newline at end of file
+    ## -- Set CRYPTOTRACKING_PROFILE to "cprofile" or "pyinstrument" to also capture a profile of the run --
+    profilemode = os.environ.get("CRYPTOTRACKING_PROFILE")
+    with tracing.profile(profilemode) if profilemode else contextlib.nullcontext():
+        main()
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""
+
+Columnar storage backends for coin series data.
+
+Each coin is stored as a (4, n) float64 array with one row per column (timestamp, price, volume, market cap).
+The .npy backend is memory-mapped on load, so reading a coin does not parse or copy the data.
+JSON in the CoinGecko market chart layout is kept as an import/export format.
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+import utils
+
+
+COLUMNS = ("timestamp", "price", "volume", "market_cap")
+
+## -- Row of each CoinGecko market chart key in the columnar array --
+SEGMENTS = {"prices": 1, "total_volumes": 2, "market_caps": 3}
+
+
+class npystore:
+    suffix = ".npy"
+
+    def save(self, columns, path):
+        """
+        Save the columns as a .npy file, replacing any existing file atomically.
+
+        Args:
+            columns (np.ndarray): The (4, n) columnar array.
+            path (str): The path of the .npy file.
+        """
+        tmppath = path + ".tmp"
+        with open(tmppath, "wb") as f:
+            np.save(f, np.ascontiguousarray(columns, dtype=np.float64))
+        os.replace(tmppath, path)
+
+    def load(self, path):
+        """
+        Memory-map the columns of a .npy file.
+
+        Args:
+            path (str): The path of the .npy file.
+
+        Returns:
+            np.ndarray: The read-only (4, n) columnar array.
+        """
+        return np.load(path, mmap_mode="r")
+
+
+class parquetstore:
+    suffix = ".parquet"
+
+    def save(self, columns, path):
+        """
+        Save the columns as a Parquet file (requires pyarrow or fastparquet).
+
+        Args:
+            columns (np.ndarray): The (4, n) columnar array.
+            path (str): The path of the Parquet file.
+        """
+        import pandas as pd
+        pd.DataFrame(dict(zip(COLUMNS, columns))).to_parquet(path, index=False)
+
+    def load(self, path):
+        """
+        Load the columns of a Parquet file.
+
+        Args:
+            path (str): The path of the Parquet file.
+
+        Returns:
+            np.ndarray: The (4, n) columnar array.
+        """
+        import pandas as pd
+        data_df = pd.read_parquet(path, columns=list(COLUMNS))
+        return np.ascontiguousarray(data_df.to_numpy(dtype=np.float64).T)
+
+
+class jsonstore:
+    suffix = ".json"
+
+    def save(self, columns, path):
+        """
+        Export the columns in the CoinGecko market chart JSON layout.
+
+        Args:
+            columns (np.ndarray): The (4, n) columnar array.
+            path (str): The path of the JSON file.
+        """
+        utils.dumpjson(to_marketchart(columns), path)
+
+    def load(self, path):
+        """
+        Import a CoinGecko market chart JSON file into columns.
+
+        Args:
+            path (str): The path of the JSON file.
+
+        Returns:
+            np.ndarray: The (4, n) columnar array.
+        """
+        with open(path, "r") as f:
+            return from_marketchart(json.load(f))
+
+
+BACKENDS = {"npy": npystore(), "parquet": parquetstore(), "json": jsonstore()}
+
+
+def from_marketchart(data):
+    """
+    Convert CoinGecko market chart data into a columnar array.
+    Series are aligned on their timestamps, and values missing from a series are NaN.
+
+    Args:
+        data (dict): The market chart data with "prices", "total_volumes" and "market_caps" as [timestamp, value] pairs.
+
+    Returns:
+        np.ndarray: The (4, n) columnar array sorted by timestamp.
+    """
+    series = {key: np.asarray(data.get(key) or np.empty((0, 2)), dtype=np.float64).reshape(-1, 2) for key in SEGMENTS}
+    timestamps = np.unique(np.concatenate([pairs[:, 0] for pairs in series.values()]))
+
+    columns = np.full((len(COLUMNS), len(timestamps)), np.nan)
+    columns[0] = timestamps
+
+    for key, row in SEGMENTS.items():
+        pairs = series[key]
+        columns[row, np.searchsorted(timestamps, pairs[:, 0])] = pairs[:, 1]
+
+    return columns
+
+
+def to_marketchart(columns):
+    """
+    Convert a columnar array back into CoinGecko market chart data.
+
+    Args:
+        columns (np.ndarray): The (4, n) columnar array.
+
+    Returns:
+        dict: The market chart data as [timestamp, value] pairs, without NaN values.
+    """
+    timestamps = np.asarray(columns[0])
+    data = {}
+
+    for key, row in SEGMENTS.items():
+        values = np.asarray(columns[row])
+        keep = ~np.isnan(values)
+        data[key] = [[int(t), float(v)] for t, v in zip(timestamps[keep], values[keep])]
+
+    return data
+
+
+def pairview(columns, row):
+    """
+    Get a zero-copy (n, 2) view of [timestamp, value] pairs for one row of the columnar array.
+    The view strides across the timestamp row and the value row, so rows of it index like the JSON pairs.
+
+    Args:
+        columns (np.ndarray): The C-contiguous (4, n) columnar array.
+        row (int): The row of the value column (see SEGMENTS).
+
+    Returns:
+        np.ndarray: The read-only (n, 2) view.
+    """
+    return np.lib.stride_tricks.as_strided(columns, shape=(columns.shape[1], 2),
+                                           strides=(columns.strides[1], row * columns.strides[0]),
+                                           writeable=False)
+
+
+def datapath(coin, backend="npy", directory=None):
+    """
+    Get the storage path of a coin for a backend.
+
+    Args:
+        coin (str): The CoinGecko id of the coin.
+        backend (str): The storage backend, one of "npy", "parquet" or "json". Default is "npy".
+        directory (str): The data directory. Default is None, which uses data/ in the working directory.
+
+    Returns:
+        str: The path of the coin's data file.
+    """
+    directory = os.path.join(utils.getdirs(), "data") if directory is None else directory
+    return os.path.join(directory, f"{coin}_data{BACKENDS[backend].suffix}")
+
+
+def find(coin, directory=None):
+    """
+    Find the stored data of a coin, preferring the binary backends over JSON.
+
+    Args:
+        coin (str): The CoinGecko id of the coin.
+        directory (str): The data directory. Default is None, which uses data/ in the working directory.
+
+    Returns:
+        str: The path of the coin's data file, or the .npy path if nothing is stored yet.
+    """
+    for backend in ("npy", "parquet", "json"):
+        path = datapath(coin, backend, directory)
+        if os.path.exists(path):
+            return path
+
+    return datapath(coin, "npy", directory)
+
+
+def backend_for(path):
+    """
+    Get the backend matching a file's extension.
+
+    Args:
+        path (str): The path of the data file.
+
+    Returns:
+        The backend instance.
+    """
+    suffix = os.path.splitext(path)[1]
+    for backend in BACKENDS.values():
+        if backend.suffix == suffix:
+            return backend
+
+    raise ValueError(f"No storage backend for '{suffix}' files. Use one of: {', '.join(b.suffix for b in BACKENDS.values())}")
+
+
+def save(columns, path):
+    """
+    Save a columnar array with the backend matching the path's extension.
+
+    Args:
+        columns (np.ndarray): The (4, n) columnar array.
+        path (str): The path of the data file.
+    """
+    backend_for(path).save(columns, path)
+    print(f"Data stored in {path}")
+
+
+def load(path):
+    """
+    Load a columnar array with the backend matching the path's extension.
+
+    Args:
+        path (str): The path of the data file.
+
+    Returns:
+        np.ndarray: The (4, n) columnar array (memory-mapped for .npy files).
+    """
+    return backend_for(path).load(path)
+
+
+def import_json(jsonpath, backend="npy"):
+    """
+    Convert a CoinGecko market chart JSON file into a binary backend next to it.
+
+    Args:
+        jsonpath (str): The path of the JSON file (e.g., data/bitcoin_data.json).
+        backend (str): The backend to convert to. Default is "npy".
+
+    Returns:
+        str: The path of the converted file.
+    """
+    path = os.path.splitext(jsonpath)[0] + BACKENDS[backend].suffix
+    save(BACKENDS["json"].load(jsonpath), path)
+    return path
+
+
+def export_json(path, jsonpath=None):
+    """
+    Export a stored coin to a CoinGecko market chart JSON file.
+
+    Args:
+        path (str): The path of the stored data file.
+        jsonpath (str): The path of the JSON file. Default is None, which writes next to the data file.
+
+    Returns:
+        str: The path of the JSON file.
+    """
+    jsonpath = os.path.splitext(path)[0] + ".json" if jsonpath is None else jsonpath
+    BACKENDS["json"].save(load(path), jsonpath)
+    return jsonpath
+
+
+if __name__ == "__main__":
+
+    ## -- Convert every stored JSON series in data/ to .npy --
+    datadir = os.path.join(utils.getdirs(), "data")
+    for file in os.listdir(datadir):
+        if file.endswith("_data.json"):
+            print(import_json(os.path.join(datadir, file)))
@@ -0,0 +1,186 @@
+"""
+
+Streaming anomaly detection for live price, volume and market cap ticks.
+
+Each segment keeps an exponentially weighted mean and variance, so every tick is scored and absorbed in constant time
+and memory without rescanning history. replay() feeds stored series through the detector tick by tick so its output
+can be compared with the batch DBSCAN and isolation forest detectors in analysis.py.
+
+"""
+
+import math
+import time
+
+import numpy as np
+
+import analysis
+import storage
+import utils
+
+
+SEGMENTS = ("price", "volume", "mcaps")
+
+
+class ewmaband:
+    def __init__(self, alpha=0.1, threshold=3.0, warmup=10):
+        """
+        Exponentially weighted mean/variance band for a single feature.
+
+        Args:
+            alpha (float): The weight of the newest observation. Default is 0.1 (a span of roughly 19 ticks).
+            threshold (float): The z-score beyond which an observation is anomalous. Default is 3.0.
+            warmup (int): The number of observations absorbed before any are scored. Default is 10.
+        """
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, value):
+        """
+        Score an observation against the band, then absorb it.
+        Anomalous observations are clipped to the band edge before being absorbed so one spike does not widen the band.
+
+        Args:
+            value (float): The observation.
+
+        Returns:
+            float: The z-score of the observation, or None while warming up.
+        """
+        if self.count == 0:
+            self.count, self.mean = 1, value
+            return None
+
+        std = math.sqrt(self.var)
+        zscore = (value - self.mean) / std if std > 0 else 0.0
+        scored = zscore if self.count >= self.warmup else None
+
+        if scored is not None and abs(zscore) > self.threshold:
+            value = self.mean + math.copysign(self.threshold * std, zscore)
+
+        diff = value - self.mean
+        self.mean += self.alpha * diff
+        self.var = (1 - self.alpha) * (self.var + self.alpha * diff * diff)
+        self.count += 1
+
+        return scored
+
+
+class onlinedetector:
+    def __init__(self, coin="", alpha=0.1, threshold=3.0, warmup=10):
+        """
+        Streaming detector for one coin, scoring the log change of price, volume and market cap on every tick.
+
+        Args:
+            coin (str): The coin the ticks belong to (e.g., "bitcoin").
+            alpha (float): The EWMA weight of the newest tick. Default is 0.1.
+            threshold (float): The z-score beyond which a tick is anomalous. Default is 3.0.
+            warmup (int): The number of ticks per segment before scoring starts. Default is 10.
+        """
+        self.coin = coin
+        self.bands = {segment: ewmaband(alpha, threshold, warmup) for segment in SEGMENTS}
+        self.previous = dict.fromkeys(SEGMENTS)
+        self.ticks = 0
+        self.maxlatency = 0.0
+
+    def update(self, timestamp, price, volume, marketcap):
+        """
+        Process one observation.
+
+        Args:
+            timestamp (float): The unix time of the tick in milliseconds.
+            price (float): The price.
+            volume (float): The total volume.
+            marketcap (float): The market cap.
+
+        Returns:
+            list: The anomaly events raised by this tick, as dicts with coin, segment, index, timestamp, date, value and zscore.
+        """
+        start = time.perf_counter()
+        events = []
+
+        for segment, value in zip(SEGMENTS, (price, volume, marketcap)):
+            if value is None or not value > 0:
+                continue
+
+            previous, self.previous[segment] = self.previous[segment], value
+            if previous is None:
+                continue
+
+            zscore = self.bands[segment].update(math.log(value / previous))
+            if zscore is not None and abs(zscore) > self.bands[segment].threshold:
+                events.append({
+                    "coin": self.coin,
+                    "segment": segment,
+                    "index": self.ticks,
+                    "timestamp": timestamp,
+                    "date": analysis.unix_to_datetime_string([timestamp])[0],
+                    "value": value,
+                    "zscore": zscore,
+                })
+
+        self.ticks += 1
+        self.maxlatency = max(self.maxlatency, time.perf_counter() - start)
+        return events
+
+
+def replay(datapath, coin="", **kwargs):
+    """
+    Feed a stored series through an online detector tick by tick.
+
+    Args:
+        datapath (str): The path of the stored data file (.npy, .parquet or .json).
+        coin (str): The coin the data belongs to.
+        **kwargs: Passed through to onlinedetector.
+
+    Returns:
+        tuple: The list of anomaly events and the detector (for its tick count and maximum latency).
+    """
+    columns = storage.load(datapath)
+    detector = onlinedetector(coin, **kwargs)
+    events = []
+
+    for timestamp, price, volume, marketcap in np.asarray(columns).T.tolist():
+        events.extend(detector.update(timestamp, price, volume, marketcap))
+
+    return events, detector
+
+
+def compare(datapath, coin="", min_samples=3, **kwargs):
+    """
+    Compare the streaming detector with the batch DBSCAN and isolation forest detectors on a stored series.
+
+    Args:
+        datapath (str): The path of the stored data file.
+        coin (str): The coin the data belongs to.
+        min_samples (int): The DBSCAN min_samples used by the batch detector. Default is 3.
+        **kwargs: Passed through to onlinedetector.
+
+    Returns:
+        dict: Maps each segment to the anomalous indices of the "streaming", "dbscan" and "isolation_forest" detectors.
+    """
+    events, detector = replay(datapath, coin, **kwargs)
+    coindata = utils.getdata(datapath)
+    series = {"price": coindata.prices, "volume": coindata.volumes, "mcaps": coindata.market_caps}
+
+    results = {}
+    for segment in SEGMENTS:
+        results[segment] = {
+            "streaming": [event["index"] for event in events if event["segment"] == segment],
+            "dbscan": analysis.detect_anomalies_from_noise(series[segment], min_samples, segment=segment)[0].tolist(),
+            "isolation_forest": analysis.compute_isolation_forest(series[segment], segment=segment).tolist(),
+        }
+
+    print(f"Replayed {detector.ticks} ticks, maximum latency per tick {detector.maxlatency * 1e6:.1f}µs")
+    for segment, indices in results.items():
+        print(f"{segment}: " + ", ".join(f"{name}={values}" for name, values in indices.items()))
+
+    return results
+
+
+if __name__ == "__main__":
+
+    for coin in ("bitcoin", "ethereum"):
+        compare(storage.find(coin), coin)
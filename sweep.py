@@ -0,0 +1,283 @@
+"""
+
+Hyperparameter sweeps for the DBSCAN and isolation forest detectors.
+
+A whole grid of parameters is evaluated from one pass over the shared structure instead of one fit per configuration:
+
+- DBSCAN: the series is scaled and sorted once, and the exact eps-neighbourhood windows of dbscan1d are computed once
+  per eps. A point is noise when neither it nor any point in its window is a core point, i.e. when the largest
+  neighbourhood within its window is smaller than min_samples. That largest neighbourhood (the core profile) is found
+  once per eps, and every min_samples is a threshold on it.
+- Isolation forest: contamination only moves the score threshold, not the trees, so one fit scores every point and each
+  contamination is a percentile of those scores ("auto" is sklearn's fixed offset of -0.5).
+
+Both give exactly the anomalies analysis.compute_dbscan() and analysis.compute_isolation_forest() would find. Each
+configuration is reported with its anomaly count and its stability, the mean Jaccard similarity of its anomalies with
+those of the neighbouring configurations on the grid (1.0 when nudging the parameters changes nothing). The anomalies
+only shrink as eps, min_samples or the score threshold grow, so the similarities follow from the counts alone:
+
+    python sweep.py --coins bitcoin solana --segments price volume
+
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import analysis
+import cache
+import dbscan1d
+import pipeline
+import storage
+import tsstore
+import utils
+
+
+EPS = (0.02, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75)
+
+MIN_SAMPLES = tuple(range(2, 12))
+
+CONTAMINATION = ("auto", 0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2)
+
+## -- The isolation forest offset sklearn uses for contamination="auto" --
+AUTO_OFFSET = -0.5
+
+TABLE_COLUMNS = ["coin", "segment", "detector", "eps", "min_samples", "contamination", "threshold", "anomalies", "stability"]
+
+
+def scaled(data):
+    """
+    Standardise the values of a [timestamp, value] series exactly as the detectors in analysis.py do.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    return StandardScaler().fit_transform(analysis.seriesvalues(data).reshape(-1, 1))[:, 0]
+
+
+def windowmax(values, left, right):
+    """
+    Get the maximum of values over every non-empty [left, right) window, one sparse-table level at a time so only O(n)
+    memory is held.
+    """
+    spans = right - left
+    levels = np.log2(spans).astype(np.intp)
+    result = np.empty(len(values), dtype=values.dtype)
+    level = values
+
+    for k in range(int(levels.max()) + 1):
+        if k:
+            ## -- level[i] is the maximum of values[i:i + 2**k] --
+            level = np.maximum(level[:-(1 << (k - 1))], level[1 << (k - 1):])
+        at = np.flatnonzero(levels == k)
+        result[at] = np.maximum(level[left[at]], level[right[at] - (1 << k)])
+
+    return result
+
+
+def coreprofile(values, eps=EPS):
+    """
+    Get, for every eps, the largest neighbourhood size within eps of each point. A point is DBSCAN noise for
+    (eps, min_samples) exactly when its profile is below min_samples.
+
+    Args:
+        values (np.ndarray): The (already scaled) one-dimensional values.
+        eps (tuple): The eps values. Default is EPS.
+
+    Returns:
+        np.ndarray: The (len(eps), n) profile in input order.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values, kind="stable")
+    x = values[order]
+
+    profile = np.empty((len(eps), len(values)), dtype=np.intp)
+
+    for i, radius in enumerate(eps):
+        left, right = dbscan1d.neighbourwindows(x, radius)
+        profile[i, order] = windowmax(right - left, left, right)
+
+    return profile
+
+
+def isolation_forest_scores(values, usecache=True):
+    """
+    Score one-dimensional values with the isolation forest compute_isolation_forest() fits, lower is more anomalous.
+
+    Args:
+        values (np.ndarray): The (already scaled) values.
+        usecache (bool): Whether to reuse the cached scores of the same values. Default is True.
+
+    Returns:
+        np.ndarray: The sklearn score_samples() of every value.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+
+    key = cache.detectorcache.key(values, "isolation_forest_scores", {"random_state": 42})
+    cached = cache.detectorcache.get(key) if usecache else None
+
+    if cached is not None:
+        return cached["scores"]
+
+    from sklearn.ensemble import IsolationForest
+
+    ## -- The trees do not depend on contamination, so every threshold shares this fit --
+    scores = IsolationForest(random_state=42).fit(values).score_samples(values)
+    cache.detectorcache.put(key, scores=scores) if usecache else None
+    return scores
+
+
+def thresholds(scores, contamination=CONTAMINATION):
+    """
+    Get the score below which a point is anomalous for every contamination, as sklearn sets its offset_.
+    """
+    return np.array([AUTO_OFFSET if level == "auto" else np.percentile(scores, 100.0 * level) for level in contamination])
+
+
+def stability(counts):
+    """
+    Get the mean Jaccard similarity of each configuration's anomalies with those of its neighbours on every grid axis.
+    Along each axis the anomalies of one configuration contain those of the next, so two neighbours are
+    min(count) / max(count) similar (two empty sets are identical).
+
+    Args:
+        counts (np.ndarray): The anomaly count of every configuration, with every axis in nesting order.
+
+    Returns:
+        np.ndarray: The stability of every configuration, shaped like counts.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    total = np.zeros(counts.shape)
+    neighbours = np.zeros(counts.shape)
+
+    for axis in range(counts.ndim):
+        if counts.shape[axis] < 2:
+            continue
+
+        first = np.take(counts, np.arange(counts.shape[axis] - 1), axis=axis)
+        second = np.take(counts, np.arange(1, counts.shape[axis]), axis=axis)
+        larger = np.maximum(first, second)
+        similarity = np.where(larger > 0, np.minimum(first, second) / np.maximum(larger, 1), 1.0)
+
+        ## -- Each adjacent pair counts towards both of its configurations --
+        lower = [slice(None)] * counts.ndim
+        upper = [slice(None)] * counts.ndim
+        lower[axis], upper[axis] = slice(None, -1), slice(1, None)
+        total[tuple(lower)] += similarity
+        total[tuple(upper)] += similarity
+        neighbours[tuple(lower)] += 1
+        neighbours[tuple(upper)] += 1
+
+    return np.where(neighbours > 0, total / np.maximum(neighbours, 1), 1.0)
+
+
+def sweep_dbscan(data, eps=EPS, min_samples=MIN_SAMPLES):
+    """
+    Sweep DBSCAN over a grid of eps and min_samples on one series.
+
+    Args:
+        data (np.ndarray): The (n, 2) [timestamp, value] series, e.g. a view returned by utils.getdata().
+        eps (tuple): The eps values. Default is EPS.
+        min_samples (tuple): The min_samples values. Default is MIN_SAMPLES.
+
+    Returns:
+        list: One dict per configuration with its "eps", "min_samples", "anomalies" and "stability".
+    """
+    eps, min_samples = sorted(eps), sorted(min_samples)
+    profile = coreprofile(scaled(data), eps)
+
+    ## -- Noise counts of every min_samples from one histogram of the profile per eps --
+    histogram = np.array([np.bincount(np.minimum(row, min_samples[-1]), minlength=min_samples[-1] + 1) for row in profile])
+    counts = np.cumsum(histogram, axis=1)[:, np.array(min_samples) - 1]
+    stable = stability(counts)
+
+    return [{"eps": radius, "min_samples": samples, "anomalies": int(counts[i, j]), "stability": float(stable[i, j])}
+            for i, radius in enumerate(eps) for j, samples in enumerate(min_samples)]
+
+
+def sweep_isolation_forest(data, contamination=CONTAMINATION, usecache=True):
+    """
+    Sweep the isolation forest contamination on one series from a single fit.
+
+    Args:
+        data (np.ndarray): The (n, 2) [timestamp, value] series.
+        contamination (tuple): The contaminations. Default is CONTAMINATION.
+        usecache (bool): Whether to reuse the cached scores of the same series. Default is True.
+
+    Returns:
+        list: One dict per contamination with its "contamination", score "threshold", "anomalies" and "stability".
+        Neighbours are the contaminations with the next lower and higher threshold.
+    """
+    scores = isolation_forest_scores(scaled(data), usecache)
+    offsets = thresholds(scores, contamination)
+    counts = np.searchsorted(np.sort(scores), offsets, side="left")
+
+    order = np.argsort(offsets, kind="stable")
+    stable = np.empty(len(offsets))
+    stable[order] = stability(counts[order])
+
+    return [{"contamination": level, "threshold": float(offsets[i]), "anomalies": int(counts[i]), "stability": float(stable[i])}
+            for i, level in enumerate(contamination)]
+
+
+def run_sweep(coins, segments=tuple(pipeline.SEGMENTS), eps=EPS, min_samples=MIN_SAMPLES, contamination=CONTAMINATION,
+              resolution="daily", save=True):
+    """
+    Sweep both detectors over every segment of every coin.
+
+    Args:
+        coins (list): The CoinGecko ids of the coins, in the time-series store or with a data file in data/.
+        segments (tuple): The segments to sweep. Default is ("price", "volume", "mcaps").
+        eps (tuple): The DBSCAN eps values. Default is EPS.
+        min_samples (tuple): The DBSCAN min_samples values. Default is MIN_SAMPLES.
+        contamination (tuple): The isolation forest contaminations. Default is CONTAMINATION.
+        resolution (str): The time-series store resolution swept. Default is "daily".
+        save (bool): Whether to store the table in data/sweep.json. Default is True.
+
+    Returns:
+        pd.DataFrame: One row per coin, segment, detector and configuration (see TABLE_COLUMNS).
+    """
+    rows = []
+
+    for coin in coins:
+        columns = tsstore.store.columns(coin, resolution) if tsstore.store.has(coin, resolution) else storage.load(storage.find(coin))
+
+        for segment in segments:
+            series = storage.pairview(columns, pipeline.SEGMENTS[segment])
+            rows.extend({"coin": coin, "segment": segment, "detector": "dbscan", **row} for row in sweep_dbscan(series, eps, min_samples))
+            rows.extend({"coin": coin, "segment": segment, "detector": "isolation_forest", **row}
+                        for row in sweep_isolation_forest(series, contamination))
+
+    table = pd.DataFrame(rows, columns=TABLE_COLUMNS).astype({"min_samples": "Int64"})
+    utils.dumpjson(table.astype(object).where(table.notna(), None).to_dict(orient="records"),
+                   os.path.join(utils.getdirs(), "data/sweep.json")) if save else None
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the DBSCAN and isolation forest parameters over stored coins.")
+    parser.add_argument("--coins", nargs="+", default=["bitcoin", "ethereum"])
+    parser.add_argument("--segments", nargs="+", choices=list(pipeline.SEGMENTS), default=list(pipeline.SEGMENTS))
+    parser.add_argument("--eps", type=float, nargs="+", default=list(EPS))
+    parser.add_argument("--min-samples", type=int, nargs="+", default=list(MIN_SAMPLES))
+    parser.add_argument("--contamination", nargs="+", default=list(CONTAMINATION), help="\"auto\" or fractions in (0, 0.5].")
+    parser.add_argument("--resolution", choices=list(tsstore.RESOLUTIONS), default="daily")
+    parser.add_argument("--no-save", action="store_true", help="Do not write data/sweep.json.")
+    args = parser.parse_args(argv)
+
+    contamination = [level if level == "auto" else float(level) for level in args.contamination]
+    table = run_sweep(args.coins, tuple(args.segments), tuple(args.eps), tuple(args.min_samples), tuple(contamination),
+                      args.resolution, save=not args.no_save)
+
+    with pd.option_context("display.max_rows", None, "display.width", 160):
+        for (coin, segment, detector), rows in table.groupby(["coin", "segment", "detector"], sort=False):
+            print(f"\n{coin} {segment} {detector}")
+            print(rows.dropna(axis=1, how="all").drop(columns=["coin", "segment", "detector"]).to_string(index=False))
+
+    return 0
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,63 @@
+"""
+
+batch.run_cycle() and batch.schedule() carrying on after a stage or a whole cycle fails, with the stages replaced.
+
+"""
+
+import threading
+
+import pandas as pd
+import pytest
+
+import batch
+import data
+import gdeltplanner
+import tracing
+
+
+@pytest.fixture
+def config():
+    return batch.load_config(coins=["bitcoin", "ethereum"], stages=["refresh", "news"], force=True)
+
+
+def test_stage_errors_are_recorded_and_later_stages_run(config, tmp_path, monkeypatch):
+    def fetch_coins(*args, **kwargs):
+        raise RuntimeError("network down")
+
+    def query_anomalies(dates, coin, **kwargs):
+        if coin == "ethereum":
+            raise ValueError("bad window")
+        return {"articles": {}, "failed": {}, "retry": []}
+
+    monkeypatch.setattr(data, "fetch_coins", fetch_coins)
+    monkeypatch.setattr(gdeltplanner, "query_anomalies", query_anomalies)
+    monkeypatch.setattr(batch, "load_anomalies", lambda: pd.DataFrame({"coin": ["bitcoin", "ethereum"], "date": ["2024-01-08", "2024-01-09"]}))
+
+    summary = batch.run_cycle(config, batch.batchstate(str(tmp_path / "state.json")))
+
+    assert summary["errors"] == {"refresh": "RuntimeError: network down"}
+    assert summary["ran"]["news"] == ["bitcoin"]
+    assert summary["failed"]["news"] == {"ethereum": "bad window"}
+
+
+def test_schedule_continues_after_a_failed_cycle(config, tmp_path, monkeypatch):
+    cycles = []
+
+    def run_cycle(config):
+        cycles.append(config)
+        if len(cycles) == 1:
+            raise OSError("disk full")
+        return {"ran": {}, "skipped": {}, "failed": {}, "errors": {}}
+
+    monkeypatch.setattr(batch, "run_cycle", run_cycle)
+    monkeypatch.setattr(tracing.tracer, "export", lambda *args, **kwargs: "-")
+
+    ## -- Off the main thread, so schedule() leaves pytest's signal handlers alone --
+    summaries = []
+    thread = threading.Thread(target=lambda: summaries.extend(batch.schedule(config, interval=0.01, cycles=3, lock=batch.runlock(str(tmp_path / "batch.lock")))))
+    thread.start()
+    thread.join(timeout=10)
+
+    assert len(cycles) == 3
+    assert summaries[0] == {"errors": {"cycle": "OSError: disk full"}}
+    assert summaries[1]["errors"] == {}
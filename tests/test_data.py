@@ -0,0 +1,167 @@
+"""
+
+data.fetch_coins() against a stub CoinGecko server on localhost: concurrency, rate limiting, retries and per-coin failures.
+
+"""
+
+import http.server
+import json
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+import pytest
+
+import data
+import ratelimit
+
+
+HOST = "127.0.0.1"
+
+
+class stubhandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        coin = urlsplit(self.path).path.strip("/")
+
+        with server.lock:
+            server.inflight += 1
+            server.maxinflight = max(server.maxinflight, server.inflight)
+            server.requests.append((coin, time.monotonic()))
+            attempt = sum(requested == coin for requested, _ in server.requests)
+
+        try:
+            time.sleep(server.delay)
+            if coin == "missing":
+                return self.reply(404, {"error": "coin not found"})
+            if coin == "flaky" and attempt == 1:
+                return self.reply(503, {"error": "unavailable"}, {"Retry-After": "0"})
+            self.reply(200, {"prices": [[0, 1.0]], "market_caps": [[0, 2.0]], "total_volumes": [[0, 3.0]]})
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+    def reply(self, status, body, headers=None):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer((HOST, 0), stubhandler)
+    httpd.daemon_threads = True
+    httpd.lock, httpd.inflight, httpd.maxinflight, httpd.requests, httpd.delay = threading.Lock(), 0, 0, [], 0.0
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    ## -- A fresh limiter per test, so buckets and retry delays do not leak between tests --
+    limiter = ratelimit.RateLimiter(limits={HOST: (1000.0, 1000)}, maxretries=2, backoffbase=0.01)
+    monkeypatch.setattr(ratelimit, "limiter", limiter)
+    return limiter
+
+
+def fetch(server, coins, **kwargs):
+    baseurl = f"http://{HOST}:{server.server_address[1]}/{{coin}}?days={{days}}&interval={{interval}}"
+    return data.fetch_coins(coins, storejson=False, baseurl=baseurl, **kwargs)
+
+
+def test_requests_run_concurrently_up_to_maxworkers(server, limiter):
+    server.delay = 0.2
+    coins = [f"coin{i}" for i in range(8)]
+
+    summary = fetch(server, coins, maxworkers=4)
+
+    assert sorted(summary["succeeded"]) == coins
+    assert server.maxinflight == 4
+    assert summary["elapsed"] < len(coins) * server.delay
+
+
+def test_duplicate_coins_are_requested_once(server, limiter):
+    summary = fetch(server, ["bitcoin", "bitcoin", "solana"])
+
+    assert sorted(summary["succeeded"]) == ["bitcoin", "solana"]
+    assert len(server.requests) == 2
+
+
+def test_requests_are_rate_limited_per_host(server, limiter):
+    limiter.configure(HOST, rate=20.0, capacity=1)
+
+    fetch(server, [f"coin{i}" for i in range(6)], maxworkers=6)
+
+    starts = sorted(started for _, started in server.requests)
+    assert len(starts) == 6
+    ## -- One token every 50ms, the first request spends the initial token --
+    assert starts[-1] - starts[0] >= 5 * 0.05 * 0.9
+
+
+def test_retry_and_partial_failure(server, limiter):
+    summary = fetch(server, ["bitcoin", "flaky", "missing"])
+
+    assert sorted(summary["succeeded"]) == ["bitcoin", "flaky"]
+    assert list(summary["failed"]) == ["missing"]
+    assert "404" in summary["failed"]["missing"]
+    assert [coin for coin, _ in server.requests].count("flaky") == 2
+    assert summary["data"]["flaky"]["prices"] == [[0, 1.0]]
+
+
+DAY = data.DAY_MS
+TODAY = 20_000 * DAY
+
+
+def chart(points):
+    """
+    Build a market chart dict with the same (timestamp, value) points in every series.
+    """
+    return {key: [[t, value] for t, value in points] for key in ("prices", "market_caps", "total_volumes")}
+
+
+def test_merge_replaces_the_stored_live_snapshot():
+    existing = chart([(TODAY - 2 * DAY, 1.0), (TODAY - DAY, 2.0), (TODAY - DAY + 3_600_000, 2.5)])
+    new = chart([(TODAY, 3.0), (TODAY + 7_200_000, 3.5)])
+
+    merged = data.merge_series(existing, new)
+
+    assert merged["prices"] == [[TODAY - 2 * DAY, 1.0], [TODAY - DAY, 2.0], [TODAY, 3.0], [TODAY + 7_200_000, 3.5]]
+    assert merged["prices"] == merged["market_caps"] == merged["total_volumes"]
+
+
+def test_merge_new_values_win_on_duplicate_timestamps():
+    merged = data.merge_series(chart([(TODAY - DAY, 1.0), (TODAY, 2.0)]), chart([(TODAY, 20.0), (TODAY + DAY, 30.0)]))
+
+    assert merged["prices"] == [[TODAY - DAY, 1.0], [TODAY, 20.0], [TODAY + DAY, 30.0]]
+
+
+def test_merge_keeps_the_last_keepdays_boundary_points_and_the_live_point():
+    existing = chart([(TODAY - day * DAY, float(day)) for day in range(30, 0, -1)])
+    new = chart([(TODAY, 0.0), (TODAY + 3_600_000, -1.0)])
+
+    merged = data.merge_series(existing, new, keepdays=7)
+
+    assert [t for t, _ in merged["prices"]] == [TODAY - day * DAY for day in range(6, -1, -1)] + [TODAY + 3_600_000]
+    assert len(data.merge_series(existing, new, keepdays=None)["prices"]) == 32
+
+
+def test_missing_days():
+    live = TODAY + 5 * 3_600_000
+    stored = chart([(TODAY - DAY, 1.0), (TODAY, 2.0), (TODAY + 3_600_000, 2.5)])
+
+    assert data.missing_days(stored, now=live) == 1
+    assert data.missing_days(chart([(TODAY - 3 * DAY, 1.0), (TODAY - 3 * DAY + 60_000, 1.5)]), now=live) == 4
+    assert data.missing_days(chart([(TODAY - 400 * DAY, 1.0)]), maxdays=90, now=live) == 90
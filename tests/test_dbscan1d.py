@@ -0,0 +1,97 @@
+"""
+
+dbscan1d.py and the sweep.py grids against sklearn on randomised inputs: continuous values, values on a grid of eps
+multiples (exact ties at the radius), heavy duplicates and tight clusters with outliers, at every size from a single
+point up.
+
+"""
+
+import numpy as np
+import pytest
+
+from sklearn.cluster import DBSCAN
+from sklearn.ensemble import IsolationForest
+
+import dbscan1d
+import sweep
+
+
+KINDS = ("normal", "grid", "duplicates", "clusters")
+
+## -- sklearn's algorithm="auto" clusters one column with its kd-tree from this many points on --
+TREE_POINTS = 12
+
+
+def randomvalues(rng, kind, n, eps):
+    if kind == "normal":
+        return rng.normal(size=n)
+    if kind == "grid":
+        return rng.integers(0, 30, n) * eps
+    if kind == "duplicates":
+        return np.round(rng.normal(size=n), 1)
+
+    values = np.r_[rng.normal(0, eps / 4, n // 2), rng.normal(5, 2, n - n // 2)]
+    rng.shuffle(values)
+    return values
+
+
+def cases(seed, trials, sizes):
+    rng = np.random.default_rng(seed)
+    for trial in range(trials):
+        kind, n = KINDS[trial % len(KINDS)], int(rng.integers(*sizes))
+        eps, min_samples = float(rng.choice([0.05, 0.1, 0.2, 0.25, 0.5, 1.0])), int(rng.integers(1, 10))
+        yield kind, randomvalues(rng, kind, n, eps), eps, min_samples
+
+
+@pytest.mark.parametrize("sizes", [(1, TREE_POINTS), (TREE_POINTS, 500)], ids=["small", "large"])
+def test_labels_match_sklearn_tree(sizes):
+    for kind, values, eps, min_samples in cases(0, 200, sizes):
+        expected = DBSCAN(eps=eps, min_samples=min_samples, algorithm="kd_tree").fit_predict(values.reshape(-1, 1))
+        np.testing.assert_array_equal(dbscan1d.dbscan(values, eps, min_samples), expected,
+                                      err_msg=f"{kind}, n={len(values)}, eps={eps}, min_samples={min_samples}")
+
+
+def test_labels_match_sklearn_default_from_tree_points():
+    for kind, values, eps, min_samples in cases(1, 200, (TREE_POINTS, 500)):
+        expected = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(values.reshape(-1, 1))
+        np.testing.assert_array_equal(dbscan1d.dbscan(values, eps, min_samples), expected,
+                                      err_msg=f"{kind}, n={len(values)}, eps={eps}, min_samples={min_samples}")
+
+
+def test_small_inputs_without_ties_match_sklearn_default():
+    for kind, values, eps, min_samples in cases(2, 200, (1, TREE_POINTS)):
+        if kind in ("normal", "clusters"):
+            expected = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(values.reshape(-1, 1))
+            np.testing.assert_array_equal(dbscan1d.dbscan(values, eps, min_samples), expected)
+
+
+def test_tie_at_eps_is_a_neighbour():
+    ## -- 0.5 - 0.4 is within 0.1 in floating point, sklearn's brute force (below TREE_POINTS) computes it as just over --
+    values = np.array([0.4, 0.5])
+    np.testing.assert_array_equal(dbscan1d.dbscan(values, eps=0.1, min_samples=2), [0, 0])
+    np.testing.assert_array_equal(DBSCAN(eps=0.1, min_samples=2, algorithm="kd_tree").fit_predict(values.reshape(-1, 1)), [0, 0])
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        dbscan1d.dbscan(np.zeros((3, 2)))
+    with pytest.raises(ValueError):
+        dbscan1d.dbscan(np.array([0.0, np.nan]))
+    with pytest.raises(ValueError):
+        dbscan1d.dbscan(np.zeros(3), eps=0)
+    assert len(dbscan1d.dbscan(np.array([]))) == 0
+
+
+def test_sweep_dbscan_matches_sklearn():
+    for kind, values, eps, min_samples in cases(3, 200, (1, 500)):
+        expected = DBSCAN(eps=eps, min_samples=min_samples, algorithm="kd_tree").fit_predict(values.reshape(-1, 1))
+        np.testing.assert_array_equal(sweep.coreprofile(values, (eps,))[0] < min_samples, expected == -1,
+                                      err_msg=f"{kind}, n={len(values)}, eps={eps}, min_samples={min_samples}")
+
+
+@pytest.mark.parametrize("contamination", ["auto", 0.01, 0.05, 0.1, 0.2])
+def test_sweep_isolation_forest_matches_sklearn(contamination):
+    values = np.random.default_rng(4).normal(size=300)
+    model = IsolationForest(contamination=contamination, random_state=42).fit(values.reshape(-1, 1))
+    scores = sweep.isolation_forest_scores(values, usecache=False)
+    np.testing.assert_array_equal(scores < sweep.thresholds(scores, (contamination,))[0], model.predict(values.reshape(-1, 1)) == -1)
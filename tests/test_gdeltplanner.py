@@ -0,0 +1,146 @@
+"""
+
+gdeltplanner.fetch_windows() through the real gdeltdoc client, redirected to a fake GDELT endpoint on localhost:
+retries of throttled windows, failed windows reported for retrying, and the query cache.
+
+"""
+
+import datetime
+import http.server
+import json
+import os
+import threading
+import time
+
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import gdeltplanner
+import ratelimit
+
+
+DATES = ["2024-01-08", "2024-01-10", "2024-03-01", "2024-06-01"]
+
+ARTICLES = {
+    "20240101000000": [("https://news.example/early", "20240102T120000Z"), ("https://news.example/late", "20240115T120000Z")],
+    "20240223000000": [("https://news.example/march", "20240301T080000Z")],
+    "20240525000000": [("https://news.example/june", "20240601T080000Z")],
+}
+
+
+class fakegdelt(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        start, mode = query["startdatetime"][0], query["mode"][0]
+
+        with server.lock:
+            server.requests.append((start, mode))
+            attempt = server.requests.count((start, mode))
+
+        ## -- The second window is throttled once, the third is rejected while the endpoint is broken --
+        if start == "20240223000000" and mode == "artlist" and attempt == 1:
+            return self.reply(429, {}, {"Retry-After": "0"})
+        if start == "20240525000000" and server.broken:
+            return self.reply(400, {})
+
+        if mode == "artlist":
+            return self.reply(200, {"articles": [{"url": url, "title": url, "seendate": seen, "language": "English"} for url, seen in ARTICLES[start]]})
+        self.reply(200, {"timeline": [{"series": "Volume Intensity", "data": [{"date": f"{start[:8]}T000000Z", "value": 0.5}]}]})
+
+    def reply(self, status, body, headers=None):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    gdeltdoc = pytest.importorskip("gdeltdoc.api_client")
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), fakegdelt)
+    httpd.daemon_threads = True
+    httpd.lock, httpd.requests, httpd.broken = threading.Lock(), [], True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    get = gdeltdoc.requests.get
+    local = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setattr(gdeltdoc.requests, "get", lambda url, **kwargs: get(url.replace(f"https://{ratelimit.GDELT_HOST}", local), **kwargs))
+    monkeypatch.setattr(ratelimit, "limiter", ratelimit.RateLimiter(limits={ratelimit.GDELT_HOST: (1000.0, 1000)}, maxretries=2, backoffbase=0.01))
+
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_plan_windows_merges_overlaps():
+    windows = gdeltplanner.plan_windows(DATES + ["2024-01-08"])
+
+    assert [gdeltplanner.windowkey(window) for window in windows] == ["2024-01-01..2024-01-17", "2024-02-23..2024-03-08", "2024-05-25..2024-06-08"]
+    assert windows[0]["dates"] == ["2024-01-08", "2024-01-10"]
+
+
+def test_retry_and_partial_failure(endpoint, tmp_path):
+    cache = gdeltplanner.querycache(str(tmp_path))
+    windows = gdeltplanner.plan_windows(DATES)
+
+    summary = gdeltplanner.fetch_windows(windows, "bitcoin", cache=cache)
+
+    ## -- The throttled window was retried by the limiter, the rejected one is handed back for retrying --
+    assert sorted(summary["results"]) == ["2024-01-01..2024-01-17", "2024-02-23..2024-03-08"]
+    assert list(summary["failed"]) == ["2024-05-25..2024-06-08"]
+    assert summary["retry"] == [windows[2]]
+    assert endpoint.requests.count(("20240223000000", "artlist")) == 2
+
+    articles, timeline = summary["results"]["2024-01-01..2024-01-17"]
+    assert gdeltplanner.split_articles(articles, windows[0]["dates"]) == {
+        "2024-01-08": ["https://news.example/early"],
+        "2024-01-10": ["https://news.example/late"],
+    }
+    assert len(timeline) == 1
+
+    endpoint.broken = False
+    retried = gdeltplanner.fetch_windows(summary["retry"], "bitcoin", cache=cache)
+
+    assert list(retried["results"]) == ["2024-05-25..2024-06-08"]
+    assert not retried["failed"] and not retried["retry"]
+
+
+def test_cached_windows_are_not_searched_again(endpoint, tmp_path):
+    cache = gdeltplanner.querycache(str(tmp_path))
+    windows = gdeltplanner.plan_windows(DATES[:2])
+
+    first = gdeltplanner.fetch_windows(windows, "bitcoin", cache=cache)
+    searched = len(endpoint.requests)
+    second = gdeltplanner.fetch_windows(windows, "bitcoin", cache=cache)
+
+    assert searched == 2
+    assert len(endpoint.requests) == searched
+    assert list(second["results"]["2024-01-01..2024-01-17"][0]["url"]) == list(first["results"]["2024-01-01..2024-01-17"][0]["url"])
+
+
+def test_open_windows_expire_from_the_cache(tmp_path):
+    pd = pytest.importorskip("pandas")
+    cache = gdeltplanner.querycache(str(tmp_path))
+    now = datetime.datetime.now().replace(microsecond=0)
+    closed, current = (now - timedelta(days=30), now - timedelta(days=16)), (now - timedelta(days=7), now + timedelta(days=7))
+    hourago = time.time() - gdeltplanner.OPEN_TTL - 60
+
+    for start, end in (closed, current):
+        cache.put("bitcoin", start, end, 10, pd.DataFrame({"url": ["https://news.example/a"]}), pd.DataFrame())
+        assert cache.get("bitcoin", start, end, 10) is not None
+        os.utime(cache.path("bitcoin", start, end, 10), (hourago, hourago))
+
+    assert cache.get("bitcoin", *closed, 10) is not None
+    assert cache.get("bitcoin", *current, 10) is None
@@ -0,0 +1,59 @@
+"""
+
+linkcheck.linkchecker caching and per-host limits, with the HTTP request replaced.
+
+"""
+
+import threading
+
+import linkcheck
+
+
+def checker(tmp_path, statuses, **kwargs):
+    checker = linkcheck.linkchecker(cachepath=str(tmp_path / "linkcheck.json"), **kwargs)
+    checker.requested = []
+
+    def request(url):
+        checker.requested.append(url)
+        return statuses[url]
+
+    checker.request = request
+    return checker
+
+
+def test_statuses_are_reused_within_the_ttl(tmp_path):
+    links = checker(tmp_path, {"https://a.example/": 200, "https://b.example/": 404})
+
+    assert links.alive(["https://a.example/", "https://b.example/", "https://a.example/"]) == ["https://a.example/", "https://a.example/"]
+    assert links.alive(["https://a.example/", "https://b.example/"]) == ["https://a.example/"]
+    assert sorted(links.requested) == ["https://a.example/", "https://b.example/"]
+
+
+def test_failures_are_only_reused_for_the_failure_ttl(tmp_path):
+    statuses = {"https://a.example/": None}
+    links = checker(tmp_path, statuses, failurettl=0)
+
+    assert links.alive(["https://a.example/"]) == []
+    statuses["https://a.example/"] = 200
+    assert links.alive(["https://a.example/"]) == ["https://a.example/"]
+    assert len(links.requested) == 2
+
+    ## -- Persisted failures expire too --
+    assert "https://a.example/" in checker(tmp_path, statuses).load()
+    links.results["https://b.example/"] = [None, 0.0]
+    links.save()
+    assert "https://b.example/" not in links.load()
+
+
+def test_one_semaphore_per_host(tmp_path):
+    links = checker(tmp_path, {})
+    semaphores = []
+    threads = [threading.Thread(target=lambda: semaphores.append(links.hostlimit("a.example"))) for _ in range(16)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(semaphore) for semaphore in semaphores}) == 1
+    assert links.hostlimit("b.example") is not semaphores[0]
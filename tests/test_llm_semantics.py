@@ -0,0 +1,122 @@
+"""
+
+SemanticEngine with a fake model: prompt deduplication, the response cache and map-reduce packing under a token budget.
+
+"""
+
+import sys
+import threading
+import types
+
+import pytest
+
+try:
+    import google.generativeai
+except ImportError:
+    ## -- Only GeminiModel uses the SDK, so the engine is tested against a placeholder when it is not installed --
+    sdk = types.ModuleType("google.generativeai")
+    sdk.GenerativeModel, sdk.configure = object, lambda **kwargs: None
+    sys.modules.setdefault("google", types.ModuleType("google")).generativeai = sdk
+    sys.modules["google.generativeai"] = sdk
+
+import llm_semantics
+import llm_utils
+
+from prompts import REDUCE_INSTRUCTION
+
+
+CALLS = 1000
+
+class fakemodel:
+    def __init__(self, model_name="fake", fill=False):
+        """
+        Stands in for GeminiModel. Every response is numbered, and with fill=True padded to the full max_tokens.
+        Fails after CALLS prompts, so an analysis that never converges ends the test instead of hanging it.
+        """
+        self.model_name = model_name
+        self.role = "You are a fake analyst."
+        self.fill = fill
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def build_prompt(self, articles):
+        return llm_semantics.PromptBuild.build_prompt(articles, self.role, "", "Explain the anomaly.")
+
+    def run_semantics(self, prompt, max_tokens=1024):
+        with self.lock:
+            if len(self.prompts) >= CALLS:
+                raise RuntimeError(f"More than {CALLS} prompts.")
+            self.prompts.append(prompt)
+            response = f"analysis {len(self.prompts)}."
+        return response.ljust(max_tokens * 4 - 4, ".") if self.fill else response
+
+
+@pytest.fixture
+def model():
+    return fakemodel()
+
+
+def test_identical_prompts_run_once(model, tmp_path):
+    engine = llm_semantics.SemanticEngine(model, cachedir=str(tmp_path))
+
+    responses = engine.run_prompts(["a", "b", "a", "a"])
+
+    assert sorted(model.prompts) == ["a", "b"]
+    assert responses[0] == responses[2] == responses[3] != responses[1]
+
+
+def test_responses_are_cached_per_model(model, tmp_path):
+    first = llm_semantics.SemanticEngine(model, cachedir=str(tmp_path)).run_prompts(["a", "b"])
+
+    assert llm_semantics.SemanticEngine(model, cachedir=str(tmp_path)).run_prompts(["b", "a"]) == first[::-1]
+    assert len(model.prompts) == 2
+
+    other = fakemodel("other")
+    llm_semantics.SemanticEngine(other, cachedir=str(tmp_path)).run_prompts(["a"])
+    assert other.prompts == ["a"]
+
+
+def test_articles_are_deduplicated_before_packing(model, tmp_path):
+    urls = ["https://news.example/bitcoin-price-falls-after-hack", "https://www.news.example/bitcoin-price-falls-after-hack/?utm_source=x",
+            "https://other.example/markets"]
+
+    analyses = llm_semantics.SemanticEngine(model, cachedir=str(tmp_path)).analyse_packed({"2024-01-08": urls})
+
+    assert len(model.prompts) == 1
+    assert model.prompts[0].count("bitcoin-price-falls-after-hack") == 1
+    assert analyses == {"2024-01-08": "analysis 1."}
+
+
+def test_map_reduce_merges_every_partial(tmp_path):
+    model = fakemodel(fill=True)
+    events = {"2024-01-08": [f"https://news.example/{i}" for i in range(200)], "2024-03-01": ["https://news.example/march"]}
+
+    analyses = llm_semantics.SemanticEngine(model, cachedir=str(tmp_path)).analyse_packed(events, budget=600, max_tokens=64)
+
+    maps = [prompt for prompt in model.prompts if REDUCE_INSTRUCTION not in prompt]
+    reduces = [prompt for prompt in model.prompts if REDUCE_INSTRUCTION in prompt]
+    partials = [f"analysis {i}.".ljust(64 * 4 - 4, ".") for i in range(1, len(model.prompts) + 1)]
+
+    assert len(maps) > 2 and reduces
+    assert all(llm_utils.estimate_tokens(prompt) <= 600 for prompt in model.prompts)
+    ## -- Every partial except the final analyses reaches a reduce prompt whole, and every reduce merges at least two --
+    assert all(sum(partial in prompt for partial in partials) >= 2 for prompt in reduces)
+    assert sum(sum(partial in prompt for partial in partials) for prompt in reduces) == len(model.prompts) - len(events)
+    assert set(analyses) == set(events) and all(analysis in partials for analysis in analyses.values())
+
+
+def test_budget_too_small_to_merge_raises_before_any_call(model, tmp_path):
+    events = {"2024-01-08": [f"https://news.example/{i}" for i in range(300)]}
+
+    with pytest.raises(ValueError):
+        llm_semantics.SemanticEngine(model, cachedir=str(tmp_path)).analyse_packed(events, budget=1500, max_tokens=1024)
+
+    assert model.prompts == []
+
+
+def test_pack_articles_keeps_oversized_items_whole():
+    chunks = llm_utils.pack_articles(["x" * 100, "y" * 8, "z" * 8], budget=10, truncate=False)
+
+    assert ["x" * 100] in chunks
+    assert sorted(sum(chunks, [])) == sorted(["x" * 100, "y" * 8, "z" * 8])
+    assert all(len(item) <= 36 for chunk in llm_utils.pack_articles(["x" * 100], budget=10) for item in chunk)
@@ -0,0 +1,243 @@
+"""
+
+Structured tracing for the pipeline stages and every external call.
+
+Stages and calls are recorded as spans (name, duration, byte count, outcome and attributes, nested per thread) and
+summed into counters per span name. Spans are exported as JSON lines, and a run can additionally be captured with
+cProfile or pyinstrument:
+
+    with tracing.tracer.span("stage.detect", coin="bitcoin") as span:
+        ...
+        span["bytes"] = len(payload)
+
+    tracing.tracer.export()   # .cache/traces/trace-<time>-<pid>.jsonl
+
+"""
+
+import contextlib
+import cProfile
+import functools
+import itertools
+import json
+import os
+import pstats
+import threading
+import time
+
+from collections import defaultdict
+
+import utils
+
+
+def sizeof(value):
+    """
+    Best-effort size in bytes of a call result (bytes, text, DataFrames and responses with a .content or .text).
+    """
+    try:
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, str):
+            return len(value.encode())
+        if hasattr(value, "memory_usage"):
+            return int(value.memory_usage(deep=True).sum())
+        if hasattr(value, "content"):
+            return len(value.content or b"")
+        if hasattr(value, "text"):
+            return len(value.text.encode())
+    except Exception:
+        pass
+    return 0
+
+
+class spantracer:
+    def __init__(self, maxspans=100_000):
+        """
+        Thread-safe recorder of spans and counters.
+
+        Args:
+            maxspans (int): The maximum number of spans kept in memory until the next export, later spans are only counted. Default is 100 000.
+        """
+        self.maxspans = maxspans
+        self.spans = []
+        self.counters = defaultdict(float)
+        self.dropped = 0
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def count(self, name, value=1):
+        """
+        Add to a counter.
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def record(self, span):
+        """
+        Keep a finished span and add it to the counters of its name.
+        """
+        with self.lock:
+            self.counters[f"{span['name']}.calls"] += 1
+            self.counters[f"{span['name']}.seconds"] += span["seconds"]
+            self.counters[f"{span['name']}.bytes"] += span["bytes"]
+            self.counters[f"{span['name']}.errors"] += span["outcome"] != "ok"
+
+            if len(self.spans) < self.maxspans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def add(self, name, seconds, nbytes=0, outcome="ok", **attrs):
+        """
+        Record a span measured elsewhere, e.g. a task timed in a worker process.
+        """
+        stack = self.stack()
+        self.record({"id": next(self.ids), "parent": stack[-1]["id"] if stack else None, "name": name,
+                     "start": time.time() - seconds, "seconds": seconds, "bytes": nbytes, "outcome": outcome,
+                     "thread": threading.current_thread().name, "attrs": attrs})
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        Time a block as a span nested under the thread's current span.
+        The yielded dict can be updated with "bytes", "outcome" or more "attrs" before the block ends.
+        An exception marks the span as an error and is re-raised.
+
+        Args:
+            name (str): The span name, e.g. "stage.detect" or "http".
+            **attrs: Attributes of the span (e.g., host, coin).
+        """
+        stack = self.stack()
+        span = {"id": next(self.ids), "parent": stack[-1]["id"] if stack else None, "name": name, "start": time.time(),
+                "seconds": 0.0, "bytes": 0, "outcome": "ok", "thread": threading.current_thread().name, "attrs": attrs}
+
+        stack.append(span)
+        start = time.perf_counter()
+
+        try:
+            yield span
+        except BaseException as e:
+            span["outcome"] = "error"
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span["seconds"] = time.perf_counter() - start
+            stack.pop()
+            self.record(span)
+
+    def traced(self, name=None):
+        """
+        Decorator recording every call of a function as a span (named after the function by default).
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__qualname__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        Get the calls, total seconds, bytes and errors of every span name, slowest first.
+
+        Returns:
+            list: One dict per span name.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+
+        names = {key.rsplit(".", 1)[0] for key in counters if key.endswith(".calls")}
+        rows = [{"name": name, **{field: counters.get(f"{name}.{field}", 0) for field in ("calls", "seconds", "bytes", "errors")}}
+                for name in names]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def report(self):
+        """
+        Print the summary as a table.
+        """
+        print(f"{'span':<28}{'calls':>8}{'seconds':>12}{'bytes':>14}{'errors':>8}")
+        for row in self.summary():
+            print(f"{row['name']:<28}{int(row['calls']):>8}{row['seconds']:>12.3f}{int(row['bytes']):>14}{int(row['errors']):>8}")
+
+    def export(self, path=None, clear=True):
+        """
+        Write the spans, then the counters, as JSON lines.
+
+        Args:
+            path (str): The JSON lines file, appended to. Default is None, which uses .cache/traces/trace-<time>-<pid>.jsonl.
+            clear (bool): Whether to drop the exported spans from memory. Counters are kept. Default is True.
+
+        Returns:
+            str: The path written.
+        """
+        path = path or os.path.join(utils.getdirs(), ".cache", "traces", f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with self.lock:
+            spans, dropped = self.spans, self.dropped
+            counters = dict(self.counters)
+            if clear:
+                self.spans, self.dropped = [], 0
+
+        with open(path, "a") as f:
+            for span in spans:
+                f.write(json.dumps({"type": "span", **span}, default=str) + "\n")
+            f.write(json.dumps({"type": "counters", "time": time.time(), "dropped": dropped, "counters": counters}) + "\n")
+
+        return path
+
+
+@contextlib.contextmanager
+def profile(mode="cprofile", path=None, top=25):
+    """
+    Capture a profile of a block with cProfile or pyinstrument (an optional dependency).
+
+    Args:
+        mode (str): "cprofile" or "pyinstrument". Default is "cprofile".
+        path (str): The output file, .prof for cProfile and .html for pyinstrument. Default is None, which writes to .cache/traces.
+        top (int): The number of functions printed by cumulative time. Default is 25.
+    """
+    if mode not in ("cprofile", "pyinstrument"):
+        raise ValueError(f"Unknown profile mode '{mode}'. Please choose 'cprofile' or 'pyinstrument'.")
+
+    suffix = ".prof" if mode == "cprofile" else ".html"
+    path = path or os.path.join(utils.getdirs(), ".cache", "traces", f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{suffix}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("pyinstrument is not installed. Install it with 'pip install pyinstrument' or use mode='cprofile'.") from e
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text(unicode=True, color=False))
+            print(f"Profile written to {path}")
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+        print(f"Profile written to {path}")
+
+
+## -- Shared by the runner stages, ratelimit, linkcheck and the LLM clients --
+tracer = spantracer()
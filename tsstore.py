@@ -0,0 +1,296 @@
+"""
+
+Multi-resolution time-series store for many coins.
+
+Each coin is stored at minute, hourly and daily resolution as (7, n) float64 arrays of timestamp, price (the close),
+volume, market cap, open, high and low. The first four rows are the storage.py columnar layout, so a range read is
+usable as-is by utils.getdata() and the detectors. Series are partitioned by month (minute), year (hourly) or kept
+whole (daily) in .npy files that are memory-mapped on read, and range queries binary search the timestamps of the
+overlapping partitions only.
+
+Writing a resolution rolls the touched buckets up into every coarser resolution: OHLC for price, summed volume and
+the last market cap. Backfilling years of minute data in chunks therefore only ever holds one chunk and the partitions
+it touches in memory.
+
+"""
+
+import os
+
+import numpy as np
+
+import storage
+import utils
+
+
+COLUMNS = storage.COLUMNS + ("open", "high", "low")
+
+## -- Bucket size of each resolution in milliseconds, finest first --
+STEPS = {"minute": 60 * 1000, "hourly": 60 * 60 * 1000, "daily": 24 * 60 * 60 * 1000}
+
+RESOLUTIONS = tuple(STEPS)
+
+## -- numpy datetime unit each resolution is partitioned by, None keeps a single partition --
+PARTITIONS = {"minute": "M", "hourly": "Y", "daily": None}
+
+WHOLE = "all"
+
+
+def to_ohlc(columns):
+    """
+    Expand a (4, n) storage.py columnar array into the (7, n) OHLC layout, with open, high and low equal to the price.
+
+    Args:
+        columns (np.ndarray): The (4, n) or (7, n) columnar array.
+
+    Returns:
+        np.ndarray: The (7, n) columnar array.
+    """
+    columns = np.asarray(columns, dtype=np.float64)
+    if columns.shape[0] == len(COLUMNS):
+        return columns
+
+    return np.vstack([columns, np.broadcast_to(columns[1], (3, columns.shape[1]))])
+
+
+def rollup(columns, step, sumvolume=True):
+    """
+    Aggregate sorted (7, n) columns into buckets of step milliseconds, labelled by the start of each bucket.
+
+    Args:
+        columns (np.ndarray): The (7, n) columnar array sorted by timestamp.
+        step (int): The bucket size in milliseconds (see STEPS).
+        sumvolume (bool): Whether the volume of a bucket is the sum of its points, or their last value. Default is True.
+
+    Returns:
+        np.ndarray: The (7, m) rolled up array: first open, max high, min low, last price (close) and last market cap.
+    """
+    if columns.shape[1] == 0:
+        return np.empty((len(COLUMNS), 0))
+
+    buckets = np.floor_divide(columns[0], step) * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    rolled = np.empty((len(COLUMNS), len(starts)))
+    rolled[0] = buckets[starts]
+    rolled[1] = columns[1, ends]
+    rolled[2] = np.add.reduceat(np.nan_to_num(columns[2]), starts) if sumvolume else columns[2, ends]
+    rolled[3] = columns[3, ends]
+    rolled[4] = columns[4, starts]
+    rolled[5] = np.fmax.reduceat(columns[5], starts)
+    rolled[6] = np.fmin.reduceat(columns[6], starts)
+    return rolled
+
+
+def tomillis(value):
+    """
+    Convert a time bound to Unix milliseconds.
+
+    Args:
+        value (int, float, str or datetime): Unix milliseconds, or anything pd.Timestamp accepts (naive times are UTC).
+
+    Returns:
+        int: The Unix timestamp in milliseconds, or None if value is None.
+    """
+    if value is None or isinstance(value, (int, float, np.integer, np.floating)):
+        return value
+
+    import pandas as pd
+
+    timestamp = pd.Timestamp(value)
+    timestamp = timestamp.tz_convert("UTC") if timestamp.tzinfo else timestamp
+    return timestamp.value // 10**6
+
+
+def infer_resolution(timestamps):
+    """
+    Get the coarsest resolution no wider than the typical spacing of the timestamps.
+
+    Args:
+        timestamps (np.ndarray): The sorted Unix timestamps in milliseconds.
+
+    Returns:
+        str: One of RESOLUTIONS.
+    """
+    spacing = np.median(np.diff(timestamps)) if len(timestamps) > 1 else STEPS["daily"]
+    fits = [resolution for resolution in RESOLUTIONS if STEPS[resolution] <= spacing]
+    return fits[-1] if fits else "minute"
+
+
+class tsstore:
+    def __init__(self, directory=None):
+        """
+        Partitioned .npy store of every coin at every resolution.
+
+        Args:
+            directory (str): The store directory. Default is None, which uses data/ts in the working directory.
+        """
+        self.directory = directory or os.path.join(utils.getdirs(), "data", "ts")
+        self.backend = storage.BACKENDS["npy"]
+
+    def path(self, coin, resolution, key=None):
+        directory = os.path.join(self.directory, coin, resolution)
+        return directory if key is None else os.path.join(directory, f"{key}.npy")
+
+    def partitions(self, coin, resolution, start=None, end=None):
+        """
+        Get the partition files of a coin's resolution overlapping [start, end), in time order.
+
+        Args:
+            coin (str): The CoinGecko id of the coin.
+            resolution (str): One of RESOLUTIONS.
+            start (int): The first timestamp in Unix milliseconds. Default is None, no lower bound.
+            end (int): The timestamp the range stops before. Default is None, no upper bound.
+
+        Returns:
+            list: The paths of the overlapping partitions.
+        """
+        try:
+            keys = sorted(file[:-len(".npy")] for file in os.listdir(self.path(coin, resolution)) if file.endswith(".npy"))
+        except OSError:
+            return []
+
+        unit = PARTITIONS[resolution]
+        paths = []
+
+        for key in keys:
+            if key != WHOLE:
+                first = np.datetime64(key, unit)
+                lo, hi = (int(bound.astype("datetime64[ms]").astype(np.int64)) for bound in (first, first + 1))
+                if (end is not None and lo >= end) or (start is not None and hi <= start):
+                    continue
+            paths.append(self.path(coin, resolution, key))
+
+        return paths
+
+    def read(self, coin, resolution="daily", start=None, end=None):
+        """
+        Read a coin's series within a time range. A range inside one partition is a zero-copy memory-mapped view.
+
+        Args:
+            coin (str): The CoinGecko id of the coin.
+            resolution (str): One of "minute", "hourly" or "daily". Default is "daily".
+            start (int, str or datetime): The first time included. Default is None, from the first stored point.
+            end (int, str or datetime): The time the range stops before. Default is None, up to the last stored point.
+
+        Returns:
+            np.ndarray: The (7, n) columnar array (see COLUMNS), empty if nothing is stored in the range.
+        """
+        start, end = tomillis(start), tomillis(end)
+        slices = []
+
+        for path in self.partitions(coin, resolution, start, end):
+            columns = self.backend.load(path)
+            lo = 0 if start is None else np.searchsorted(columns[0], start, side="left")
+            hi = columns.shape[1] if end is None else np.searchsorted(columns[0], end, side="left")
+            slices.append(columns[:, lo:hi]) if hi > lo else None
+
+        if not slices:
+            return np.empty((len(COLUMNS), 0))
+
+        return slices[0] if len(slices) == 1 else np.concatenate(slices, axis=1)
+
+    def columns(self, coin, resolution="daily", start=None, end=None):
+        """
+        Read a coin's series within a time range in the (4, n) storage.py layout of timestamp, price, volume and market cap.
+        Same arguments as read().
+        """
+        return self.read(coin, resolution, start, end)[:len(storage.COLUMNS)]
+
+    def write(self, coin, columns, resolution=None, rollup_coarser=True):
+        """
+        Merge points into a coin's resolution and roll the touched buckets up into the coarser resolutions.
+        Points are aligned to the start of their bucket (the last point of a bucket wins), and stored points at the same
+        timestamps are replaced. Backfills can be written in chunks of any size.
+
+        Args:
+            coin (str): The CoinGecko id of the coin.
+            columns (np.ndarray): The (4, n) storage.py or (7, n) OHLC columnar array.
+            resolution (str): One of RESOLUTIONS. Default is None, which infers it from the spacing of the timestamps.
+            rollup_coarser (bool): Whether to update the coarser resolutions. Default is True.
+
+        Returns:
+            int: The number of buckets written at this resolution.
+        """
+        columns = to_ohlc(columns)
+        columns = columns[:, ~np.isnan(columns[0])]
+        columns = columns[:, np.argsort(columns[0], kind="stable")]
+
+        if columns.shape[1] == 0:
+            return 0
+
+        resolution = resolution or infer_resolution(columns[0])
+        columns = rollup(columns, STEPS[resolution], sumvolume=False)
+
+        os.makedirs(self.path(coin, resolution), exist_ok=True)
+        unit = PARTITIONS[resolution]
+        keys = np.datetime_as_string(columns[0].astype("datetime64[ms]").astype(f"datetime64[{unit}]")) if unit else np.full(columns.shape[1], WHOLE)
+
+        for key in np.unique(keys):
+            self.merge(self.path(coin, resolution, key), columns[:, keys == key])
+
+        coarser = RESOLUTIONS[RESOLUTIONS.index(resolution) + 1:]
+        if rollup_coarser and coarser:
+            ## -- Re-aggregate every coarser bucket the new points fall in from the stored finer series --
+            step = STEPS[coarser[0]]
+            lo, hi = columns[0, 0] // step * step, (columns[0, -1] // step + 1) * step
+            self.write(coin, rollup(self.read(coin, resolution, lo, hi), step), coarser[0])
+
+        return columns.shape[1]
+
+    def merge(self, path, columns):
+        """
+        Merge aligned, sorted points into one partition file, replacing stored points at the same timestamps.
+        """
+        if os.path.exists(path):
+            ## -- New points come first, so np.unique keeps them over the stored ones --
+            combined = np.concatenate([columns, np.load(path)], axis=1)
+            _, keep = np.unique(combined[0], return_index=True)
+            columns = combined[:, keep]
+
+        self.backend.save(columns, path)
+
+    def coins(self):
+        """
+        Get the coins in the store.
+        """
+        try:
+            return sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir())
+        except OSError:
+            return []
+
+    def resolutions(self, coin):
+        """
+        Get the resolutions stored for a coin, finest first.
+        """
+        return [resolution for resolution in RESOLUTIONS if self.partitions(coin, resolution)]
+
+    def has(self, coin, resolution="daily"):
+        return bool(self.partitions(coin, resolution))
+
+    def import_path(self, coin, path, resolution=None):
+        """
+        Import a coin's data file from any storage.py backend.
+
+        Args:
+            coin (str): The CoinGecko id of the coin.
+            path (str): The path of the data file (.npy, .parquet or .json).
+            resolution (str): One of RESOLUTIONS. Default is None, which infers it from the data.
+
+        Returns:
+            int: The number of buckets written.
+        """
+        return self.write(coin, storage.load(path), resolution)
+
+
+## -- Shared by data.py, utils.getdata() and the detectors --
+store = tsstore()
+
+
+if __name__ == "__main__":
+
+    ## -- Import every coin stored in data/ --
+    datadir = os.path.join(utils.getdirs(), "data")
+    coins = sorted({file[:file.rindex("_data")] for file in os.listdir(datadir) if os.path.splitext(file)[0].endswith("_data")})
+    for coin in coins:
+        print(f"Imported {store.import_path(coin, storage.find(coin))} points for {coin}")
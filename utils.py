@@ -1,9 +1,13 @@
 import json
 import os
 import numpy as np
-import pandas as pd
 import yaml
 
+import metrics
+import storage
+
+from dataclasses import dataclass
+
 from babel.numbers import format_currency
 
 config_path = os.path.join(os.path.dirname(__file__), "api_config.yml")
@@ -96,40 +100,59 @@ def printmetrics(maxprice, minprice, stddevprice, varprice, avgprice,
     print("Variance of market cap: ", format_currency(varmarketcap, 'USD', locale='en_US'))
     print("Average market cap: ", format_currency(avgmarketcap, 'USD', locale='en_US'), "\n-----------------------------")
 
-def getdata(datapath):
+@dataclass(frozen=True)
+class coindata:
+    """
+    Series data and metrics for one coin, as returned by getdata().
+
+    Attributes:
+        columns (np.ndarray): The (4, n) columnar array of timestamp, price, volume and market cap.
+        prices, volumes, market_caps (np.ndarray): Zero-copy (n, 2) [timestamp, value] views of each series.
+        metrics (metrics.seriesmetrics): Max, min, std, var and mean of each series.
+    """
+    columns: np.ndarray
+    prices: np.ndarray
+    volumes: np.ndarray
+    market_caps: np.ndarray
+    metrics: metrics.seriesmetrics
+
+
+def getdata(datapath=None, window=None, coin=None, resolution="daily", start=None, end=None):
+    """
+
+    Load the series data of a coin and compute its metrics in one vectorized pass.
+
+    Args:
+        datapath (str): The path of the stored data file (.npy, .parquet or .json). Default is None, which reads the coin from the time-series store.
+        window (int): When given, the metrics are computed over every trailing window of this many points instead of the whole series.
+        coin (str): The coin to read from the time-series store (see tsstore.py) when no datapath is given.
+        resolution (str): The time-series store resolution, "minute", "hourly" or "daily". Default is "daily".
+        start (int, str or datetime): The first time read from the time-series store. Default is None, from the first stored point.
+        end (int, str or datetime): The time the read from the time-series store stops before. Default is None, up to the last stored point.
+
+    Returns:
+        coindata: The series views and their metrics.
+
+    """
     
-    ## -- Get the data from the JSON file into a pandas dataframe (90 entries for 90 days) --
-    data_df = pd.read_json(datapath)
+    ## -- Load the columnar (timestamp, price, volume, market cap) data, memory-mapped for .npy files and the time-series store --
+    if datapath is None:
+        import tsstore
+        columns = tsstore.store.columns(coin, resolution, start, end)
+    else:
+        columns = storage.load(datapath)
 
     ## -- Ensure correct information --
-    assert data_df.shape[0] == 91, "Dataframe does not contain 90 entries / information for 90 day period! Please check the data.py."
-    assert data_df.shape[1] == 3, "Dataframe missing information for one of or multiple of: prices, market_caps, total_volumes."
-
-    ## -- Get the price, volume and market caps data as seperate dataframes --
-    prices = data_df["prices"]
-    volumes = data_df["total_volumes"]
-    market_caps = data_df["market_caps"]
-
-    pricesvalues = [price[1] for price in prices]
-    volumesvalues = [volume[1] for volume in volumes]
-    marketcapsvalues = [marketcap[1] for marketcap in market_caps]
-
-    maxprice = max(pricesvalues)
-    minprice = min(pricesvalues)
-    stddevprice = np.std(pricesvalues)
-    varprice = np.var(pricesvalues)
-    avgprice = np.mean(pricesvalues)
-
-    maxvolume = max(volumesvalues)
-    minvolume = min(volumesvalues)
-    stddevvolume = np.std(volumesvalues)
-    varvolume = np.var(volumesvalues)
-    avgvolume = np.mean(volumesvalues)
-
-    maxmarketcap = max(marketcapsvalues)
-    minmarketcap = min(marketcapsvalues)
-    stddevmarketcap = np.std(marketcapsvalues)
-    varmarketcap = np.var(marketcapsvalues)
-    avgmarketcap = np.mean(marketcapsvalues)
-
-    return prices, volumes, market_caps, maxprice, minprice, stddevprice, varprice, avgprice, maxvolume, minvolume, stddevvolume, varvolume, avgvolume, maxmarketcap, minmarketcap, stddevmarketcap, varmarketcap, avgmarketcap
\ No newline at end of file
+    assert columns.shape[0] == 4, "Data missing information for one of or multiple of: prices, market_caps, total_volumes."
+    assert columns.shape[1] > 0, "Data is empty! Please check the data.py."
+
+    ## -- Rows 1 to 3 are price, volume and market cap, so the metrics run over a (3, n) view --
+    values = columns[1:]
+    seriesmetrics = metrics.rollingmetrics(values, window) if window else metrics.computemetrics(values)
+
+    ## -- Get the price, volume and market caps data as zero-copy [timestamp, value] views --
+    return coindata(columns=columns,
+                    prices=storage.pairview(columns, storage.SEGMENTS["prices"]),
+                    volumes=storage.pairview(columns, storage.SEGMENTS["total_volumes"]),
+                    market_caps=storage.pairview(columns, storage.SEGMENTS["market_caps"]),
+                    metrics=seriesmetrics)